@@ -1,9 +1,14 @@
 import os, sys
+import shutil
+import multiprocessing
 import csv
+import sqlite3
+import numpy
 import unittest
 from __main__ import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
 from types import *
+import DiagnosticIndexLib
 
 
 class DiagnosticIndex(ScriptedLoadableModule):
@@ -36,11 +41,16 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
 
         # Global Variables
         self.logic = DiagnosticIndexLogic(self)
-        self.dictVTKFiles = dict()
-        self.dictGroups = dict()
+        #    dictVTKFiles and dictGroups: vtk files sorted by group (see DiagnosticIndexLib.GroupMembership)
+        self.dictVTKFiles = DiagnosticIndexLib.GroupMembership()
+        self.dictGroups = DiagnosticIndexLib.GroupMembership()
         self.dictCSVFile = dict()
         self.directoryList = list()
         self.groupSelected = set()
+        #    Groups of the table of the vtk files whose checkbox/color must be refreshed (see markGroupsDirty)
+        self.dirtyGroups = set()
+        self.refreshPending = False
+        self.colorRange = None
 
         # Interface
         loader = qt.QUiLoader()
@@ -72,13 +82,15 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         self.pathLineEdit_NewGroups = self.logic.get('PathLineEdit_NewGroups')
         self.collapsibleGroupBox_previewVTKFiles = self.logic.get('CollapsibleGroupBox_previewVTKFiles')
         self.checkableComboBox_ChoiceOfGroup = self.logic.get('CheckableComboBox_ChoiceOfGroup')
-        self.tableWidget_VTKFiles = self.logic.get('tableWidget_VTKFiles')
+        self.tableView_VTKFiles = self.logic.get('tableView_VTKFiles')
+        self.spinBox_previewTriangles = self.logic.get('spinBox_previewTriangles')
         self.pushButton_previewVTKFiles = self.logic.get('pushButton_previewVTKFiles')
         self.pushButton_compute = self.logic.get('pushButton_compute')
         self.directoryButton_exportNewClassification = self.logic.get('DirectoryButton_exportNewClassification')
         self.pushButton_exportNewClassification = self.logic.get('pushButton_exportNewClassification')
         #          Tab: Selection Classification Groups
         self.collapsibleButton_SelectClassificationGroups = self.logic.get('CollapsibleButton_SelectClassificationGroups')
+        self.comboBox_registeredModels = self.logic.get('comboBox_registeredModels')
         self.pathLineEdit_selectionClassificationGroups = self.logic.get('PathLineEdit_selectionClassificationGroups')
         self.spinBox_healthyGroup = self.logic.get('spinBox_healthyGroup')
         #          Tab: Preview of Classification Groups
@@ -92,6 +104,11 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         self.pushButton_applyTMJtype = self.logic.get('pushButton_applyTMJtype')
         #          Tab: Result / Analysis
         self.collapsibleButton_Result = self.logic.get('CollapsibleButton_Result')
+        self.label_result = self.logic.get('label_result')
+        #          Jobs run in the background
+        self.widget_jobs = self.logic.get('widget_jobs')
+        self.progressBar_jobs = self.logic.get('progressBar_jobs')
+        self.pushButton_cancelJobs = self.logic.get('pushButton_cancelJobs')
 
         # Widget Configuration
 
@@ -104,9 +121,25 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         self.pushButton_exportNewClassification.setDisabled(True)
         self.checkBox_fileInGroups.setDisabled(True)
         self.checkableComboBox_ChoiceOfGroup.setDisabled(True)
-        self.tableWidget_VTKFiles.setDisabled(True)
+        self.tableView_VTKFiles.setDisabled(True)
         self.pushButton_previewVTKFiles.setDisabled(True)
 
+        #     jobs: the progress bar and the cancel button are displayed while jobs are running
+        #     (see onJobTimer)
+        self.widget_jobs.hide()
+        self.jobTimer = qt.QTimer()
+        self.jobTimer.setInterval(100)
+        self.previewNode = None
+        self.previewDirectory = None
+        #     directory of the workspace containing the means of the Classification Groups computed
+        self.groupsDirectory = None
+        #     vtk files from which the Classification Groups computed were created, registered when they are exported
+        self.groupsVTKFiles = dict()
+        #     model of the registry selected in the tab "Selection of Classification Groups": (name, version)
+        self.registeredModel = None
+        self.registeredModels = list()
+        self.fillRegisteredModels()
+
         #     qMRMLNodeComboBox configuration
         self.MRMLNodeComboBox_VTKFile.setMRMLScene(slicer.mrmlScene)
 
@@ -134,16 +167,29 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         headerTreeView.setResizeMode(sceneModel.opacityColumn,qt.QHeaderView.ResizeToContents)
 
         #     table configuration
-        self.tableWidget_VTKFiles.setColumnCount(4)
-        self.tableWidget_VTKFiles.setHorizontalHeaderLabels([' VTK files ', ' Group ', ' Visualization ', 'Color'])
-        self.tableWidget_VTKFiles.setColumnWidth(0, 200)
-        horizontalHeader = self.tableWidget_VTKFiles.horizontalHeader()
+        #          The table is a view of VTKFilesTableModel: only the visible rows are drawn
+        #          and the combobox of the group is created only when a cell is edited
+        self.tableModel_VTKFiles = VTKFilesTableModel(self.tableView_VTKFiles)
+        self.tableModel_VTKFiles.groupChangedCallback = self.onGroupValueChanged
+        self.tableModel_VTKFiles.checkStateChangedCallback = self.onCheckBoxTableValueChanged
+        self.tableView_VTKFiles.setModel(self.tableModel_VTKFiles)
+        self.groupDelegate_VTKFiles = GroupComboBoxDelegate(self.tableModel_VTKFiles, self.tableView_VTKFiles)
+        self.tableView_VTKFiles.setItemDelegateForColumn(1, self.groupDelegate_VTKFiles)
+        self.tableView_VTKFiles.setEditTriggers(qt.QAbstractItemView.AllEditTriggers)
+        self.tableView_VTKFiles.setSelectionMode(qt.QAbstractItemView.NoSelection)
+        #          Fixed sizes: resizing to the contents would measure every row of the table
+        horizontalHeader = self.tableView_VTKFiles.horizontalHeader()
         horizontalHeader.setStretchLastSection(False)
         horizontalHeader.setResizeMode(0,qt.QHeaderView.Stretch)
-        horizontalHeader.setResizeMode(1,qt.QHeaderView.ResizeToContents)
-        horizontalHeader.setResizeMode(2,qt.QHeaderView.ResizeToContents)
-        horizontalHeader.setResizeMode(3,qt.QHeaderView.ResizeToContents)
-        self.tableWidget_VTKFiles.verticalHeader().setVisible(False)
+        horizontalHeader.setResizeMode(1,qt.QHeaderView.Fixed)
+        horizontalHeader.setResizeMode(2,qt.QHeaderView.Fixed)
+        horizontalHeader.setResizeMode(3,qt.QHeaderView.Fixed)
+        self.tableView_VTKFiles.setColumnWidth(1, 70)
+        self.tableView_VTKFiles.setColumnWidth(2, 90)
+        self.tableView_VTKFiles.setColumnWidth(3, 50)
+        verticalHeader = self.tableView_VTKFiles.verticalHeader()
+        verticalHeader.setResizeMode(qt.QHeaderView.Fixed)
+        verticalHeader.setVisible(False)
 
         # ---------------------------------------------------- #
         #                Connection
@@ -161,13 +207,16 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
                                                                     lambda: self.onSelectedCollapsibleButtonOpen(self.collapsibleButton_creationClassificationGroups))
         self.pathLineEdit_NewGroups.connect('currentPathChanged(const QString)', self.onNewGroups)
         self.checkableComboBox_ChoiceOfGroup.connect('checkedIndexesChanged()', self.onCheckableComboBoxValueChanged)
+        self.spinBox_previewTriangles.connect('valueChanged(int)', self.onPreviewTrianglesChanged)
         self.pushButton_previewVTKFiles.connect('clicked()', self.onPreviewVTKFiles)
         self.pushButton_compute.connect('clicked()', self.onComputeNewClassificationGroups)
         self.pushButton_exportNewClassification.connect('clicked()', self.onExportNewClassificationGroups)
         #          Tab: Selection of Classification Groups
         self.collapsibleButton_SelectClassificationGroups.connect('clicked()',
                                                                   lambda: self.onSelectedCollapsibleButtonOpen(self.collapsibleButton_SelectClassificationGroups))
+        self.comboBox_registeredModels.connect('activated(int)', self.onSelectRegisteredModel)
         self.pathLineEdit_selectionClassificationGroups.connect('currentPathChanged(const QString)', self.onSelectionClassificationGroups)
+        self.spinBox_healthyGroup.connect('valueChanged(int)', self.onHealthyGroupChanged)
         #          Tab: Preview of Classification Groups
         self.collapsibleButton_previewClassificationGroups.connect('clicked()',
                                                                    lambda: self.onSelectedCollapsibleButtonOpen(self.collapsibleButton_previewClassificationGroups))
@@ -182,6 +231,10 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         self.collapsibleButton_Result.connect('clicked()',
                                               lambda: self.onSelectedCollapsibleButtonOpen(self.collapsibleButton_Result))
 
+        #          Jobs
+        self.jobTimer.connect('timeout()', self.onJobTimer)
+        self.pushButton_cancelJobs.connect('clicked()', self.onCancelJobs)
+
         slicer.mrmlScene.AddObserver(slicer.mrmlScene.EndCloseEvent, self.onCloseScene)
 
     # function called each time that the user "enter" in Diagnostic Index interface
@@ -194,6 +247,11 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         #TODO
         pass
 
+    # function called when the module is reloaded or when the application is closed
+    def cleanup(self):
+        self.jobTimer.stop()
+        self.logic.close()
+
     # function called each time that the scene is closed (if Diagnostic Index has been initialized)
     def onCloseScene(self, obj, event):
         #TODO
@@ -250,7 +308,9 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
             return
 
         # Add the paths of vtk files of the dictionary
-        self.logic.addGroupToDictionary(self.dictCSVFile, directory, self.directoryList, self.spinBox_group.value)
+        if not self.logic.addGroupToDictionary(self.dictCSVFile, directory, self.directoryList,
+                                               self.spinBox_group.value):
+            return
 
         # Increment of the number of the group in the spinbox
         self.spinBox_group.blockSignals(True)
@@ -291,10 +351,16 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
             return
 
         # Remove the paths of vtk files of the dictionary
+        oldDirectory = self.directoryList[self.spinBox_group.value - 1]
+        oldVTKFiles = self.dictCSVFile.get(self.spinBox_group.value, list())
         self.logic.removeGroupToDictionary(self.dictCSVFile, self.directoryList, self.spinBox_group.value)
 
-        # Add the paths of vtk files of the dictionary
-        self.logic.addGroupToDictionary(self.dictCSVFile, directory, self.directoryList, self.spinBox_group.value)
+        # Add the paths of vtk files of the dictionary, the previous directory is kept if it's not possible
+        if not self.logic.addGroupToDictionary(self.dictCSVFile, directory, self.directoryList,
+                                               self.spinBox_group.value):
+            self.dictCSVFile[self.spinBox_group.value] = oldVTKFiles
+            self.directoryList.insert(self.spinBox_group.value - 1, oldDirectory)
+            return
 
         # Message for the user
         slicer.util.delayDisplay("Group modified")
@@ -349,7 +415,7 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
     def onNewGroups(self):
         # Re-initialization of the dictionary containing all the vtk files
         # which will be used to create a new Classification Groups
-        self.dictVTKFiles = dict()
+        self.dictVTKFiles = DiagnosticIndexLib.GroupMembership()
 
         # Check if the path exists:
         if not os.path.exists(self.pathLineEdit_NewGroups.currentPath):
@@ -371,165 +437,224 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         #    Re-initialization of the dictionary containing all the data
         #    which will be used to create a new Classification Groups
         if not condition2:
-            self.dictVTKFiles = dict()
+            self.dictVTKFiles = DiagnosticIndexLib.GroupMembership()
             self.pathLineEdit_NewGroups.setCurrentPath(" ")
             return
 
+        # Pack all the vtk files in one file read by memory mapping
+        if self.logic.usePackedStore:
+            self.logic.loadPackedStore(self.pathLineEdit_NewGroups.currentPath, self.dictVTKFiles)
+
         # Fill the table for the preview of the vtk files in Shape Population Viewer
+        self.groupSelected = set()
+        self.dirtyGroups = set()
+        self.colorRange = None
         self.logic.fillTableForPreviewVTKFilesInSPV(self.dictVTKFiles,
                                                self.checkableComboBox_ChoiceOfGroup,
-                                               self.tableWidget_VTKFiles)
+                                               self.tableModel_VTKFiles)
 
         # Enable/disable buttons
         self.checkableComboBox_ChoiceOfGroup.setEnabled(True)
-        self.tableWidget_VTKFiles.setEnabled(True)
+        self.tableView_VTKFiles.setEnabled(True)
         self.pushButton_previewVTKFiles.setEnabled(True)
         self.pushButton_compute.setEnabled(True)
 
     # Function to manage the checkable combobox to allow the user to choose the group that he wants to preview in SPV
     def onCheckableComboBoxValueChanged(self):
-        # Update the checkboxes in the qtableWidget of each vtk file
+        # Update the checkboxes in the table of the vtk files of the group
         index = self.checkableComboBox_ChoiceOfGroup.currentIndex
-        for row in range(0,self.tableWidget_VTKFiles.rowCount):
-            # Recovery of the group of the vtk file contained in the combobox (column 2)
-            widget = self.tableWidget_VTKFiles.cellWidget(row, 1)
-            tuple = widget.children()
-            comboBox = qt.QComboBox()
-            comboBox = tuple[1]
-            group = comboBox.currentIndex + 1
-            if group == (index + 1):
-                # check the checkBox
-                widget = self.tableWidget_VTKFiles.cellWidget(row, 2)
-                tuple = widget.children()
-                checkBox = tuple[1]
-                checkBox.blockSignals(True)
-                item = self.checkableComboBox_ChoiceOfGroup.model().item(index, 0)
-                if item.checkState():
-                    checkBox.setChecked(True)
-                    self.groupSelected.add(index + 1)
-                else:
-                    checkBox.setChecked(False)
-                    self.groupSelected.discard(index + 1)
-                checkBox.blockSignals(False)
-
-        # Update the color in the qtableWidget of each vtk file
-        colorTransferFunction = self.logic.creationColorTransfer(self.groupSelected)
-        self.updateColorInTableForPreviewInSPV(colorTransferFunction)
+        item = self.checkableComboBox_ChoiceOfGroup.model().item(index, 0)
+        self.tableModel_VTKFiles.setGroupChecked(index + 1, bool(item.checkState()))
+        self.markGroupsDirty([index + 1])
 
     # Function to manage the combobox which allow the user to change the group of a vtk file
-    def onGroupValueChanged(self):
-        # Updade the dictionary which containing the VTK files sorted by groups
-        self.logic.onComboBoxTableValueChanged(self.dictVTKFiles, self.tableWidget_VTKFiles)
-
-        # Update the checkable combobox which display the groups selected to preview them in SPV
-        self.onCheckBoxTableValueChanged()
+    #    - Called by the model of the table when the vtk file of the row has been moved to another group of dictVTKFiles
+    def onGroupValueChanged(self, row, oldGroup):
+        self.markGroupsDirty([oldGroup, self.tableModel_VTKFiles.groupOfRow(row)])
 
     # Function to manage the checkbox in the table used to make a preview in SPV
-    def onCheckBoxTableValueChanged(self):
-        self.groupSelected = set()
-        # Update the checkable comboBox which allow to select what groups the user wants to display in SPV
+    def onCheckBoxTableValueChanged(self, row):
+        self.markGroupsDirty([self.tableModel_VTKFiles.groupOfRow(row)])
+
+    # Function to record the groups changed in the table of the vtk files
+    #    - The checkable combobox and the colors are refreshed once, when the application comes back to its event loop:
+    #      several changes made at the same time (a whole group checked) lead to only one refresh
+    def markGroupsDirty(self, groups):
+        self.dirtyGroups.update(groups)
+        if not self.refreshPending:
+            self.refreshPending = True
+            qt.QTimer.singleShot(0, self.refreshDirtyGroups)
+
+    # Function to refresh the groups changed in the table of the vtk files
+    #    - Update the checkable comboBox which allow to select what groups the user wants to display in SPV:
+    #      a group is checked if all its vtk files are checked
+    #    - The color transfer function is created again only if the range of the groups selected changed,
+    #      else only the rows changed have been redrawn
+    def refreshDirtyGroups(self):
+        self.refreshPending = False
+        dirtyGroups = self.dirtyGroups
+        self.dirtyGroups = set()
+
         self.checkableComboBox_ChoiceOfGroup.blockSignals(True)
-        allcheck = True
-        for key, value in self.dictVTKFiles.items():
+        for key in dirtyGroups:
+            if key not in self.dictVTKFiles:
+                continue
+            numberOfRows = self.dictVTKFiles.numberOfFiles(key)
+            numberOfCheckedRows = self.tableModel_VTKFiles.numberOfCheckedFiles(key)
             item = self.checkableComboBox_ChoiceOfGroup.model().item(key - 1, 0)
-            if not value == []:
-                for vtkFile in value:
-                    filename = os.path.basename(vtkFile)
-                    for row in range(0,self.tableWidget_VTKFiles.rowCount):
-                        qlabel = self.tableWidget_VTKFiles.cellWidget(row, 0)
-                        if qlabel.text == filename:
-                            widget = self.tableWidget_VTKFiles.cellWidget(row, 2)
-                            tuple = widget.children()
-                            checkBox = tuple[1]
-                            if not checkBox.checkState():
-                                allcheck = False
-                                item.setCheckState(0)
-                            else:
-                                self.groupSelected.add(key)
-                if allcheck:
-                    item.setCheckState(2)
+            if numberOfRows > 0 and numberOfCheckedRows == numberOfRows:
+                item.setCheckState(2)
             else:
                 item.setCheckState(0)
-            allcheck = True
+            if numberOfCheckedRows > 0:
+                self.groupSelected.add(key)
+            else:
+                self.groupSelected.discard(key)
         self.checkableComboBox_ChoiceOfGroup.blockSignals(False)
 
-        # Update the color in the qtableWidget which will display in SPV
-        colorTransferFunction = self.logic.creationColorTransfer(self.groupSelected)
-        self.updateColorInTableForPreviewInSPV(colorTransferFunction)
+        # Update the color in the table which will display in SPV
+        colorRange = None
+        if len(self.groupSelected) > 0:
+            colorRange = (min(self.groupSelected), max(self.groupSelected))
+        if colorRange != self.colorRange or self.tableModel_VTKFiles.colorTransferFunction is None:
+            self.colorRange = colorRange
+            colorTransferFunction = self.logic.creationColorTransfer(self.groupSelected)
+            self.updateColorInTableForPreviewInSPV(colorTransferFunction)
 
     # Function to update the colors that the selected vtk files will have in Shape Population Viewer
+    #    - The color of each row is computed by the model when the row is drawn
     def updateColorInTableForPreviewInSPV(self, colorTransferFunction):
-        for row in range(0,self.tableWidget_VTKFiles.rowCount):
-            # Recovery of the group display in the table for each vtk file
-            widget = self.tableWidget_VTKFiles.cellWidget(row, 1)
-            tuple = widget.children()
-            comboBox = qt.QComboBox()
-            comboBox = tuple[1]
-            group = comboBox.currentIndex + 1
-
-            # Recovery of the checkbox for each vtk file
-            widget = self.tableWidget_VTKFiles.cellWidget(row, 2)
-            tuple = widget.children()
-            checkBox = qt.QCheckBox()
-            checkBox = tuple[1]
-
-            # If the checkbox is check, the color is found thanks to the color transfer function
-            # Else the color is put at white
-            if checkBox.isChecked():
-                rgb = colorTransferFunction.GetColor(group)
-                widget = self.tableWidget_VTKFiles.cellWidget(row, 3)
-                self.tableWidget_VTKFiles.item(row,3).setBackground(qt.QColor(rgb[0]*255,rgb[1]*255,rgb[2]*255))
-            else:
-                self.tableWidget_VTKFiles.item(row,3).setBackground(qt.QColor(255,255,255))
+        self.tableModel_VTKFiles.setColorTransferFunction(colorTransferFunction)
+
+    # Function to change the number of triangles of the meshes displayed in Shape Population Viewer
+    #    - 0: the meshes are displayed at full resolution
+    def onPreviewTrianglesChanged(self, value):
+        self.logic.previewTriangles = value
 
     # Function to display the selected vtk files in Shape Population Viewer
-    #    - Add a color map "DisplayClassificationGroup"
-    #    - Launch the CLI ShapePopulationViewer
+    #    - Add a color map "DisplayClassificationGroup" and create the CSV file for SPV in a job
+    #    - Launch the CLI ShapePopulationViewer without waiting for it (see onPreviewPrepared)
     def onPreviewVTKFiles(self):
         print "--- Preview VTK Files in ShapePopulationViewer ---"
-        if os.path.exists(self.pathLineEdit_NewGroups.currentPath):
+        if not os.path.exists(self.pathLineEdit_NewGroups.currentPath):
+            return
+        if self.previewNode is not None:
+            slicer.util.errorDisplay('Shape Population Viewer is already displaying the VTK files')
+            return
+
+        # Copy of the data used by the job: the user can change the table while the job is running
+        dictVTKFiles = self.dictVTKFiles.toDict()
+        checkedVTKFiles = self.tableModel_VTKFiles.checkedVTKFiles()
+
+        # Directory of the workspace where the files of the preview are written
+        directory = self.logic.workspace.createDirectory('preview')
+        filePathCSV = directory + '/' + 'VTKFilesPreview_OAIndex.csv'
+
+        def preparePreview(job):
             # Creation of a color map to visualize each group with a different color in ShapePopulationViewer
-            self.logic.addColorMap(self.tableWidget_VTKFiles, self.dictVTKFiles)
+            errors = self.logic.addColorMap(dictVTKFiles, directory, job)
 
             # Creation of a CSV file to load the vtk files in ShapePopulationViewer
-            filePathCSV = slicer.app.temporaryPath + '/' + 'VTKFilesPreview_OAIndex.csv'
-            self.logic.creationCSVFileForSPV(filePathCSV, self.tableWidget_VTKFiles, self.dictVTKFiles)
-
-            # Launch the CLI ShapePopulationViewer
-            parameters = {}
-            parameters["CSVFile"] = filePathCSV
-            launcherSPV = slicer.modules.launcher
-            slicer.cli.run(launcherSPV, None, parameters, wait_for_completion=True)
-
-            # Remove the vtk files previously created in the temporary directory of Slicer
-            for key, value in self.dictVTKFiles.items():
-                self.logic.removeDataInTemporaryDirectory(key, value)
-
-    # Function to compute the new Classification Groups
-    #    - Remove all the arrays of all the vtk files
-    #    - Compute the mean of each group thanks to Statismo
+            self.logic.creationCSVFileForSPV(filePathCSV, checkedVTKFiles, directory)
+            return errors
+
+        self.pushButton_previewVTKFiles.setEnabled(False)
+        self.submitJob('Preview', preparePreview,
+                       lambda job: self.onPreviewPrepared(job, filePathCSV, directory))
+
+    # Function called when the vtk files of the preview are ready: launch the CLI ShapePopulationViewer
+    #    - The directory of the preview is released when SPV is closed (see onJobTimer)
+    def onPreviewPrepared(self, job, filePathCSV, directory):
+        self.pushButton_previewVTKFiles.setEnabled(True)
+        if not self.checkJob(job):
+            self.logic.workspace.release(directory)
+            return
+
+        # Error message for the files which couldn't be read
+        if len(job.result) > 0:
+            slicer.util.errorDisplay('These VTK files could not be read: \n' + '\n'.join(job.result))
+
+        # Launch the CLI ShapePopulationViewer
+        parameters = {}
+        parameters["CSVFile"] = filePathCSV
+        launcherSPV = slicer.modules.launcher
+        with DiagnosticIndexLib.tracer.span('launchShapePopulationViewer', 'process'):
+            self.previewNode = slicer.cli.run(launcherSPV, None, parameters, wait_for_completion=False)
+        self.previewDirectory = directory
+        self.jobTimer.start()
+
+    # Function to compute the new Classification Groups in a job
+    #    - The groups are computed concurrently (see DiagnosticIndexLib.GroupPipeline.computeGroup)
+    #    - A group which fails doesn't stop the other groups
+    #    - The groups whose mean is already in the cache are not recomputed
+    #    - The means are computed in a new directory of the workspace
+    #    - The means of the groups successfully computed are stored in dictGroups
     def onComputeNewClassificationGroups(self):
-        for key, value in self.dictVTKFiles.items():
-            # Delete all the arrays in vtk file
-            self.logic.deleteArrays(key, value)
+        dictVTKFiles = self.dictVTKFiles.toDict()
+
+        # Check that the meshes of each group have the same number of points and the same cells,
+        # from the headers of the vtk files, before computing anything
+        errors = self.logic.meshMetadataIndex.checkGroups(dictVTKFiles)
+        if len(errors) > 0:
+            text = 'The meshes of the following groups are not in correspondence: \n'
+            for key in sorted(errors.keys()):
+                print "Error in the group " + str(key) + ":\n" + '\n'.join(errors[key])
+                text = text + 'Group ' + str(key) + ': ' + errors[key][0] + '\n'
+            slicer.util.errorDisplay(text)
+            return
 
-            if len(value) > 1:
-                # Create the datalist for Statismo
-                datalist = self.logic.creationTXTFile(key, value)
+        directory = self.logic.workspace.createDirectory('groups')
+        self.pushButton_compute.setEnabled(False)
+        self.submitJob('Compute', lambda job: self.logic.computeGroups(dictVTKFiles, directory, job),
+                       lambda job: self.onComputeNewClassificationGroupsFinished(job, directory, dictVTKFiles))
+
+    # Function called when the new Classification Groups are computed
+    #    - dictVTKFiles: vtk files from which the groups were computed
+    def onComputeNewClassificationGroupsFinished(self, job, directory, dictVTKFiles):
+        self.pushButton_compute.setEnabled(True)
+        if self.checkJob(job):
+            results, errors = job.result
+            self.storageComputedGroups(results, errors, directory)
+            self.groupsVTKFiles = dictVTKFiles
+        else:
+            self.logic.workspace.release(directory)
+        self.logic.saveTrace()
 
-                # Compute the mean of each group thanks to Statismo
-                self.logic.computeMean(key, datalist)
+    # Function to store the means of the groups computed
+    #    - results: key of the mean in the cache for each group successfully computed
+    #    - errors: error message for each group which failed
+    #    - The means, computed in the directory given, replace the Classification Groups previously computed
+    def storageComputedGroups(self, results, errors, directory):
+        self.dictGroups = DiagnosticIndexLib.GroupMembership()
+        self.setGroupsDirectory(directory)
 
-                # Remove the files previously created in the temporary directory
-                self.logic.removeDataInTemporaryDirectory(key, value)
+        # Storage of the means for each group
+        for key, cacheKey in results.items():
+            self.logic.storageMean(self.dictGroups, key, directory, cacheKey)
 
-            # Storage of the means for each group
-            self.logic.storageMean(self.dictGroups, key)
+        # Error message for the groups which failed
+        self.displayGroupErrors(errors)
 
         # Enable the option to export the new data
         self.directoryButton_exportNewClassification.setEnabled(True)
         self.pushButton_exportNewClassification.setEnabled(True)
 
+    # Function to change the directory of the workspace containing the means of the Classification Groups
+    #    - The directory of the means previously computed is released
+    def setGroupsDirectory(self, directory):
+        if self.groupsDirectory is not None:
+            self.logic.workspace.release(self.groupsDirectory)
+        self.groupsDirectory = directory
+
+    # Function to display the groups whose mean couldn't be computed
+    def displayGroupErrors(self, errors):
+        if len(errors) > 0:
+            text = 'The mean of the following groups could not be computed: \n'
+            for key, error in errors.items():
+                print "Error in the group " + str(key) + ":\n" + error
+                text = text + 'Group ' + str(key) + '\n'
+            slicer.util.errorDisplay(text)
+
     # Function to export the new Classification Groups
     #    - Data saved:
     #           - Save the mean vtk files in the selected directory
@@ -552,7 +677,7 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
 
         #   Check if the mean VTK files exist
         for key, value in self.dictGroups.items():
-            VTKFilename = os.path.basename(value[0])
+            VTKFilename = self.logic.meshFilename(os.path.basename(value[0]))
             VTKFilePath = directory + '/' + VTKFilename
             if os.path.exists(VTKFilePath):
                 filePathExisting.append(VTKFilePath)
@@ -574,9 +699,12 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
             if choice == messageBox.No:
                 return
 
-        # Save the CSV File and the means of each group
-        self.logic.saveNewClassificationGroups(CSVfilePath, directory, self.dictGroups)
-        self.dictGroups = dict()
+        # Save the CSV File and the means of each group, and register them
+        self.logic.saveNewClassificationGroups(CSVfilePath, directory, self.dictGroups, self.groupsVTKFiles)
+        self.dictGroups = DiagnosticIndexLib.GroupMembership()
+        self.setGroupsDirectory(None)
+        self.fillRegisteredModels()
+        self.logic.saveTrace()
 
         # Message for the user
         slicer.util.delayDisplay("Files Saved")
@@ -588,10 +716,66 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
     #        Tab: Selection of Classification Groups
     # ---------------------------------------------------- #
 
+    # Function to fill the combobox of the models of the registry
+    #    - The first item selects no model: the Classification Groups are given by a CSV file
+    def fillRegisteredModels(self):
+        self.registeredModels = self.logic.modelRegistry.listModels()
+        self.comboBox_registeredModels.clear()
+        self.comboBox_registeredModels.addItem('')
+        #    The models are displayed with the name of their export directory, the whole name is in the tooltip
+        for model in self.registeredModels:
+            self.comboBox_registeredModels.addItem(DiagnosticIndexLib.modelDisplayName(model.name) + ' - version '
+                                                   + str(model.version) + ' (' + str(model.numberOfGroups) + ' groups)')
+            self.comboBox_registeredModels.setItemData(self.comboBox_registeredModels.count - 1, model.name,
+                                                       qt.Qt.ToolTipRole)
+
+    # Function to select the Classification Groups of a model of the registry
+    #    - The means are found without reading any CSV file, and the array of the means is recovered
+    #      from the registry while their files don't change (see DiagnosticIndexLogic.loadRegisteredModel)
+    def onSelectRegisteredModel(self, index):
+        if index <= 0:
+            return
+        model = self.registeredModels[index - 1]
+        print "------ Selection of the registered model " + model.name + " version " + str(model.version) + " ------"
+        self.pathLineEdit_selectionClassificationGroups.setCurrentPath(" ")
+        self.dictGroups = DiagnosticIndexLib.GroupMembership()
+        self.setGroupsDirectory(None)
+        self.registeredModel = None
+        try:
+            registeredModel, dictGroups, errors = self.logic.loadRegisteredModel(model.name, model.version)
+        except (KeyError, sqlite3.Error) as e:
+            slicer.util.errorDisplay('The model could not be loaded from the registry: ' + str(e))
+            return
+        if len(errors) > 0:
+            slicer.util.errorDisplay('The model ' + model.name + ' version ' + str(model.version)
+                                     + ' can not be used: \n' + '\n'.join(errors))
+            self.comboBox_registeredModels.setCurrentIndex(0)
+            return
+        self.dictGroups = dictGroups
+        self.comboBox_registeredModels.setCurrentIndex(index)
+
+        # Enable/disable buttons, the healthy group of the model is selected
+        self.spinBox_healthyGroup.setEnabled(True)
+        self.pushButton_previewGroups.setEnabled(True)
+        self.MRMLTreeView_classificationGroups.setEnabled(True)
+        self.spinBox_healthyGroup.setMaximum(len(self.dictGroups))
+        self.spinBox_healthyGroup.setValue(registeredModel.healthyGroup or 0)
+        self.registeredModel = (model.name, model.version)
+
+    # Function to save the healthy group in the registry, if the Classification Groups are a registered model
+    def onHealthyGroupChanged(self, value):
+        if self.registeredModel is None:
+            return
+        name, version = self.registeredModel
+        self.logic.modelRegistry.setHealthyGroup(name, version, value or None)
+
     # Function to select the Classification Groups
     def onSelectionClassificationGroups(self):
         # Re-initialization of the dictionary containing the Classification Groups
-        self.dictGroups = dict()
+        self.dictGroups = DiagnosticIndexLib.GroupMembership()
+        self.setGroupsDirectory(None)
+        self.registeredModel = None
+        self.comboBox_registeredModels.setCurrentIndex(0)
 
         # Check if the path exists:
         if not os.path.exists(self.pathLineEdit_selectionClassificationGroups.currentPath):
@@ -615,7 +799,7 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         #    If the file is not conformed:
         #    Re-initialization of the dictionary containing the Classification Groups
         if not (condition2 and condition3):
-            self.dictGroups = dict()
+            self.dictGroups = DiagnosticIndexLib.GroupMembership()
             self.pathLineEdit_selectionClassificationGroups.setCurrentPath(" ")
             return
 
@@ -635,6 +819,8 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
     # Function to preview the Classification Groups in Slicer
     #    - The opacity of all the vtk files is set to 0.8
     #    - The healthy group is white and the others are red
+    #    - All the groups are loaded and displayed in one batch of the scene
+    #      (see DiagnosticIndexLogic.displayClassificationGroups)
     def onPreviewClassificationGroups(self):
         print "------ Preview of the Classification Groups in Slicer ------"
 
@@ -646,29 +832,10 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
             # Error message:
             slicer.util.errorDisplay('Miss the number of the healthy group ')
         else:
-            for i in self.dictGroups.keys():
-                filename = self.dictGroups.get(i, None)
-                loader = slicer.util.loadModel
-                loader(filename[0])
-
-        # Change the color and the opacity for each vtk file
-            list = slicer.mrmlScene.GetNodesByClass("vtkMRMLModelNode")
-            end = list.GetNumberOfItems()
-            for i in range(3,end):
-                model = list.GetItemAsObject(i)
-                disp = model.GetDisplayNode()
-                for group in self.dictGroups.keys():
-                    filename = self.dictGroups.get(group, None)
-                    if os.path.splitext(os.path.basename(filename[0]))[0] == model.GetName():
-                        if self.spinBox_healthyGroup.value == group:
-                            disp.SetColor(1, 1, 1)
-                            disp.VisibilityOn()
-                        else:
-                            disp.SetColor(1, 0, 0)
-                            disp.VisibilityOff()
-                        disp.SetOpacity(0.8)
-                        break
-                    disp.VisibilityOff()
+            modelOfGroup, errors = self.logic.displayClassificationGroups(self.dictGroups,
+                                                                          self.spinBox_healthyGroup.value)
+            if len(errors) > 0:
+                slicer.util.errorDisplay('These VTK files could not be loaded: \n' + '\n'.join(errors))
 
         # Center the 3D view of the scene
         layoutManager = slicer.app.layoutManager()
@@ -694,6 +861,14 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         # Check if the selected file is in the groups used to create the classification groups
         self.onCheckFileInGroups()
 
+    # Function to recover the filename of the vtk file of a node
+    #    - Filename of the file from which the node was loaded, name of the node if it wasn't loaded from a file
+    def filenameOfNode(self, node):
+        storageNode = node.GetStorageNode()
+        if storageNode is not None and storageNode.GetFileName():
+            return os.path.basename(storageNode.GetFileName())
+        return node.GetName() + '.vtk'
+
     # Function to check if the selected file is in the groups used to create the classification groups
     #    - If it's not the case:
     #           - display of a error message
@@ -702,62 +877,355 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
         if self.checkBox_fileInGroups.isChecked():
             node = self.MRMLNodeComboBox_VTKFile.currentNode()
             if not node == None:
-                vtkfileToFind = node.GetName() + '.vtk'
+                vtkfileToFind = self.filenameOfNode(node)
                 find = self.logic.actionOnDictionary(self.dictVTKFiles, vtkfileToFind, None, 'find')
                 if find == False:
                     slicer.util.errorDisplay('The selected file is not a file used to create the Classification Groups!')
                     self.checkBox_fileInGroups.setChecked(False)
 
-    # Function to define the TMJ OA type of the patient
+    # Function to define the TMJ OA type of the patient in a job
     #    - If the user specified that the vtk file was in the groups used to create the Classification Groups:
-    #           - Save the current classification groups
-    #           - Re-compute the new classification groups without this file
-    #           - Define the TMJ OA type of a patient: TODO
-    #           - Recovery the classification groups
+    #           - Re-compute the new classification groups without this file:
+    #             only the mean of the group of this file is updated
+    #           - Define the TMJ OA type of a patient with these classification groups
     #    - Else:
-    #           - Define the TMJ OA type of a patient: TODO
+    #           - Define the TMJ OA type of a patient
+    #    - The current classification groups and vtk files are not modified: the job uses copies
     def onComputeTMJtype(self):
         print "------ Compute the TMJ Type of a patient ------"
         # Check if the user gave all the data used to compute the TMJ OA type of the patient:
         # - VTK input data
-        # - CSV file containing the Classification Groups
-        if not os.path.exists(self.pathLineEdit_selectionClassificationGroups.currentPath):
-            slicer.util.errorDisplay('Miss the CSV file containing the Classification Groups')
+        # - Classification Groups, given by a CSV file or a model of the registry
+        if len(self.dictGroups) == 0:
+            slicer.util.errorDisplay('Miss the Classification Groups: select a CSV file or a registered model')
             return
         if self.MRMLNodeComboBox_VTKFile.currentNode() == None:
             slicer.util.errorDisplay('Miss the VTK Input Data')
             return
 
-        # If the selected file is in the groups used to create the classification groups
-        if self.checkBox_fileInGroups.isChecked():
-            #      Remove the file in the dictionary used to compute the classification groups
-            listSaveVTKFiles = list()
-            vtkfileToRemove = self.MRMLNodeComboBox_VTKFile.currentNode().GetName() + '.vtk'
-            listSaveVTKFiles = self.logic.actionOnDictionary(self.dictVTKFiles,
-                                                             vtkfileToRemove,
-                                                             listSaveVTKFiles,
-                                                             'remove')
-
-            #      Copy the Classification Groups
-            dictGroupsTemp = dict()
-            dictGroupsTemp = self.dictGroups
-            self.dictGroups = dict()
-
-            #      Re-compute the new classification groups
-            self.onComputeNewClassificationGroups()
-
-        # Define the TMJ OA type of a patient
-        # TODO: call the CLI to define the TMJ OA type of a patient
-
-        # If the selected file is in the groups used to create the classification groups
-        if self.checkBox_fileInGroups.isChecked():
-            #      Add the file previously removed to the dictionary used to create the classification groups
-            self.logic.actionOnDictionary(self.dictVTKFiles,
-                                          vtkfileToRemove,
-                                          listSaveVTKFiles,
-                                          'add')
-            #      Recovery the Classification Groups previously saved
-            self.dictGroups = dictGroupsTemp
+        # Copy of the data used by the job
+        polyData = vtk.vtkPolyData()
+        polyData.DeepCopy(self.MRMLNodeComboBox_VTKFile.currentNode().GetPolyData())
+        healthyGroup = self.spinBox_healthyGroup.value
+        if healthyGroup == 0:
+            healthyGroup = None
+        dictVTKFiles = DiagnosticIndexLib.GroupMembership(self.dictVTKFiles)
+        dictGroups = DiagnosticIndexLib.GroupMembership(self.dictGroups)
+        fileInGroups = self.checkBox_fileInGroups.isChecked()
+        vtkfileToRemove = self.filenameOfNode(self.MRMLNodeComboBox_VTKFile.currentNode())
+
+        def computeTMJtype(job):
+            # If the selected file isn't in the groups used to create the classification groups
+            if not fileInGroups:
+                # Define the TMJ OA type of a patient
+                return dict(), self.logic.classifyPatients([polyData], dictGroups, healthyGroup, dictVTKFiles)
+
+            # Else the classification groups are computed without the file in a directory of the workspace,
+            # removed once the patient is classified
+            with self.logic.workspace.temporaryDirectory('leaveOneOut') as directory:
+                #      Remove the file in the dictionary used to compute the classification groups
+                listSaveVTKFiles = self.logic.actionOnDictionary(dictVTKFiles, vtkfileToRemove, list(), 'remove')
+
+                #      Re-compute the new classification groups without the file
+                results, errors = self.logic.computeLeaveOneOutGroups(dictVTKFiles, listSaveVTKFiles[0],
+                                                                      listSaveVTKFiles[1], directory, job)
+                groups = DiagnosticIndexLib.GroupMembership()
+                for key, cacheKey in results.items():
+                    self.logic.storageMean(groups, key, directory, cacheKey)
+
+                # Define the TMJ OA type of a patient
+                job.checkCancelled()
+                return errors, self.logic.classifyPatients([polyData], groups, healthyGroup, dictVTKFiles)
+
+        self.pushButton_applyTMJtype.setEnabled(False)
+        self.submitJob('Classification', computeTMJtype, self.onComputeTMJtypeFinished)
+
+    # Function called when the TMJ OA type of the patient is defined
+    #    - The result is displayed in the tab "Result / Analysis"
+    def onComputeTMJtypeFinished(self, job):
+        self.pushButton_applyTMJtype.setEnabled(True)
+        if job.state == DiagnosticIndexLib.FAILED and not job.timedOut:
+            print job.traceback
+            slicer.util.errorDisplay('The TMJ OA type of the patient could not be computed: \n' + job.error)
+            return
+        if not self.checkJob(job):
+            return
+        errors, result = job.result
+        self.displayGroupErrors(errors)
+
+        # Display of the result
+        text = self.logic.classificationResultText(result, 0)
+        print text
+        self.label_result.setText(text)
+        self.collapsibleButton_Result.setChecked(True)
+        self.onSelectedCollapsibleButtonOpen(self.collapsibleButton_Result)
+        self.logic.saveTrace()
+
+    # ---------------------------------------------------- #
+    #                        Jobs
+    # ---------------------------------------------------- #
+
+    # Function to run a function in a job of the logic (see DiagnosticIndexLib.JobManager)
+    #    - function(job) is run in a thread: it must not use the interface
+    #    - callback(job) is called in the thread of the interface when the job is finished
+    def submitJob(self, name, function, callback):
+        job = self.logic.jobManager.submit(name, function, callback, self.logic.jobTimeout)
+        self.jobTimer.start()
+        self.updateJobsProgress()
+        return job
+
+    # Function to check the end of a job
+    #    - Return True if the job succeeded, else display why it failed or print that it was cancelled
+    def checkJob(self, job):
+        if job.state == DiagnosticIndexLib.DONE:
+            return True
+        if job.state == DiagnosticIndexLib.CANCELLED:
+            print "Job " + job.name + " cancelled"
+        else:
+            if job.traceback:
+                print job.traceback
+            slicer.util.errorDisplay('The job ' + job.name + ' failed: \n' + job.error)
+        return False
+
+    # Function called regularly while jobs are running or while SPV is displaying the preview
+    #    - Call the callbacks of the jobs finished
+    #    - Release the directory of the preview when SPV is closed
+    def onJobTimer(self):
+        self.logic.jobManager.poll()
+
+        if self.previewNode is not None and not self.previewNode.IsBusy():
+            self.logic.workspace.release(self.previewDirectory)
+            self.previewNode = None
+            self.previewDirectory = None
+            self.logic.saveTrace()
+
+        self.updateJobsProgress()
+        if len(self.logic.jobManager.activeJobs()) == 0 and self.previewNode is None:
+            self.jobTimer.stop()
+
+    # Function to display the progress of the jobs
+    def updateJobsProgress(self):
+        jobs = self.logic.jobManager.activeJobs()
+        if len(jobs) == 0:
+            self.widget_jobs.hide()
+            return
+        job = jobs[0]
+        text = job.name + ' (' + job.state + ')'
+        if job.message:
+            text = text + ': ' + job.message
+        if len(jobs) > 1:
+            text = text + ' - ' + str(len(jobs) - 1) + ' job(s) waiting'
+        self.progressBar_jobs.setFormat(text + ' %p%')
+        self.progressBar_jobs.setValue(int(job.progress * 100))
+        self.widget_jobs.show()
+
+    # Function to cancel all the jobs
+    def onCancelJobs(self):
+        self.logic.jobManager.cancelAll()
+        if self.previewNode is not None and self.previewNode.IsBusy():
+            self.previewNode.Cancel()
+
+# ------------------------------------------------------------------------------------
+#                                   TABLE MODEL
+# ------------------------------------------------------------------------------------
+
+
+# Model of the table used for the preview of the vtk files in Shape Population Viewer
+#    - The view only asks the data of the rows displayed: no widget is created for each vtk file
+#    - Column 0: filename of the vtk file
+#    - Column 1: group of the vtk file, changed with a combobox (see GroupComboBoxDelegate)
+#    - Column 2: checkbox to allow the user to choose which models will be displayed in SPV
+#    - Column 3: color that the mesh will have in SPV
+#    - The group of each vtk file is the one in dictVTKFiles (see DiagnosticIndexLib.GroupMembership):
+#      changing the group in the table moves the file in dictVTKFiles
+#    - groupChangedCallback(row, oldGroup) and checkStateChangedCallback(row) are called
+#      when the user changes the group or the checkbox of a row
+class VTKFilesTableModel(qt.QAbstractTableModel):
+    def __init__(self, parent=None):
+        qt.QAbstractTableModel.__init__(self, parent)
+        self.headers = [' VTK files ', ' Group ', ' Visualization ', 'Color']
+        self.dictVTKFiles = DiagnosticIndexLib.GroupMembership()
+        self.groups = list()
+        self.vtkFiles = list()
+        self.filenames = list()
+        self.rowOfFile = dict()
+        self.checkedFiles = set()
+        self.checkedFilesOfGroup = dict()
+        self.colorTransferFunction = None
+        self.groupChangedCallback = None
+        self.checkStateChangedCallback = None
+
+    # Function to fill the model with the vtk files sorted by group
+    def setVTKFiles(self, dictVTKFiles):
+        self.beginResetModel()
+        self.dictVTKFiles = dictVTKFiles
+        self.groups = dictVTKFiles.keys()
+        self.vtkFiles = list()
+        for key in self.groups:
+            self.vtkFiles.extend(dictVTKFiles.files(key))
+        self.filenames = [os.path.basename(vtkFile) for vtkFile in self.vtkFiles]
+        self.rowOfFile = dict((vtkFile, row) for row, vtkFile in enumerate(self.vtkFiles))
+        self.checkedFiles = set()
+        self.checkedFilesOfGroup = dict((key, 0) for key in self.groups)
+        self.colorTransferFunction = None
+        self.endResetModel()
+
+    # Function to recover the group of the vtk file of a row
+    def groupOfRow(self, row):
+        return self.dictVTKFiles.groupOf(self.vtkFiles[row])
+
+    def rowCount(self, parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.vtkFiles)
+
+    def columnCount(self, parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=qt.Qt.DisplayRole):
+        if orientation == qt.Qt.Horizontal and role == qt.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        flags = qt.Qt.ItemIsEnabled
+        if index.column() == 1:
+            flags = flags | qt.Qt.ItemIsEditable
+        elif index.column() == 2:
+            flags = flags | qt.Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=qt.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        if role == qt.Qt.DisplayRole:
+            if column == 0:
+                return self.filenames[row]
+            if column == 1:
+                return str(self.groupOfRow(row))
+        elif role == qt.Qt.EditRole:
+            if column == 1:
+                return self.groupOfRow(row)
+        elif role == qt.Qt.CheckStateRole:
+            if column == 2:
+                if self.vtkFiles[row] in self.checkedFiles:
+                    return qt.Qt.Checked
+                return qt.Qt.Unchecked
+        elif role == qt.Qt.BackgroundRole:
+            if column == 3:
+                return self.color(row)
+        elif role == qt.Qt.TextAlignmentRole:
+            return 0x84
+        return None
+
+    def setData(self, index, value, role=qt.Qt.EditRole):
+        if not index.isValid():
+            return False
+        row = index.row()
+        if index.column() == 1 and role == qt.Qt.EditRole:
+            group = int(value)
+            if group == self.groupOfRow(row) or group not in self.groups:
+                return False
+            oldGroup = self.dictVTKFiles.moveFile(self.vtkFiles[row], group)
+            if self.vtkFiles[row] in self.checkedFiles:
+                self.checkedFilesOfGroup[oldGroup] -= 1
+                self.checkedFilesOfGroup[group] += 1
+            self.emitDataChanged(row, row, 1, 3)
+            if self.groupChangedCallback:
+                self.groupChangedCallback(row, oldGroup)
+            return True
+        if index.column() == 2 and role == qt.Qt.CheckStateRole:
+            self.setFileChecked(self.vtkFiles[row], int(value) == qt.Qt.Checked)
+            self.emitDataChanged(row, row, 2, 3)
+            if self.checkStateChangedCallback:
+                self.checkStateChangedCallback(row)
+            return True
+        return False
+
+    # Function to notify the view that some cells changed
+    def emitDataChanged(self, firstRow, lastRow, firstColumn, lastColumn):
+        if lastRow >= firstRow:
+            self.dataChanged(self.index(firstRow, firstColumn), self.index(lastRow, lastColumn))
+
+    # Function to compute the color of a row: the color of its group in SPV if the row is checked, else white
+    def color(self, row):
+        group = self.groupOfRow(row)
+        if self.vtkFiles[row] in self.checkedFiles and self.colorTransferFunction is not None and group is not None:
+            rgb = self.colorTransferFunction.GetColor(group)
+            return qt.QColor(rgb[0]*255, rgb[1]*255, rgb[2]*255)
+        return qt.QColor(255, 255, 255)
+
+    # Function to change the color transfer function used to compute the colors of the rows
+    def setColorTransferFunction(self, colorTransferFunction):
+        self.colorTransferFunction = colorTransferFunction
+        self.emitDataChanged(0, len(self.vtkFiles) - 1, 3, 3)
+
+    # Function to check or uncheck a vtk file, keeping the number of checked files of each group
+    def setFileChecked(self, vtkFile, checked):
+        if checked == (vtkFile in self.checkedFiles):
+            return False
+        group = self.dictVTKFiles.groupOf(vtkFile)
+        if checked:
+            self.checkedFiles.add(vtkFile)
+            self.checkedFilesOfGroup[group] += 1
+        else:
+            self.checkedFiles.discard(vtkFile)
+            self.checkedFilesOfGroup[group] -= 1
+        return True
+
+    # Function to check or uncheck all the vtk files of a group
+    #    - Only the rows whose checkbox changed are redrawn
+    #    - Return the number of vtk files in the group
+    def setGroupChecked(self, group, checked):
+        if group not in self.dictVTKFiles:
+            return 0
+        vtkFiles = self.dictVTKFiles.files(group)
+        changedRows = [self.rowOfFile[vtkFile] for vtkFile in vtkFiles if self.setFileChecked(vtkFile, checked)]
+        if len(changedRows) > 0:
+            self.emitDataChanged(min(changedRows), max(changedRows), 2, 3)
+        return len(vtkFiles)
+
+    def numberOfCheckedFiles(self, group):
+        return self.checkedFilesOfGroup.get(group, 0)
+
+    # Function to recover the vtk files checked by the user
+    def checkedVTKFiles(self):
+        return [vtkFile for vtkFile in self.vtkFiles if vtkFile in self.checkedFiles]
+
+
+# Delegate used to edit the group of a vtk file with a combobox
+#    - The combobox only exists while the cell is edited
+class GroupComboBoxDelegate(qt.QStyledItemDelegate):
+    def __init__(self, tableModel, parent=None):
+        qt.QStyledItemDelegate.__init__(self, parent)
+        self.tableModel = tableModel
+
+    def createEditor(self, parent, option, index):
+        comboBox = qt.QComboBox(parent)
+        for key in self.tableModel.groups:
+            comboBox.addItem(str(key))
+        comboBox.connect('activated(int)', lambda: self.commitAndCloseEditor(comboBox))
+        return comboBox
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(self.tableModel.groups.index(self.tableModel.groupOfRow(index.row())))
+
+    def setModelData(self, editor, model, index):
+        if editor.currentIndex >= 0:
+            self.tableModel.setData(index, self.tableModel.groups[editor.currentIndex], qt.Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    # Function to save the group as soon as the user chooses it in the combobox
+    def commitAndCloseEditor(self, editor):
+        self.commitData(editor)
+        self.closeEditor(editor)
+
 
 # ------------------------------------------------------------------------------------
 #                                   ALGORITHM
@@ -765,11 +1233,143 @@ class DiagnosticIndexWidget(ScriptedLoadableModuleWidget):
 
 
 class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
-    def __init__(self, interface):
+    # The interface is optional: without it, the logic can be used in Slicer without the module widget
+    # (see DiagnosticIndexLib/Batch.py for the headless batch mode)
+    #    - temporaryPath: directory of the files kept from a session to another, the temporary directory of Slicer
+    #      by default
+    def __init__(self, interface=None, temporaryPath=None):
         self.interface = interface
-        self.table = vtk.vtkTable
+        self.CSVRows = list()
+        self.CSVErrors = list()
         self.colorBar = {'Point1': [0, 0, 1, 0], 'Point2': [0.5, 1, 1, 0], 'Point3': [1, 1, 0, 0]}
 
+        # Backend used to compute the mean of each group:
+        #    - 'inprocess': average of the point arrays computed in Slicer
+        #    - 'statismo': mean of the shape model built by the statismo executables
+        #    - 'shapemodel': statistical shape model (mean, principal modes and variances) fitted in Slicer,
+        #      saved next to the mean as meanGroupN.npz and used for the Mahalanobis score
+        #      (see DiagnosticIndexLib.fitShapeModel)
+        self.meanBackend = 'inprocess'
+        #    Modes kept in the shape models: fraction of the variance explained, maximum number of modes (None: no limit)
+        self.shapeModelVarianceFraction = 0.98
+        self.shapeModelMaximumModes = None
+
+        # Alignment of the meshes of each group by generalized Procrustes analysis before computing the means
+        #    - The aligned points are given directly to the mean and to the shape model (in-process backends),
+        #      statismo aligns the meshes itself (option --procrustes GPA)
+        #    - The patients are aligned on the means of the groups before being classified
+        #    - procrustesScaling: the sizes of the meshes are normalized too
+        #    (see DiagnosticIndexLib.generalizedProcrustes)
+        self.procrustesAlignment = False
+        self.procrustesScaling = False
+        self.procrustesTolerance = 1e-6
+        self.statismoBuildShapeModel = "/Users/lpascal/Applications/Statismo-static/statismo-build/Statismo-build/bin/statismo-build-shape-model"
+        self.vtkBasicSamplingExample = "/Users/lpascal/Applications/Statismo-static/statismo-build/Statismo-build/bin/vtkBasicSamplingExample"
+
+        # Format of all the meshes saved by the module (see DiagnosticIndexLib.MESH_FORMATS):
+        #    - 'ascii' or 'binary': legacy vtk file
+        #    - 'xml' or 'xml-zlib': XML vtp file, raw or compressed
+        #    The meshes given to statismo are always saved in a legacy format
+        self.meshFormat = 'binary'
+
+        # Optional store packing all the meshes of the population in one file opened by memory mapping
+        #    If it is enabled, the in-process means are computed from the store instead of the vtk files
+        self.usePackedStore = False
+        self.packedStore = None
+
+        # Number of groups computed at the same time
+        self.numberOfWorkers = multiprocessing.cpu_count()
+
+        # Directory where the files kept from a session to another are written (cache of the means, packed store)
+        #    Recovered once because the groups are computed in other threads than the one of the application
+        self.temporaryPath = temporaryPath or slicer.app.temporaryPath
+
+        # Workspace where all the intermediate files are written (see DiagnosticIndexLib.Workspace)
+        #    - Each computation, preview and group works in its own directory, removed when it is finished:
+        #      several computations can run at the same time
+        #    - The files of a group whose mean couldn't be computed by statismo are kept for inspection,
+        #      until the workspace exceeds 1 GB
+        #    - Use DiagnosticIndexLib.Workspace(path, size, useMemory=True) to write the files in memory (/dev/shm)
+        self.workspace = DiagnosticIndexLib.Workspace(self.temporaryPath, 1024 * 1024 * 1024)
+
+        # Cache of the means already computed, kept from a session to another
+        #    The mean of a group is found thanks to the paths and the modification time of its vtk files
+        self.meanCache = DiagnosticIndexLib.FileCache(self.temporaryPath + '/DiagnosticIndexMeanCache',
+                                                      1024 * 1024 * 1024)
+
+        # Level of detail of the meshes displayed in ShapePopulationViewer by the preview
+        #    - previewTriangles: number of triangles of each mesh of the preview, 0 to display the meshes at full resolution
+        #    - The decimated meshes are kept from a session to another, found thanks to the path and the modification
+        #      time of their vtk file, their group and the number of triangles
+        self.previewTriangles = 0
+        self.previewCache = DiagnosticIndexLib.FileCache(self.temporaryPath + '/DiagnosticIndexPreviewCache',
+                                                         512 * 1024 * 1024)
+
+        # Index of the metadata of the vtk files (number of points, arrays, topology), kept from a session to another
+        #    The correspondence of the meshes of each group is checked with it before computing the means
+        #    (see DiagnosticIndexLib.MeshMetadataIndex)
+        self.meshMetadataIndex = DiagnosticIndexLib.MeshMetadataIndex(self.temporaryPath + '/DiagnosticIndexMeshMetadata.json')
+
+        # Registry of the Classification Groups exported, kept from a session to another (SQLite database)
+        #    Each export adds a version of the model named after the absolute path of the export directory
+        #    (see DiagnosticIndexLib.ModelRegistry)
+        self.modelRegistry = DiagnosticIndexLib.ModelRegistry(self.temporaryPath + '/DiagnosticIndexModelRegistry.sqlite')
+
+        # Loader shared by all the functions reading a list of vtk files
+        #    The files are read concurrently by a pool of threads to overlap the accesses to the disk
+        self.meshLoader = DiagnosticIndexLib.MeshLoader(8)
+
+        # Scanner of the directories given to create the CSV file
+        #    - The listing of each directory is kept and done again only if the directory changed
+        #    - scanRecursive: the subdirectories are scanned too
+        #    - scanIncludePatterns/scanExcludePatterns: glob patterns or compiled regular expressions
+        #      (see DiagnosticIndexLib.DirectoryScanner)
+        self.directoryScanner = DiagnosticIndexLib.DirectoryScanner()
+        self.scanRecursive = False
+        self.scanIncludePatterns = ['*.vtk']
+        self.scanExcludePatterns = []
+
+        # Classification of the patients
+        #    - If mahalanobisScore is True, the patients are classified with the Mahalanobis distance to each group,
+        #      given by the shape models of the groups if they all have one, else by the variance of each point,
+        #      which needs the vtk files of the groups
+        #    - Else the patients are classified with the RMS distance to the mean of each group
+        #    - The means and the shape models of the groups are kept in memory between two classifications
+        self.mahalanobisScore = False
+        self.classificationMeans = None
+        self.classificationModels = None
+
+        # Jobs run in the background: computation of the groups, preparation of the preview, classification
+        #    - Each job writes its files in its own directory of the workspace: the three kinds of jobs
+        #      can run at the same time
+        #    - jobTimeout: maximum duration of a job in seconds (None: no limit)
+        self.jobManager = DiagnosticIndexLib.JobManager(3)
+        self.jobTimeout = None
+
+        # Instrumentation of the logic (see DiagnosticIndexLib.Tracer)
+        #    Enabled if the environment variable DIAGNOSTICINDEX_TRACE gives the path of the Chrome trace to save
+        self.tracePath = os.environ.get('DIAGNOSTICINDEX_TRACE', None)
+
+    # Function to release the resources of the logic: jobs, threads of the loader, registry and workspace
+    #    The logic can't be used anymore after it
+    def close(self):
+        self.jobManager.close()
+        self.meshLoader.close()
+        self.modelRegistry.close()
+        self.workspace.cleanup()
+
+    # Function to save the spans recorded by the logic since the beginning of the session
+    #    - Chrome trace (chrome://tracing, https://ui.perfetto.dev) saved at tracePath
+    #    - Summary of the spans by operation displayed in the Python console
+    def saveTrace(self):
+        tracer = DiagnosticIndexLib.tracer
+        if not tracer.enabled:
+            return
+        if self.tracePath:
+            tracer.exportChromeTrace(self.tracePath)
+            print "Trace saved in " + self.tracePath
+        print tracer.summaryTable()
+
     # Functions to recovery the widget in the .ui file
     def get(self, objectName):
         return self.findWidget(self.interface.widget, objectName)
@@ -785,17 +1385,28 @@ class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
             return None
 
     # Function to add all the vtk filepaths found in the given directory of a dictionary
+    #    - The vtk files are identified by their filename in the module: if a filename is used by several files
+    #      (in different subdirectories or in another group), the group isn't added
+    #    - Return False if the group couldn't be added
     def addGroupToDictionary(self, dictCSVFile, directory, directoryList, group):
+        vtkFiles = self.directoryScanner.scan(directory, self.scanRecursive,
+                                              self.scanIncludePatterns, self.scanExcludePatterns)
+        groups = DiagnosticIndexLib.GroupMembership(dictCSVFile)
+        groups[group] = vtkFiles
+        duplicates = groups.duplicateFilenames()
+        if len(duplicates) > 0:
+            text = 'The vtk files are identified by their filename, these filenames are used by several files:\n'
+            for filename in sorted(duplicates.keys())[:20]:
+                text = text + filename + ': ' + ', '.join(duplicates[filename]) + '\n'
+            slicer.util.errorDisplay(text)
+            return False
+
         # Fill a dictionary which contains the vtk files for the classification groups sorted by group
-        valueList = list()
-        for file in os.listdir(directory):
-            if file.endswith(".vtk"):
-                filepath = directory + '/' + file
-                valueList.append(filepath)
-        dictCSVFile[group] = valueList
+        dictCSVFile[group] = vtkFiles
 
         # Add the path of the directory
         directoryList.insert((group - 1), directory)
+        return True
 
     # Function to remove the group of the dictionary
     def removeGroupToDictionary(self, dictCSVFile, directoryList, group):
@@ -813,34 +1424,52 @@ class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
         return False
 
     # Function to read a CSV file
+    #    - The file is read row by row and the existence of the vtk files is checked
+    #      with one listing per directory (see DiagnosticIndexLib.readManifest)
+    #    - The errors are kept to be reported all together by creationDictVTKFiles
+    @DiagnosticIndexLib.traced()
     def readCSVFile(self, filename):
         print "CSV FilePath: " + filename
-        CSVreader = vtk.vtkDelimitedTextReader()
-        CSVreader.SetFieldDelimiterCharacters(",")
-        CSVreader.SetFileName(filename)
-        CSVreader.SetHaveHeaders(True)
-        CSVreader.Update()
-
-        self.table = CSVreader.GetOutput()
+        self.CSVRows, self.CSVErrors = DiagnosticIndexLib.readManifest(filename, self.meshLoader.numberOfWorkers)
+
+    # Function to open the packed store of the population given by a CSV file
+    #    - The store is saved in the temporary directory of Slicer
+    #    - It is created again if the vtk files changed since its creation
+    #    - If the vtk files can't be packed (meshes not in correspondence), the store is not used
+    @DiagnosticIndexLib.traced()
+    def loadPackedStore(self, CSVfilePath, dictVTKFiles):
+        self.packedStore = None
+        filepath = self.temporaryPath + '/' + os.path.splitext(os.path.basename(CSVfilePath))[0] + '.dipack'
+        try:
+            if os.path.exists(filepath):
+                store = DiagnosticIndexLib.PackedStore(filepath)
+                if store.isUpToDate(dictVTKFiles):
+                    self.packedStore = store
+                    return
+            print "--- Creation of the packed store " + filepath + " ---"
+            self.packedStore = DiagnosticIndexLib.createPackedStore(filepath, dictVTKFiles)
+        except (IOError, ValueError) as e:
+            print "The vtk files can't be packed: " + str(e)
 
     # Function to create a dictionary containing all the vtk filepaths sorted by group
     #    - the paths are given by a CSV file
-    #    - If one paths doesn't exist
-    #         Return False
+    #    - If one paths doesn't exist or one line can't be read
+    #         Display all the errors in one message and return False
     #      Else if all the path of all vtk file exist
     #         Return True
+    @DiagnosticIndexLib.traced()
     def creationDictVTKFiles(self, dict):
-        for i in range(0,self.table.GetNumberOfRows()):
-            if not os.path.exists(self.table.GetValue(i,0).ToString()):
-                slicer.util.errorDisplay('VTK file not found, path not good at lign ' + str(i+2))
-                return False
-            value = dict.get(self.table.GetValue(i,1).ToInt(), None)
-            if value == None:
-                tempList = list()
-                tempList.append(self.table.GetValue(i,0).ToString())
-                dict[self.table.GetValue(i,1).ToInt()] = tempList
-            else:
-                value.append(self.table.GetValue(i,0).ToString())
+        if len(self.CSVErrors) > 0:
+            text = str(len(self.CSVErrors)) + ' error(s) in the CSV file: \n'
+            text = text + '\n'.join(self.CSVErrors[:20])
+            if len(self.CSVErrors) > 20:
+                text = text + '\n...'
+            for error in self.CSVErrors:
+                print error
+            slicer.util.errorDisplay(text)
+            return False
+        for row in self.CSVRows:
+            dict.addFile(row.path, row.group)
         return True
 
         # Check
@@ -864,163 +1493,101 @@ class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
 
     # Function to add a color map "DisplayClassificationGroup" to all the vtk files
     # which allow the user to visualize each group with a different color in ShapePopulationViewer
-    def addColorMap(self, table, dictVTKFiles):
+    #    - The vtk files with the color map are saved in the directory given
+    #    - If previewTriangles isn't 0, the meshes are decimated to previewTriangles triangles:
+    #      the decimated meshes found in previewCache are copied without reading the vtk files
+    #    - This function can be called in a job (see DiagnosticIndexLib.JobManager): it must not use the interface
+    #    - Return the list of the vtk files which couldn't be read
+    @DiagnosticIndexLib.traced()
+    def addColorMap(self, dictVTKFiles, directory, job=None):
+        # Group of each vtk file
+        groupOfFile = dict()
+        vtkFiles = list()
         for key, value in dictVTKFiles.items():
             for vtkFile in value:
-                # Read VTK File
-                reader = vtk.vtkDataSetReader()
-                reader.SetFileName(vtkFile)
-                reader.ReadAllVectorsOn()
-                reader.ReadAllScalarsOn()
-                reader.Update()
-                polyData = reader.GetOutput()
-
-                # Copy of the polydata
-                polyDataCopy = vtk.vtkPolyData()
-                polyDataCopy.DeepCopy(polyData)
-                pointData = polyDataCopy.GetPointData()
-
-                # Add a New Array "DisplayClassificationGroup" to the polydata copy
-                # which will have as the value for all the points the group associated of the mesh
-                numPts = polyDataCopy.GetPoints().GetNumberOfPoints()
-                arrayName = "DisplayClassificationGroup"
-                hasArrayInt = pointData.HasArray(arrayName)
-                if hasArrayInt == 1:
-                    pointData.RemoveArray(arrayName)
-                arrayToAdd = vtk.vtkDoubleArray()
-                arrayToAdd.SetName(arrayName)
-                arrayToAdd.SetNumberOfComponents(1)
-                arrayToAdd.SetNumberOfTuples(numPts)
-                for i in range(0, numPts):
-                    arrayToAdd.InsertTuple1(i, key)
-                pointData.AddArray(arrayToAdd)
-
-                # Save in the temporary directory in Slicer the vtk file with the new array
-                # to visualize them in Shape Population Viewer
-                writer = vtk.vtkPolyDataWriter()
-                filepath = slicer.app.temporaryPath + '/' + os.path.basename(vtkFile)
-                writer.SetFileName(filepath)
-                if vtk.VTK_MAJOR_VERSION <= 5:
-                    writer.SetInput(polyDataCopy)
-                else:
-                    writer.SetInputData(polyDataCopy)
-                writer.Update()
-                writer.Write()
+                groupOfFile[vtkFile] = key
+                vtkFiles.append(vtkFile)
+        numberOfFiles = len(vtkFiles)
+
+        # Decimated meshes already in the cache
+        previewKeys = dict()
+        if self.previewTriangles > 0:
+            extension = DiagnosticIndexLib.meshExtension(self.meshFormat)
+            filesToRead = list()
+            for vtkFile in vtkFiles:
+                try:
+                    key = DiagnosticIndexLib.digestFiles([vtkFile], ('preview', self.previewTriangles,
+                                                                     groupOfFile[vtkFile], self.meshFormat))
+                    cachedFilepath = self.previewCache.get(key, extension)
+                    if cachedFilepath is not None:
+                        shutil.copyfile(cachedFilepath, directory + '/' + self.meshFilename(os.path.basename(vtkFile)))
+                        continue
+                    previewKeys[vtkFile] = key
+                except (IOError, OSError):
+                    # The file doesn't exist (reported by the loader) or the cached mesh has just been removed
+                    pass
+                filesToRead.append(vtkFile)
+            vtkFiles = filesToRead
+
+        # Read the VTK Files concurrently
+        errors = list()
+        for index, (vtkFile, polyData, error) in enumerate(self.meshLoader.iterPolyData(vtkFiles)):
+            if job is not None:
+                job.checkCancelled()
+                job.setProgress(float(numberOfFiles - len(vtkFiles) + index) / numberOfFiles, os.path.basename(vtkFile))
+            if error is not None:
+                errors.append(vtkFile)
+                print error
+                continue
+
+            # Decimation of the mesh for the preview
+            if self.previewTriangles > 0:
+                polyData = DiagnosticIndexLib.decimatePolyData(polyData, self.previewTriangles)
+
+            # Add a New Array "DisplayClassificationGroup" to a shallow copy of the polydata
+            # which will have as the value for all the points the group associated of the mesh
+            polyDataCopy = DiagnosticIndexLib.addConstantPointArray(polyData, "DisplayClassificationGroup", groupOfFile[vtkFile])
+
+            # Save in the directory the vtk file with the new array to visualize them in Shape Population Viewer
+            filepath = directory + '/' + self.meshFilename(os.path.basename(vtkFile))
+            self.saveVTKFile(polyDataCopy, filepath)
+            if vtkFile in previewKeys:
+                self.previewCache.put(previewKeys[vtkFile], filepath)
+        return errors
 
     # Function to create a CSV file containing all the selected vtk files that the user wants to display in SPV
-    def creationCSVFileForSPV(self, filename, table, dictVTKFiles):
+    #    - The vtk files are the ones with the color map saved in the directory by addColorMap
+    @DiagnosticIndexLib.traced()
+    def creationCSVFileForSPV(self, filename, vtkFiles, directory):
         # Creation a CSV file with a header 'VTK Files'
         file = open(filename, 'w')
         cw = csv.writer(file, delimiter=',')
         cw.writerow(['VTK Files'])
 
         # Add the path of the vtk files if the users selected it
-        for row in range(0,table.rowCount):
-            # check the checkBox
-            widget = table.cellWidget(row, 2)
-            tuple = widget.children()
-            checkBox = qt.QCheckBox()
-            checkBox = tuple[1]
-            if checkBox.isChecked():
-                # Recovery of group fo each vtk file
-                widget = table.cellWidget(row, 1)
-                tuple = widget.children()
-                comboBox = qt.QComboBox()
-                comboBox = tuple[1]
-                group = comboBox.currentIndex + 1
-                # Recovery of the vtk filename
-                qlabel = table.cellWidget(row, 0)
-                vtkFile = qlabel.text
-                pathVTKFile = slicer.app.temporaryPath + '/' + vtkFile
-                cw.writerow([pathVTKFile])
+        for vtkFile in vtkFiles:
+            pathVTKFile = directory + '/' + self.meshFilename(os.path.basename(vtkFile))
+            cw.writerow([pathVTKFile])
         file.close()
 
     # Function to fill the table of the preview of all VTK files
     #    - Checkable combobox: allow the user to select one or several groups that he wants to display in SPV
-    #    - Column 0: filename of the vtk file
-    #    - Column 1: combobox with the group corresponding to the vtk file
-    #    - Column 2: checkbox to allow the user to choose which models will be displayed in SPV
-    #    - Column 3: color that the mesh will have in SPV
-    def fillTableForPreviewVTKFilesInSPV(self, dictVTKFiles, checkableComboBox, table):
-        row = 0
-        for key, value in dictVTKFiles.items():
-            # Fill the Checkable Combobox
+    #    - Table: model of the vtk files (see VTKFilesTableModel)
+    def fillTableForPreviewVTKFilesInSPV(self, dictVTKFiles, checkableComboBox, tableModel):
+        # Fill the Checkable Combobox
+        checkableComboBox.clear()
+        for key in sorted(dictVTKFiles.keys()):
             checkableComboBox.addItem("Group " + str(key))
-            # Table:
-            for vtkFile in value:
-                table.setRowCount(row + 1)
-                # Column 0:
-                filename = os.path.basename(vtkFile)
-                labelVTKFile = qt.QLabel(filename)
-                labelVTKFile.setAlignment(0x84)
-                table.setCellWidget(row, 0, labelVTKFile)
-
-                # Column 1:
-                widget = qt.QWidget()
-                layout = qt.QHBoxLayout(widget)
-                comboBox = qt.QComboBox()
-                comboBox.addItems(dictVTKFiles.keys())
-                comboBox.setCurrentIndex(key - 1)
-                layout.addWidget(comboBox)
-                layout.setAlignment(0x84)
-                layout.setContentsMargins(0, 0, 0, 0)
-                widget.setLayout(layout)
-                table.setCellWidget(row, 1, widget)
-                comboBox.connect('currentIndexChanged(int)', self.interface.onGroupValueChanged)
-
-                # Column 2:
-                widget = qt.QWidget()
-                layout = qt.QHBoxLayout(widget)
-                checkBox = qt.QCheckBox()
-                layout.addWidget(checkBox)
-                layout.setAlignment(0x84)
-                layout.setContentsMargins(0, 0, 0, 0)
-                widget.setLayout(layout)
-                table.setCellWidget(row, 2, widget)
-                checkBox.connect('stateChanged(int)', self.interface.onCheckBoxTableValueChanged)
-
-                # Column 3:
-                table.setItem(row, 3, qt.QTableWidgetItem())
-                table.item(row,3).setBackground(qt.QColor(255,255,255))
-
-                row = row + 1
-
-    # Function to change the group of a vtk file
-    #     - The user can change the group thanks to the combobox in the table used for the preview in SPV
-    def onComboBoxTableValueChanged(self, dictVTKFiles, table):
-        # For each row of the table
-        for row in range(0,table.rowCount):
-            # Recovery of the group associated to the vtk file which is in the combobox
-            widget = table.cellWidget(row, 1)
-            tuple = widget.children()
-            comboBox = qt.QComboBox()
-            comboBox = tuple[1]
-            group = comboBox.currentIndex + 1
-            # Recovery of the filename of vtk file
-            qlabel = table.cellWidget(row, 0)
-            vtkFile = qlabel.text
-
-            # Update the dictionary if the vtk file has not the same group in the combobox than in the dictionary
-            value = dictVTKFiles.get(group, None)
-            if not any(vtkFile in s for s in value):
-                # Find which list of the dictionary the vtk file is in
-                for value in dictVTKFiles.values():
-                    if any(vtkFile in s for s in value):
-                        pathList = [s for s in value if vtkFile in s]
-                        path = pathList[0]
-                        # Remove the vtk file from the wrong group
-                        value.remove(path)
-                        # Add the vtk file in the right group
-                        newvalue = dictVTKFiles.get(group, None)
-                        newvalue.append(path)
-                        break
+
+        # Table
+        tableModel.setVTKFiles(dictVTKFiles)
 
     # Function to create the same color transfer function than there is in SPV
     def creationColorTransfer(self, groupSelected):
         # Creation of the color transfer function with the updated range
         colorTransferFunction = vtk.vtkColorTransferFunction()
         if len(groupSelected) > 0:
-            groupSelectedList = list(groupSelected)
+            groupSelectedList = sorted(groupSelected)
             rangeColorTransfer = [groupSelectedList[0], groupSelectedList[len(groupSelectedList) - 1]]
             colorTransferFunction.AdjustRange(rangeColorTransfer)
             for key, value in self.colorBar.items():
@@ -1033,202 +1600,279 @@ class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
                 colorTransferFunction.AddRGBPoint(x,r,g,b)
         return colorTransferFunction
 
-    # Function to copy and delete all the arrays of all the meshes contained in a list
-    def deleteArrays(self, key, value):
-        for vtkFile in value:
-            # Read VTK File
-            reader = vtk.vtkDataSetReader()
-            reader.SetFileName(vtkFile)
-            reader.ReadAllVectorsOn()
-            reader.ReadAllScalarsOn()
-            reader.Update()
-            polyData = reader.GetOutput()
-
-            # Copy of the polydata
-            polyDataCopy = vtk.vtkPolyData()
-            polyDataCopy.DeepCopy(polyData)
-            pointData = polyDataCopy.GetPointData()
-
-            # Remove all the arrays
-            numAttributes = pointData.GetNumberOfArrays()
-            for i in range(0, numAttributes):
-                pointData.RemoveArray(0)
-
-            # Creation of the path of the vtk file without arrays to save it in the temporary directory of Slicer
-            #    If there is just one file in the list, it is renamed meanGroupKey.vtk
-            if len(value) > 1:
-                filename = os.path.basename(vtkFile)
-            else:
-                filename = 'meanGroup' + str(key) + '.vtk'
-            filepath = slicer.app.temporaryPath + '/' + filename
-
-            # Save the vtk file without array in the temporary directory in Slicer
-            self.saveVTKFile(polyDataCopy, filepath)
+    # Function to create the pipeline computing the groups with the parameters of the logic
+    #    The pipeline is shared with the batch mode (see DiagnosticIndexLib.GroupPipeline)
+    def groupPipeline(self):
+        return DiagnosticIndexLib.GroupPipeline(self.meshLoader,
+                                                numberOfWorkers=self.numberOfWorkers,
+                                                meshFormat=self.meshFormat,
+                                                meanBackend=self.meanBackend,
+                                                procrustesAlignment=self.procrustesAlignment,
+                                                procrustesScaling=self.procrustesScaling,
+                                                procrustesTolerance=self.procrustesTolerance,
+                                                shapeModelVarianceFraction=self.shapeModelVarianceFraction,
+                                                shapeModelMaximumModes=self.shapeModelMaximumModes,
+                                                statismoBuildShapeModel=self.statismoBuildShapeModel,
+                                                vtkBasicSamplingExample=self.vtkBasicSamplingExample,
+                                                workspace=self.workspace,
+                                                meanCache=self.meanCache,
+                                                store=self.packedStore)
 
     # Function to save a VTK file to the filepath given
-    def saveVTKFile(self, polydata, filepath):
-        writer = vtk.vtkPolyDataWriter()
-        writer.SetFileName(filepath)
-        if vtk.VTK_MAJOR_VERSION <= 5:
-            writer.SetInput(polydata)
-        else:
-            writer.SetInputData(polydata)
-        writer.Update()
-        writer.Write()
-
-    # Creation of a txt file that will be used to create the shape model thanks to the CLI statismo-build-shape-model
-    #    To be conformed, the txt file will have one path of a mesh-file per line
-    def creationTXTFile(self, key, value):
-        # Filepath of the txt file
-        filename = "group" + str(key)
-        dataListPath = slicer.app.temporaryPath + '/' + filename + '.txt'
-
-        # Write one path of a mesh-file per line
-        file = open(dataListPath, "w")
-        for vtkFile in value:
-            pathfile = slicer.app.temporaryPath + '/' + os.path.basename(vtkFile)
-            file.write(pathfile + "\n")
-        file.close()
-        return dataListPath
-
-    # Function to compute the mean between all the mesh-files contained in one group
-    def computeMean(self, key, datalist):
-        print "--- Compute the mean of the group " + str(key) + " ---"
-
-        # Call of statismo-build-shape-model used to build a shape model from a given list of meshes
-        # Arguments:
-        #  --data-list is the path to a file containing a list of mesh-files that will be used to create the shape model
-        #  --output-file is the path where the newly build model should be saved (creation of hdf5 file)
-
-        #     Creation of the command line
-        statismoBuildShapeModel = "/Users/lpascal/Applications/Statismo-static/statismo-build/Statismo-build/bin/statismo-build-shape-model"
-        arguments = list()
-        arguments.append("--data-list")
-        arguments.append(datalist)
-        arguments.append("--output-file")
-        filename = "group" + str(key)
-        outputFile = slicer.app.temporaryPath + '/' + filename + '.h5'
-        arguments.append(outputFile)
-
-        #     Call the CLI
-        process = qt.QProcess()
-        print "Calling " + os.path.basename(statismoBuildShapeModel)
-        process.start(statismoBuildShapeModel, arguments)
-        process.waitForStarted()
-        # print "state: " + str(process.state())
-        process.waitForFinished()
-        # print "error: " + str(process.error())
-
-
-        # Call of vtkBasicSamplingExample which will save the mean of the group contained in the hdf5 file
-        # Arguments:
-        #  First argument:   path of the hdf5 file created previously
-        #  Second argument:  path of the directory where the 3 following vtk files will be save:
-        #                       - mean.vtk
-        #                       - samplePC1.vtk
-        #                       - randomsample.vtk
-
-        #     Creation of the command line
-        vtkBasicSamplingExample = "/Users/lpascal/Applications/Statismo-static/statismo-build/Statismo-build/bin/vtkBasicSamplingExample"
-        arguments = list()
-        modelname = outputFile
-        arguments.append(modelname)
-        resultdir = slicer.app.temporaryPath
-        arguments.append(resultdir)
-
-        #     Call the executable
-        process2 = qt.QProcess()
-        print "Calling " + os.path.basename(vtkBasicSamplingExample)
-        process2.start(vtkBasicSamplingExample, arguments)
-        process2.waitForStarted()
-        # print "state: " + str(process2.state())
-        process2.waitForFinished()
-        # print "error: " + str(process2.error())
-
-        # Rename of the mean of the group
-        oldname = slicer.app.temporaryPath + '/mean.vtk'
-        newname = slicer.app.temporaryPath + '/meanGroup' + str(key) + '.vtk'
-        os.rename(oldname, newname)
-
-    # Function to remove in the temporary directory all the data used to create the mean for each group
-    def removeDataInTemporaryDirectory(self, key, value):
-        # remove of 'groupX.txt'
-        filename = "group" + str(key)
-        dataListPath = slicer.app.temporaryPath + '/' + filename + '.txt'
-        if os.path.exists(dataListPath):
-            os.remove(dataListPath)
-
-        # remove of 'groupX.h5'
-        outputFilePath = slicer.app.temporaryPath + '/' + filename + '.h5'
-        if os.path.exists(outputFilePath):
-            os.remove(outputFilePath)
-
-        # remove of samplePC1.vtk and randomsample.vtk
-        path = slicer.app.temporaryPath + '/samplePC1.vtk'
-        if os.path.exists(path):
-            os.remove(path)
-        path = slicer.app.temporaryPath + '/randomsample.vtk'
-        if os.path.exists(path):
-            os.remove(path)
-
-        # remove of all the vtk file
-        for vtkFile in value:
-            filepath = slicer.app.temporaryPath + '/' + os.path.basename(vtkFile)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+    #    - If no format is given, the format of the module is used (meshFormat)
+    def saveVTKFile(self, polydata, filepath, meshFormat=None):
+        if meshFormat == None:
+            meshFormat = self.meshFormat
+        DiagnosticIndexLib.writePolyData(polydata, filepath, meshFormat)
+
+    # Function to change the extension of a filename to the one of the format of the module
+    def meshFilename(self, filename):
+        return os.path.splitext(filename)[0] + DiagnosticIndexLib.meshExtension(self.meshFormat)
+
+    # Function to compute the mean of all the groups of a dictionary
+    #    - The groups are computed concurrently by numberOfWorkers threads (see DiagnosticIndexLib.GroupPipeline)
+    #    - The means are saved in the directory given, created in the workspace by the caller
+    #    - Return two dictionaries sorted by group:
+    #           - the groups successfully computed
+    #           - the error messages of the groups which failed
+    #    - If a job is given (see DiagnosticIndexLib.JobManager), its progress is updated after each group
+    #      and the computation stops if it is cancelled
+    @DiagnosticIndexLib.traced()
+    def computeGroups(self, dictVTKFiles, directory, job=None):
+        return self.groupPipeline().computeGroups(dictVTKFiles, directory, job)
+
+    # Function to compute the groups of a dictionary with the group key without the vtk file given
+    #    - The mean of the group key is computed from the mean of the whole group
+    #      (see DiagnosticIndexLib.GroupPipeline.computeLeaveOneOutGroup)
+    #    - Return the same dictionaries as computeGroups
+    @DiagnosticIndexLib.traced(groupArgument=2)
+    def computeLeaveOneOutGroups(self, dictVTKFiles, key, vtkFile, directory, job=None):
+        return self.groupPipeline().computeLeaveOneOutGroups(dictVTKFiles, key, vtkFile, directory, job)
 
     # Function to storage the mean of each group in a dictionary
-    def storageMean(self, dictGroups, key):
-        filename = "meanGroup" + str(key)
-        meanPath = slicer.app.temporaryPath + '/' + filename + '.vtk'
+    #    - The mean was computed in the directory given
+    #    - If the key of the mean in the cache is given and the mean isn't already cached, the mean is added to the cache
+    @DiagnosticIndexLib.traced(groupArgument=2)
+    def storageMean(self, dictGroups, key, directory, cacheKey=None):
+        pipeline = self.groupPipeline()
         value = list()
-        value.append(meanPath)
+        value.append(pipeline.meanPath(key, directory))
         dictGroups[key] = value
+        pipeline.cacheGroup(key, directory, cacheKey)
 
     # Function to create a CSV file containing all the vtk files with the group corresponding
     #    - This CSV file will be use to create a new Classification Groups
     #    - This file is created from a dictionary filled thanks to teh first tab
     def creationCSVFileForClassificationGroups(self, filePath, dictForCSV):
-        file = open(filePath, 'w')
-        cw = csv.writer(file, delimiter=',')
-        cw.writerow(['VTK Files', 'Group'])
-        for key, value in dictForCSV.items():
-            for VTKPath in value:
-                cw.writerow([VTKPath, str(key)])
-        file.close()
+        DiagnosticIndexLib.writeGroupsCSVFile(filePath, dictForCSV)
 
 
     # Function to save the data of the new Classification Groups in the directory given by the user
     #       - The mean vtk files of each groups
     #       - The CSV file containing the path of each mean group with the group associated
-    def saveNewClassificationGroups(self, CSVfilePath, directory, dictGroups):
-
-        # Save the mean vtk files of each groups
-        dictForCSV = dict()
-        for key, value in dictGroups.items():
-            if os.path.exists(value[0]):
-                # Read VTK File
-                reader = vtk.vtkDataSetReader()
-                reader.SetFileName(value[0])
-                reader.ReadAllVectorsOn()
-                reader.ReadAllScalarsOn()
-                reader.Update()
-                polyData = reader.GetOutput()
-
-                # Creation of the path of the vtk file
-                VTKFilename = os.path.basename(value[0])
-                VTKFilePath = directory + '/' + VTKFilename
-
-                # Save the vtk file
-                self.saveVTKFile(polyData, VTKFilePath)
-
-                # Fill a dictionary which will be used to created the CSV file containing the Classification Groups
-                valueList = list()
-                valueList.append(VTKFilePath)
-                dictForCSV[key] = valueList
-
-        # Save the CSV file containing the path of each mean group with the group associated
-        self.creationCSVFileForClassificationGroups(CSVfilePath, dictForCSV)
+    #      (see DiagnosticIndexLib.GroupPipeline.saveClassificationGroups)
+    #    - The groups saved are registered in the registry (see registerClassificationGroups)
+    #    - dictVTKFiles: vtk files from which the groups were computed, saved in the registry
+    #    - name: name of the model registered, the absolute path of the directory by default: the exports
+    #      in two directories with the same name aren't versions of the same model
+    #    - Return the name and the version of the model registered, None if it couldn't be registered
+    @DiagnosticIndexLib.traced()
+    def saveNewClassificationGroups(self, CSVfilePath, directory, dictGroups, dictVTKFiles=None, name=None):
+        dictForCSV, meanOfGroup, errors = self.groupPipeline().saveClassificationGroups(CSVfilePath, directory,
+                                                                                      dictGroups)
+
+        # Error message for the files which couldn't be read
+        if len(errors) > 0:
+            slicer.util.errorDisplay('These VTK files could not be read: \n' + '\n'.join(errors))
+
+        # Registration of the groups saved, named after the directory
+        if len(dictForCSV) == 0:
+            return None
+        if name is None:
+            name = os.path.abspath(directory)
+        try:
+            version = self.registerClassificationGroups(name, dictForCSV, meanOfGroup, dictVTKFiles)
+        except (sqlite3.Error, IOError, OSError) as e:
+            print "The Classification Groups could not be registered: " + str(e)
+            return None
+        return name, version
+
+    # Function to register a new version of a model in the registry
+    #    - dictGroups: mean vtk file of each group, meanOfGroup: points of the mean of each group
+    #    - The parameters used to compute the means, the vtk files of each group and the array of the means
+    #      are saved with the model (see DiagnosticIndexLib.GroupPipeline.registerClassificationGroups)
+    #    - Return the version of the model
+    def registerClassificationGroups(self, name, dictGroups, meanOfGroup, dictVTKFiles=None):
+        return self.groupPipeline().registerClassificationGroups(self.modelRegistry, name, dictGroups, meanOfGroup,
+                                                                 dictVTKFiles)
+
+    # Function to load the Classification Groups of a version of a model of the registry
+    #    - The array of the means saved in the registry is used to classify the patients if the files
+    #      of the means and of the shape models didn't change, else the content of the means is checked
+    #    - Return the model (see DiagnosticIndexLib.RegisteredModel), the mean vtk file of each group
+    #      and the list of the errors, empty if the model can be used
+    @DiagnosticIndexLib.traced()
+    def loadRegisteredModel(self, name, version=None):
+        model = self.modelRegistry.get(name, version)
+        if model is None:
+            raise KeyError('The model ' + str(name) + ' version ' + str(version) + ' is not registered')
+        dictGroups = DiagnosticIndexLib.GroupMembership()
+        for key, group in model.groups.items():
+            dictGroups[key] = [group.meanPath]
+        try:
+            keys, meanFiles, modelFiles, digest = self.classificationFiles(dictGroups)
+        except OSError:
+            return model, dictGroups, self.modelRegistry.verify(model)
+        means = self.modelRegistry.getDerived(model.name, model.version, 'means', digest)
+        if means is None:
+            return model, dictGroups, self.modelRegistry.verify(model)
+        self.classificationMeans = (digest, keys, means)
+        return model, dictGroups, []
+
+    # Function to load the means of the Classification Groups in the scene and display them
+    #    - The healthy group is white and visible, the other groups are red and hidden, all with an opacity of 0.8
+    #    - The other models of the scene are hidden
+    #    - The models of the scene are indexed by name once: a mean already loaded from the same file is reused
+    #    - All the models are loaded and modified in one batch of the scene, so that the views are updated once
+    #    - Return the dictionary {group: model node} and the list of the files which couldn't be loaded
+    @DiagnosticIndexLib.traced()
+    def displayClassificationGroups(self, dictGroups, healthyGroup):
+        scene = slicer.mrmlScene
+        modelsLogic = slicer.modules.models.logic()
+        modelOfGroup = dict()
+        errors = list()
+        scene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+        try:
+            # Index of the models of the scene by name
+            modelsByName = dict()
+            models = scene.GetNodesByClass('vtkMRMLModelNode')
+            for index in range(models.GetNumberOfItems()):
+                model = models.GetItemAsObject(index)
+                modelsByName.setdefault(model.GetName(), list()).append(model)
+
+            # Model of each group, loaded if it isn't already in the scene
+            for key in sorted(dictGroups.keys()):
+                filepath = dictGroups[key][0]
+                name = os.path.splitext(os.path.basename(filepath))[0]
+                modelOfGroup[key] = None
+                for model in modelsByName.get(name, list()):
+                    storageNode = model.GetStorageNode()
+                    if storageNode is not None and storageNode.GetFileName() \
+                            and os.path.normpath(storageNode.GetFileName()) == os.path.normpath(filepath):
+                        modelOfGroup[key] = model
+                        break
+                if modelOfGroup[key] is None:
+                    modelOfGroup[key] = modelsLogic.AddModel(filepath)
+                if modelOfGroup[key] is None:
+                    del modelOfGroup[key]
+                    errors.append(filepath)
+
+            # Display properties of all the models, each display node being modified once
+            groupModelIDs = set([model.GetID() for model in modelOfGroup.values()])
+            for models in modelsByName.values():
+                for model in models:
+                    displayNode = model.GetDisplayNode()
+                    if displayNode is None or model.GetHideFromEditors() or model.GetID() in groupModelIDs:
+                        continue
+                    displayNode.SetVisibility(False)
+            for key, model in modelOfGroup.items():
+                displayNode = model.GetDisplayNode()
+                if displayNode is None:
+                    model.CreateDefaultDisplayNodes()
+                    displayNode = model.GetDisplayNode()
+                wasModifying = displayNode.StartModify()
+                if key == healthyGroup:
+                    displayNode.SetColor(1, 1, 1)
+                    displayNode.SetVisibility(True)
+                else:
+                    displayNode.SetColor(1, 0, 0)
+                    displayNode.SetVisibility(False)
+                displayNode.SetOpacity(0.8)
+                displayNode.EndModify(wasModifying)
+        finally:
+            scene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+        return modelOfGroup, errors
+
+    # Function to get the files of the Classification Groups (see DiagnosticIndexLib.classificationFiles)
+    #    - Return the sorted list of the groups, the mean vtk file and the shape model of each group
+    #      (None if the group has no model), and the digest of all these files
+    def classificationFiles(self, dictGroups):
+        return DiagnosticIndexLib.classificationFiles(dictGroups)
+
+    # Function to load the means of the Classification Groups in an array of shape (G, numPts, 3)
+    #    - The means are read once, then kept in memory while their files don't change
+    #    - Return the list of the groups and the array of the means
+    @DiagnosticIndexLib.traced()
+    def loadClassificationMeans(self, dictGroups):
+        groups, meanFiles, modelFiles, digest = self.classificationFiles(dictGroups)
+        if self.classificationModels is None or not self.classificationModels[0] == digest:
+            self.classificationModels = (digest, DiagnosticIndexLib.loadClassificationModels(modelFiles))
+        if self.classificationMeans is None or not self.classificationMeans[0] == digest:
+            pointsList, errors = self.meshLoader.loadPoints(meanFiles)
+            if len(errors) > 0:
+                raise IOError('These VTK files could not be read: \n' + '\n'.join(errors.keys()))
+            numPts = set([points.shape[0] for points in pointsList])
+            if len(numPts) > 1:
+                raise ValueError('The means of the Classification Groups are not in correspondence')
+            self.classificationMeans = (digest, groups, numpy.array(pointsList))
+        return self.classificationMeans[1], self.classificationMeans[2]
+
+    # Function to load the shape models of the Classification Groups, saved next to their means
+    #    - Return the list of the models in the order of the groups, None if a group has no model
+    def loadClassificationModels(self, dictGroups):
+        self.loadClassificationMeans(dictGroups)
+        return self.classificationModels[1]
+
+    # Function to define the TMJ OA type of several patients at once
+    #    - polyDataList: meshes of the patients, in correspondence with the means of the Classification Groups
+    #    - All the patients are scored against all the groups in one vectorized pass (see DiagnosticIndexLib.classifyShapes)
+    #    - If procrustesAlignment is True, the patients are aligned on the average of the means of the groups
+    #    - If mahalanobisScore is True:
+    #           - if all the groups have a shape model, the covariance of the models is used
+    #           - else if the vtk files of the groups are given, the variance of each point of each group is used
+    @DiagnosticIndexLib.traced(meshesArgument=1)
+    def classifyPatients(self, polyDataList, dictGroups, healthyGroup=None, dictVTKFiles=None):
+        if len(dictGroups) == 0:
+            raise ValueError('There is no Classification Groups')
+        groups, means = self.loadClassificationMeans(dictGroups)
+        shapes = numpy.array([DiagnosticIndexLib.getPointsArray(polyData) for polyData in polyDataList])
+        pipeline = self.groupPipeline()
+
+        models = None
+        variances = None
+        if self.mahalanobisScore:
+            models = self.loadClassificationModels(dictGroups)
+        if self.mahalanobisScore and models is None and dictVTKFiles and all([key in dictVTKFiles for key in groups]):
+            variances = pipeline.groupVariances(groups, dictVTKFiles)
+
+        return pipeline.classifyShapes(shapes, groups, means, healthyGroup, variances, models)
+
+    # Function to draw random shapes from the shape model of a Classification Group
+    #    - The shapes have the topology of the mean of the group
+    #    - Return a list of polydata
+    def sampleShapeModel(self, dictGroups, key, numberOfSamples=1, seed=None):
+        meanPath = dictGroups[key][0]
+        modelPath = DiagnosticIndexLib.shapeModelOfMean(meanPath)
+        if modelPath is None:
+            raise IOError('The group ' + str(key) + ' has no shape model: compute it with the shapemodel backend')
+        model = DiagnosticIndexLib.loadShapeModel(modelPath)
+        reference = DiagnosticIndexLib.readPolyData(meanPath)
+        pointsType = DiagnosticIndexLib.getPointsArray(reference).dtype
+        return [DiagnosticIndexLib.createPolyDataFromPoints(reference, points.astype(pointsType))
+                for points in model.sample(numberOfSamples, seed)]
+
+    # Function to write the result of the classification of a patient
+    def classificationResultText(self, result, index):
+        text = 'TMJ OA type: Group ' + str(result['assignedGroup'][index]) + '\n'
+        if result['diagnosticIndex'] is not None:
+            text = text + 'Diagnostic index: ' + '%.3f' % result['diagnosticIndex'][index] + '\n'
+        text = text + 'Ranking of the groups: ' + ', '.join([str(group) for group in result['ranking'][index]]) + '\n'
+        for groupIndex, group in enumerate(result['groups']):
+            text = text + 'Group ' + str(group) + ': RMS distance ' + '%.4f' % result['rms'][index, groupIndex]
+            if result['mahalanobis'] is not None:
+                text = text + ', Mahalanobis distance ' + '%.4f' % result['mahalanobis'][index, groupIndex]
+            text = text + '\n'
+        return text
 
     # Function to make some action on a dictionary
     def actionOnDictionary(self, dict, file, listSaveVTKFiles, action):
@@ -1246,25 +1890,87 @@ class DiagnosticIndexLogic(ScriptedLoadableModuleLogic):
         #            Return False
         if action == 'remove' or action == 'find':
             if not file == None:
-                for key, value in dict.items():
-                    for vtkFile in value:
-                        filename = os.path.basename(vtkFile)
-                        if filename == file:
-                            if action == 'remove':
-                                value.remove(vtkFile)
-                                listSaveVTKFiles.append(key)
-                                listSaveVTKFiles.append(vtkFile)
-                                return listSaveVTKFiles
-                            return True
+                vtkFile = dict.findFile(file)
+                if not vtkFile == None:
+                    if action == 'remove':
+                        listSaveVTKFiles.append(dict.removeFile(vtkFile))
+                        listSaveVTKFiles.append(vtkFile)
+                        return listSaveVTKFiles
+                    return True
             return False
 
         # Action Add:
         #      Add a vtk file to the dictionary dict at the given key contained in the first case of the list
         if action == 'add':
             if not listSaveVTKFiles == None and not file == None:
-                value = dict.get(listSaveVTKFiles[0], None)
-                value.append(listSaveVTKFiles[1])
-
+                dict.addFile(listSaveVTKFiles[1], listSaveVTKFiles[0])
 
 class DiagnosticIndexTest(ScriptedLoadableModuleTest):
-    pass
+    # The tests of DiagnosticIndexLib, which need only VTK and numpy, are in Testing/Python/DiagnosticIndexLibTest.py
+    def setUp(self):
+        slicer.mrmlScene.Clear(0)
+
+    def runTest(self):
+        self.setUp()
+        self.test_ComputeExportClassify()
+
+    # Function to write a group of spheres stretched along x by the factor given, with some noise
+    def createGroup(self, directory, key, stretch, numberOfShapes, random):
+        sphere = vtk.vtkSphereSource()
+        sphere.SetThetaResolution(10)
+        sphere.SetPhiResolution(10)
+        sphere.Update()
+        reference = sphere.GetOutput()
+        points = DiagnosticIndexLib.getPointsArray(reference).astype(numpy.float64)
+        value = list()
+        for index in range(numberOfShapes):
+            shape = points * [stretch, 1, 1] + random.normal(scale=0.01, size=points.shape)
+            filepath = directory + '/group' + str(key) + '_' + str(index) + '.vtk'
+            DiagnosticIndexLib.writePolyData(DiagnosticIndexLib.createPolyDataFromPoints(reference, shape),
+                                             filepath, 'binary')
+            value.append(filepath)
+        return value
+
+    # Computation, export and registration of the Classification Groups of a population of two groups,
+    # then classification of a mesh of each group
+    def test_ComputeExportClassify(self):
+        self.delayDisplay("Starting the test")
+        import tempfile
+        directory = tempfile.mkdtemp()
+        random = numpy.random.RandomState(0)
+        dictVTKFiles = {1: self.createGroup(directory, 1, 1.0, 4, random),
+                        2: self.createGroup(directory, 2, 1.5, 4, random)}
+
+        logic = DiagnosticIndexLogic(temporaryPath=directory)
+        try:
+            # Means of the groups
+            groupsDirectory = logic.workspace.createDirectory('groups')
+            results, errors = logic.computeGroups(dictVTKFiles, groupsDirectory)
+            self.assertEqual(len(errors), 0)
+            dictGroups = DiagnosticIndexLib.GroupMembership()
+            for key, cacheKey in results.items():
+                logic.storageMean(dictGroups, key, groupsDirectory, cacheKey)
+            for key, value in dictVTKFiles.items():
+                points = numpy.array([DiagnosticIndexLib.getPointsArray(DiagnosticIndexLib.readPolyData(vtkFile))
+                                      for vtkFile in value])
+                mean = DiagnosticIndexLib.getPointsArray(DiagnosticIndexLib.readPolyData(dictGroups[key][0]))
+                self.assertTrue(numpy.allclose(mean, points.mean(axis=0), atol=1e-5))
+
+            # Export and registration
+            exportDirectory = directory + '/export'
+            os.makedirs(exportDirectory)
+            registered = logic.saveNewClassificationGroups(exportDirectory + '/NewClassificationGroups.csv',
+                                                           exportDirectory, dictGroups, dictVTKFiles)
+            self.assertIsNotNone(registered)
+            model, dictGroups, errors = logic.loadRegisteredModel(*registered)
+            self.assertEqual(len(errors), 0)
+
+            # Classification
+            polyDataList = [DiagnosticIndexLib.readPolyData(dictVTKFiles[key][0]) for key in [1, 2]]
+            result = logic.classifyPatients(polyDataList, dictGroups, 1, dictVTKFiles)
+            self.assertEqual(list(result['assignedGroup']), [1, 2])
+            self.assertTrue(result['diagnosticIndex'][0] < 0.5 < result['diagnosticIndex'][1])
+        finally:
+            logic.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        self.delayDisplay("Test passed!")
@@ -0,0 +1,367 @@
+# Headless batch mode of DiagnosticIndex: CSV file -> group means -> classification of the patients -> results
+#
+# The whole pipeline is run from a manifest (JSON file), without any Qt widget:
+#    Slicer --no-main-window --python-script <path>/DiagnosticIndexLib/Batch.py manifest.json
+#    python -m DiagnosticIndexLib.Batch manifest.json     (VTK and numpy only)
+#
+# The means are computed and the patients classified by the same pipeline as the module
+# (see DiagnosticIndexLib.GroupPipeline), with the same backends, cache of the means and registry.
+#
+# Manifest (relative paths are relative to the directory of the manifest):
+#    {
+#      "groupsCSV": "VTKFilesToCreateClassificationGroups.csv",   vtk files and groups used to compute the means
+#      "patients": ["patient1.vtk", "patient2.vtk"],              vtk files of the patients to classify
+#      "outputDirectory": "results",
+#      "healthyGroup": 1,                                         optional, needed for the diagnostic index
+#      "meshFormat": "binary",                                    optional, format of the means saved
+#      "numberOfWorkers": 8,                                      optional, number of threads
+#      "meanBackend": "inprocess",                                optional, 'inprocess', 'statismo' or 'shapemodel'
+#      "shapeModelVarianceFraction": 0.98,                        optional, modes kept by the shapemodel backend
+#      "shapeModelMaximumModes": null,
+#      "procrustesAlignment": false,                              optional, alignment of the meshes of each group
+#      "procrustesScaling": false,                                and of the patients
+#      "procrustesTolerance": 1e-6,
+#      "statismoBuildShapeModel": "statismo-build-shape-model",   executables of the statismo backend
+#      "vtkBasicSamplingExample": "vtkBasicSamplingExample",
+#      "mahalanobis": false,                                      optional, classification with the Mahalanobis distance
+#      "leaveOneOut": true,                                       optional, a patient of the groups is removed
+#                                                                 from the mean of its group before being classified
+#      "workspace": "results/workspace",                          optional, directory of the intermediate files,
+#                                                                 of the cache of the means and of the registry,
+#                                                                 kept from a run to another (the temporary
+#                                                                 directory of Slicer shares them with the module)
+#      "modelName": "results",                                    optional, name of the model registered,
+#                                                                 the absolute path of the output directory
+#                                                                 by default, like the exports of the module
+#      "trace": "trace.json"                                      optional, Chrome trace of the pipeline
+#                                                                 (see DiagnosticIndexLib.Tracer)
+#    }
+#    The parameters of the means are the ones of DiagnosticIndexLogic, with the same default values
+#
+# Files written in the output directory:
+#    - meanGroupN.vtk (or .vtp), meanGroupN.npz with the shapemodel backend and NewClassificationGroups.csv,
+#      like the export of the module
+#    - DiagnosticIndexResults.csv and DiagnosticIndexResults.json: classification of each patient
+#
+# The exit code is 1 if the run failed or if the mean of a group or the classification of a patient failed
+import os
+import sys
+import csv
+import json
+import traceback
+import sqlite3
+import multiprocessing
+
+import numpy
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import DiagnosticIndexLib
+
+# Number of patients scored at the same time
+PATIENTS_PER_BATCH = 64
+
+
+# Function to read a manifest and resolve its relative paths
+def readManifest(filepath):
+    file = open(filepath, 'r')
+    manifest = json.load(file)
+    file.close()
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+
+    def resolve(path):
+        if os.path.isabs(path):
+            return path
+        return os.path.normpath(os.path.join(directory, path))
+
+    manifest['groupsCSV'] = resolve(manifest['groupsCSV'])
+    manifest['outputDirectory'] = resolve(manifest['outputDirectory'])
+    manifest['patients'] = [resolve(path) for path in manifest.get('patients', list())]
+    for key in ['trace', 'workspace']:
+        if key in manifest:
+            manifest[key] = resolve(manifest[key])
+    return manifest
+
+
+# Function to read a CSV file containing vtk files sorted by group (columns: VTK Files, Group)
+#    - If some lines are wrong or some vtk files don't exist, all the errors are reported at once
+def readGroupsCSVFile(filepath, numberOfWorkers):
+    rows, errors = DiagnosticIndexLib.readManifest(filepath, numberOfWorkers)
+    if len(errors) > 0:
+        raise RuntimeError(str(len(errors)) + ' error(s) in the CSV file ' + filepath + ':\n' + '\n'.join(errors))
+    dictVTKFiles = dict()
+    for row in rows:
+        dictVTKFiles.setdefault(row.group, list()).append(row.path)
+    return dictVTKFiles
+
+
+# Function to check that the meshes of each group are in correspondence, from the headers of the vtk files
+#    - All the errors are reported at once, before computing the means
+@DiagnosticIndexLib.traced('batch')
+def checkGroups(dictVTKFiles, metadataIndex):
+    errors = metadataIndex.checkGroups(dictVTKFiles)
+    if len(errors) > 0:
+        raise RuntimeError('The meshes of some groups are not in correspondence:\n'
+                           + '\n'.join(error for key in sorted(errors.keys()) for error in errors[key]))
+
+
+# Function to create the pipeline computing the groups with the parameters of the manifest,
+# the same pipeline as the module (see DiagnosticIndexLib.GroupPipeline)
+def createPipeline(manifest, loader, numberOfWorkers, workspace, meanCache):
+    return DiagnosticIndexLib.GroupPipeline(loader,
+                                            numberOfWorkers=numberOfWorkers,
+                                            meshFormat=manifest.get('meshFormat', 'binary'),
+                                            meanBackend=manifest.get('meanBackend', 'inprocess'),
+                                            procrustesAlignment=manifest.get('procrustesAlignment', False),
+                                            procrustesScaling=manifest.get('procrustesScaling', False),
+                                            procrustesTolerance=manifest.get('procrustesTolerance', 1e-6),
+                                            shapeModelVarianceFraction=manifest.get('shapeModelVarianceFraction', 0.98),
+                                            shapeModelMaximumModes=manifest.get('shapeModelMaximumModes', None),
+                                            statismoBuildShapeModel=manifest.get('statismoBuildShapeModel', None),
+                                            vtkBasicSamplingExample=manifest.get('vtkBasicSamplingExample', None),
+                                            workspace=workspace,
+                                            meanCache=meanCache)
+
+
+# Function to compute the means of all the groups concurrently and to save them in the output directory
+#    - The means are computed in a directory of the workspace, or found in the cache,
+#      then saved in the output directory with the CSV file of the Classification Groups, like the export of the module
+#    - Return the mean vtk file saved for each group, the points of each mean
+#      and the errors of the groups which failed
+@DiagnosticIndexLib.traced('batch')
+def computeMeans(pipeline, dictVTKFiles, directory):
+    with pipeline.workspace.temporaryDirectory('groups') as groupsDirectory:
+        results, errors = pipeline.computeGroups(dictVTKFiles, groupsDirectory)
+        dictGroups = dict()
+        groupOfMean = dict()
+        for key, cacheKey in results.items():
+            dictGroups[key] = [pipeline.meanPath(key, groupsDirectory)]
+            groupOfMean[dictGroups[key][0]] = key
+            pipeline.cacheGroup(key, groupsDirectory, cacheKey)
+        dictForCSV, meanOfGroup, readErrors = pipeline.saveClassificationGroups(
+            os.path.join(directory, 'NewClassificationGroups.csv'), directory, dictGroups)
+    for vtkFile in readErrors:
+        errors[groupOfMean[vtkFile]] = 'The mean ' + vtkFile + ' could not be read'
+    return dictForCSV, meanOfGroup, errors
+
+
+# Function to register the Classification Groups saved in the registry, like the export of the module
+#    - Return the version of the model, None if it couldn't be registered
+@DiagnosticIndexLib.traced('batch')
+def registerMeans(pipeline, registry, name, dictGroups, meanOfGroup, dictVTKFiles):
+    try:
+        version = pipeline.registerClassificationGroups(registry, name, dictGroups, meanOfGroup, dictVTKFiles)
+    except (sqlite3.Error, IOError, OSError) as e:
+        print("The Classification Groups could not be registered: " + str(e))
+        return None
+    print("Classification Groups registered as " + DiagnosticIndexLib.modelDisplayName(name) + " version "
+          + str(version) + " (" + name + ")")
+    return version
+
+
+# Function to convert the classification of one patient (see DiagnosticIndexLib.classifyShapes) to a dictionary
+def patientResult(patient, scores, index, groups):
+    result = {'patient': patient,
+              'assignedGroup': int(scores['assignedGroup'][index]),
+              'ranking': [int(group) for group in scores['ranking'][index]],
+              'rms': dict((str(group), float(scores['rms'][index, groupIndex])) for groupIndex, group in enumerate(groups))}
+    if scores['diagnosticIndex'] is not None:
+        result['diagnosticIndex'] = float(scores['diagnosticIndex'][index])
+    if scores['mahalanobis'] is not None:
+        result['mahalanobis'] = dict((str(group), float(scores['mahalanobis'][index, groupIndex]))
+                                     for groupIndex, group in enumerate(groups))
+    return result
+
+
+# Function to classify the patients by batches
+#    - The patients are scored against the means saved, by batches of PATIENTS_PER_BATCH patients
+#    - With leaveOneOut, a patient which is in a group is classified against the mean of its group without it,
+#      computed by the pipeline like in the module (see DiagnosticIndexLib.GroupPipeline.computeLeaveOneOutGroup)
+#    - With mahalanobis, the shape models of the groups are used if they all have one,
+#      else the variance of each point of each group: the group of a patient removed from its group
+#      has no shape model, the variance of the group without the patient is used
+#    - Return one dictionary per patient
+@DiagnosticIndexLib.traced('batch', meshesArgument=1)
+def classifyPatients(pipeline, patients, groups, means, models, dictVTKFiles, healthyGroup, mahalanobis, leaveOneOut):
+    groupOfPatient = dict()
+    if leaveOneOut:
+        for key, value in dictVTKFiles.items():
+            for vtkFile in value:
+                groupOfPatient[os.path.normpath(vtkFile)] = (key, vtkFile)
+
+    variances = [None]
+
+    def groupVariances():
+        if variances[0] is None:
+            variances[0] = pipeline.groupVariances(groups, dictVTKFiles)
+        return variances[0]
+
+    def classify(shapes, patientMeans, patientVariances, patientModels):
+        if not mahalanobis:
+            return pipeline.classifyShapes(shapes, groups, patientMeans, healthyGroup)
+        if patientModels is not None:
+            return pipeline.classifyShapes(shapes, groups, patientMeans, healthyGroup, None, patientModels)
+        return pipeline.classifyShapes(shapes, groups, patientMeans, healthyGroup, patientVariances())
+
+    results = dict()
+    for start in range(0, len(patients), PATIENTS_PER_BATCH):
+        batch = patients[start:start + PATIENTS_PER_BATCH]
+        pointsList, errors = pipeline.loader.loadPoints(batch)
+        batchPatients = list()
+        for patient, points in zip(batch, pointsList):
+            if points is None:
+                results[patient] = {'patient': patient, 'error': errors[patient]}
+                continue
+            if points.shape != means.shape[1:]:
+                results[patient] = {'patient': patient, 'error': 'The patient has ' + str(points.shape[0])
+                                    + ' points and the group means ' + str(means.shape[1])
+                                    + ': the meshes must be in correspondence'}
+                continue
+            key, vtkFile = groupOfPatient.get(os.path.normpath(patient), (None, None))
+            if key is None or key not in groups or len(dictVTKFiles[key]) < 2:
+                batchPatients.append((patient, points))
+                continue
+
+            # Mean of the group of the patient without it
+            try:
+                value = [path for path in dictVTKFiles[key] if not path == vtkFile]
+                index = groups.index(key)
+                patientMeans = means.copy()
+                with pipeline.workspace.temporaryDirectory('leaveOneOut') as directory:
+                    pipeline.computeLeaveOneOutGroup(key, value, vtkFile, directory)
+                    patientMeans[index] = DiagnosticIndexLib.getPointsArray(
+                        DiagnosticIndexLib.readPolyData(pipeline.meanPath(key, directory)))
+
+                def patientVariances():
+                    leaveOneOutVariances = groupVariances().copy()
+                    leaveOneOutVariances[index] = pipeline.groupVariance(key, value)
+                    return leaveOneOutVariances
+                scores = classify(points[numpy.newaxis], patientMeans, patientVariances, None)
+            except (ValueError, IOError) as e:
+                results[patient] = {'patient': patient, 'error': str(e)}
+                continue
+            results[patient] = patientResult(patient, scores, 0, groups)
+
+        # Patients scored against the means of the whole groups, all at once
+        if len(batchPatients) > 0:
+            scores = classify(numpy.array([points for patient, points in batchPatients]), means, groupVariances, models)
+            for index, (patient, points) in enumerate(batchPatients):
+                results[patient] = patientResult(patient, scores, index, groups)
+    return [results[patient] for patient in patients]
+
+
+# Function to save the results of the classification in a CSV file and a JSON file
+@DiagnosticIndexLib.traced('batch')
+def saveResults(results, groups, directory):
+    file = open(os.path.join(directory, 'DiagnosticIndexResults.json'), 'w')
+    json.dump(results, file, indent=2)
+    file.close()
+
+    file = open(os.path.join(directory, 'DiagnosticIndexResults.csv'), 'w')
+    cw = csv.writer(file, delimiter=',')
+    cw.writerow(['Patient', 'TMJ OA Type', 'Diagnostic Index', 'Ranking']
+                + ['RMS Group ' + str(group) for group in groups]
+                + ['Mahalanobis Group ' + str(group) for group in groups]
+                + ['Error'])
+    for result in results:
+        row = [result['patient'],
+               result.get('assignedGroup', ''),
+               result.get('diagnosticIndex', ''),
+               ' '.join([str(group) for group in result.get('ranking', list())])]
+        row = row + [result.get('rms', dict()).get(str(group), '') for group in groups]
+        row = row + [result.get('mahalanobis', dict()).get(str(group), '') for group in groups]
+        row.append(result.get('error', ''))
+        cw.writerow(row)
+    file.close()
+
+
+# Function to run the whole pipeline described by a manifest
+#    - Return the results of the classification of the patients and the errors of the groups whose mean
+#      could not be computed
+def runManifest(manifest):
+    numberOfWorkers = manifest.get('numberOfWorkers', multiprocessing.cpu_count())
+    healthyGroup = manifest.get('healthyGroup', None)
+    tracer = DiagnosticIndexLib.tracer
+    if manifest.get('trace', None):
+        tracer.enabled = True
+    outputDirectory = manifest['outputDirectory']
+    if not os.path.exists(outputDirectory):
+        os.makedirs(outputDirectory)
+
+    # Files kept from a run to another, in the same layout as in the temporary directory of Slicer
+    workspaceDirectory = manifest.get('workspace', os.path.join(outputDirectory, 'workspace'))
+    if not os.path.exists(workspaceDirectory):
+        os.makedirs(workspaceDirectory)
+    loader = DiagnosticIndexLib.MeshLoader(numberOfWorkers)
+    workspace = DiagnosticIndexLib.Workspace(workspaceDirectory, 1024 * 1024 * 1024)
+    meanCache = DiagnosticIndexLib.FileCache(workspaceDirectory + '/DiagnosticIndexMeanCache', 1024 * 1024 * 1024)
+    metadataIndex = DiagnosticIndexLib.MeshMetadataIndex(workspaceDirectory + '/DiagnosticIndexMeshMetadata.json',
+                                                         numberOfWorkers)
+    registry = DiagnosticIndexLib.ModelRegistry(workspaceDirectory + '/DiagnosticIndexModelRegistry.sqlite')
+    pipeline = createPipeline(manifest, loader, numberOfWorkers, workspace, meanCache)
+
+    try:
+        # Means of the groups
+        print("------ Compute the means of the groups of " + manifest['groupsCSV'] + " ------")
+        dictVTKFiles = readGroupsCSVFile(manifest['groupsCSV'], numberOfWorkers)
+        checkGroups(dictVTKFiles, metadataIndex)
+        dictGroups, meanOfGroup, errors = computeMeans(pipeline, dictVTKFiles, outputDirectory)
+        for key, error in errors.items():
+            print("Error in the group " + str(key) + ":\n" + error)
+        if len(dictGroups) == 0:
+            raise RuntimeError('The mean of no group could be computed')
+        registerMeans(pipeline, registry, manifest.get('modelName', os.path.abspath(outputDirectory)),
+                      dictGroups, meanOfGroup, dictVTKFiles)
+
+        groups, meanFiles, modelFiles, digest = DiagnosticIndexLib.classificationFiles(dictGroups)
+        if len(set([meanOfGroup[key].shape for key in groups])) > 1:
+            raise RuntimeError('The means of the Classification Groups are not in correspondence')
+        means = numpy.array([meanOfGroup[key] for key in groups])
+        models = None
+        if manifest.get('mahalanobis', False):
+            models = DiagnosticIndexLib.loadClassificationModels(modelFiles)
+
+        # Classification of the patients
+        print("------ Classify " + str(len(manifest['patients'])) + " patients ------")
+        results = classifyPatients(pipeline, manifest['patients'], groups, means, models, dictVTKFiles,
+                                   healthyGroup, manifest.get('mahalanobis', False), manifest.get('leaveOneOut', True))
+        saveResults(results, groups, outputDirectory)
+    finally:
+        loader.close()
+        registry.close()
+        workspace.cleanup()
+        if manifest.get('trace', None):
+            tracer.exportChromeTrace(manifest['trace'])
+            print(tracer.summaryTable())
+    print("Results saved in " + outputDirectory)
+    return results, errors
+
+
+# Function to run the batch mode from the command line
+#    - Return 0 if all the groups and all the patients were processed, 1 otherwise
+def main(arguments):
+    if len(arguments) != 1:
+        print("Usage: Batch.py manifest.json")
+        return 1
+    results, errors = runManifest(readManifest(arguments[0]))
+    failedPatients = [result['patient'] for result in results if 'error' in result]
+    if len(failedPatients) > 0:
+        print(str(len(failedPatients)) + " patient(s) could not be classified: " + ', '.join(failedPatients))
+    if len(errors) > 0 or len(failedPatients) > 0:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # Slicer keeps running after the script: it has to be exited whatever happens, or a headless run hangs
+    try:
+        exitCode = main(sys.argv[1:])
+    except Exception:
+        print(traceback.format_exc())
+        exitCode = 1
+    if 'slicer' in sys.modules:
+        import slicer
+        slicer.app.exit(exitCode)
+    else:
+        sys.exit(exitCode)
@@ -0,0 +1,96 @@
+import os
+import csv
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+# Row of a CSV file of vtk files
+#    - line: line of the row in the CSV file (the header is the line 1)
+#    - path: path of the vtk file (first column), a relative path is relative to the directory of the CSV file
+#    - group: group of the vtk file (second column)
+#    - metadata: dictionary of the other columns, indexed by their header
+ManifestRow = namedtuple('ManifestRow', ['line', 'path', 'group', 'metadata'])
+
+
+# Function to read a CSV file of vtk files row by row, without loading the whole file
+#    - The errors of the rows which can't be read are added to the list errors and the rows are skipped
+def iterManifestRows(filepath, errors):
+    file = open(filepath, 'r')
+    try:
+        reader = csv.reader(file, delimiter=',')
+        header = next(reader, None)
+        if header is None:
+            errors.append('The CSV file ' + filepath + ' is empty')
+            return
+        metadataNames = [name.strip() for name in header[2:]]
+        directory = os.path.dirname(os.path.abspath(filepath))
+        line = 1
+        for row in reader:
+            line = line + 1
+            if len(row) == 0 or (len(row) == 1 and row[0].strip() == ''):
+                continue
+            if len(row) < 2:
+                errors.append('Line ' + str(line) + ': missing group')
+                continue
+            try:
+                group = int(row[1])
+            except ValueError:
+                errors.append('Line ' + str(line) + ': group "' + row[1] + '" is not an integer')
+                continue
+            metadata = dict(zip(metadataNames, row[2:]))
+            path = os.path.normpath(os.path.join(directory, row[0].strip()))
+            yield ManifestRow(line, path, group, metadata)
+    finally:
+        file.close()
+
+
+# Function to list the names of the files of a directory
+#    - Return None if the directory can't be listed
+def listDirectory(directory):
+    try:
+        return set(os.listdir(directory))
+    except OSError:
+        return None
+
+
+# Function to read a CSV file of vtk files and check that all the vtk files exist
+#    - The existence of the files is checked per directory: each directory is listed once,
+#      instead of one access per file, and the directories are listed concurrently while the CSV file is read
+#    - A file missing from the listing is checked on its own: on a case-insensitive file system,
+#      the path may differ in case from the name listed
+#    - All the errors are collected, the reading doesn't stop at the first one
+#    - The vtk files are identified by their filename in the module: a file with the same filename as a file
+#      of a previous row (in another directory) is an error
+#    - Return the list of the rows (ManifestRow) of the existing vtk files and the list of the errors
+def readManifest(filepath, numberOfWorkers=8):
+    errors = list()
+    rows = list()
+    listings = dict()
+    pool = ThreadPool(numberOfWorkers)
+    try:
+        for row in iterManifestRows(filepath, errors):
+            directory = os.path.dirname(row.path)
+            if directory not in listings:
+                listings[directory] = pool.apply_async(listDirectory, (directory,))
+            rows.append(row)
+
+        # Check of the existence of the vtk files
+        for directory, listing in list(listings.items()):
+            listings[directory] = listing.get()
+    finally:
+        pool.close()
+        pool.join()
+
+    existingRows = list()
+    rowOfFilename = dict()
+    for row in rows:
+        filename = os.path.basename(row.path)
+        filenames = listings[os.path.dirname(row.path)]
+        if (filenames is None or filename not in filenames) and not os.path.isfile(row.path):
+            errors.append('Line ' + str(row.line) + ': VTK file not found ' + row.path)
+        elif filename in rowOfFilename and rowOfFilename[filename].path != row.path:
+            errors.append('Line ' + str(row.line) + ': the filename of ' + row.path + ' is already used by '
+                          + rowOfFilename[filename].path + ' (line ' + str(rowOfFilename[filename].line) + ')')
+        else:
+            rowOfFilename.setdefault(filename, row)
+            existingRows.append(row)
+    return existingRows, errors
@@ -0,0 +1,79 @@
+import numpy
+
+# Smallest variance used for the Mahalanobis score, to avoid the divisions by zero
+MINIMUM_VARIANCE = 1e-12
+
+
+# Function to score shapes against the means of the classification groups
+#    - shapes: array of shape (B, numPts, 3), one row per patient
+#    - means: array of shape (G, numPts, 3), one row per group
+#    - variances: optional array of shape (G, numPts), variance of each point of each group
+#    - models: optional list of the G shape models of the groups (see DiagnosticIndexLib.ShapeModel)
+#    - All the patients are scored against all the groups at once:
+#      |x - m|^2 = |x|^2 + |m|^2 - 2 x.m is computed for every pair without building the (B, G, numPts, 3) differences
+#    - Return a dictionary of arrays:
+#           - 'distances': (B, G, numPts) distance between each point of a patient and of a group mean
+#           - 'rms': (B, G) root mean square of the distances
+#           - 'mahalanobis': (B, G) Mahalanobis distance with a diagonal covariance, if variances are given,
+#             or with the covariance of the shape model of each group, if models are given
+def scoreShapes(shapes, means, variances=None, models=None):
+    shapes = numpy.asarray(shapes, dtype=numpy.float64)
+    means = numpy.asarray(means, dtype=numpy.float64)
+    if shapes.ndim == 2:
+        shapes = shapes[numpy.newaxis]
+    if shapes.shape[1:] != means.shape[1:]:
+        raise ValueError('The patients have ' + str(shapes.shape[1]) + ' points and the group means '
+                         + str(means.shape[1]) + ': the meshes must be in correspondence')
+
+    squaredDistances = ((shapes ** 2).sum(axis=2)[:, numpy.newaxis, :]
+                        + (means ** 2).sum(axis=2)[numpy.newaxis, :, :]
+                        - 2 * numpy.einsum('bpk,gpk->bgp', shapes, means))
+    numpy.maximum(squaredDistances, 0, out=squaredDistances)
+
+    scores = dict()
+    scores['distances'] = numpy.sqrt(squaredDistances)
+    scores['rms'] = numpy.sqrt(squaredDistances.mean(axis=2))
+    if models is not None:
+        scores['mahalanobis'] = numpy.array([model.mahalanobisDistance(shapes) for model in models]).T
+    elif variances is not None:
+        variances = numpy.maximum(numpy.asarray(variances, dtype=numpy.float64), MINIMUM_VARIANCE)
+        scores['mahalanobis'] = numpy.sqrt((squaredDistances / variances[numpy.newaxis]).sum(axis=2))
+    else:
+        scores['mahalanobis'] = None
+    return scores
+
+
+# Function to classify shapes against the means of the classification groups
+#    - groups: list of the G groups, in the order of the means
+#    - healthyGroup: group of the healthy patients, used to compute the diagnostic index
+#    - The score used is the Mahalanobis distance if the variances or the shape models are given,
+#      else the RMS distance
+#    - Return the dictionary of scoreShapes with:
+#           - 'groups': (G,) groups in the order of the scores
+#           - 'ranking': (B, G) groups sorted from the closest to the farthest for each patient
+#           - 'assignedGroup': (B,) closest group of each patient
+#           - 'diagnosticIndex': (B,) score to the healthy group / (score to the healthy group + score to the
+#             closest other group): 0 for a healthy shape, above 0.5 when a disease group is closer than
+#             the healthy group. None if the healthy group isn't given or is the only group
+def classifyShapes(shapes, means, groups, healthyGroup=None, variances=None, models=None):
+    scores = scoreShapes(shapes, means, variances, models)
+    groups = numpy.asarray(groups)
+    if scores['mahalanobis'] is not None:
+        score = scores['mahalanobis']
+    else:
+        score = scores['rms']
+
+    order = numpy.argsort(score, axis=1)
+    scores['groups'] = groups
+    scores['ranking'] = groups[order]
+    scores['assignedGroup'] = groups[order[:, 0]]
+
+    scores['diagnosticIndex'] = None
+    if healthyGroup is not None and healthyGroup in groups and len(groups) > 1:
+        healthyIndex = list(groups).index(healthyGroup)
+        healthyScore = score[:, healthyIndex]
+        otherScores = numpy.delete(score, healthyIndex, axis=1)
+        closestOtherScore = otherScores.min(axis=1)
+        total = healthyScore + closestOtherScore
+        scores['diagnosticIndex'] = numpy.where(total > 0, healthyScore / numpy.where(total > 0, total, 1), 0.5)
+    return scores
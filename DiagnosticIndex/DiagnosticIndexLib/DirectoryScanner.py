@@ -0,0 +1,98 @@
+import os
+import fnmatch
+import threading
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# Function to check if a file matches one of the patterns given
+#    - A pattern is either a glob pattern (string), matched against the name of the file
+#      and against its path relative to the scanned directory,
+#      or a compiled regular expression, searched in the relative path
+def matchPatterns(name, relativePath, patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'search'):
+            if pattern.search(relativePath):
+                return True
+        elif fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relativePath, pattern):
+            return True
+    return False
+
+
+# Scanner of directories keeping the listing of each directory already scanned
+#    - A directory is listed again only if its modification time changed
+#      (a file or a subdirectory has been added, removed or renamed)
+#    - The listings use scandir when it is available, which gives the type of the entries without any other access
+class DirectoryScanner(object):
+    def __init__(self):
+        self.listings = dict()
+        self.lock = threading.Lock()
+
+    # Function to list the files and the subdirectories of one directory
+    #    - Return two sorted lists of names: the files and the subdirectories
+    def listDirectory(self, directory):
+        mtime = os.stat(directory).st_mtime
+        with self.lock:
+            cached = self.listings.get(directory, None)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        files = list()
+        subdirectories = list()
+        if scandir is not None:
+            for entry in scandir(directory):
+                if entry.is_dir():
+                    subdirectories.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        else:
+            for name in os.listdir(directory):
+                if os.path.isdir(os.path.join(directory, name)):
+                    subdirectories.append(name)
+                else:
+                    files.append(name)
+        files.sort()
+        subdirectories.sort()
+        with self.lock:
+            self.listings[directory] = (mtime, files, subdirectories)
+        return files, subdirectories
+
+    # Function to find the files of a directory
+    #    - recursive: the subdirectories are scanned too
+    #    - includePatterns: the files must match one of these patterns (see matchPatterns)
+    #    - excludePatterns: the files and the subdirectories matching one of these patterns are skipped
+    #    - Return the sorted list of the paths of the files found
+    def scan(self, directory, recursive=False, includePatterns=('*',), excludePatterns=()):
+        filepaths = list()
+        visited = set()
+        directories = [(directory, '')]
+        while len(directories) > 0:
+            currentDirectory, relativeDirectory = directories.pop(0)
+            realPath = os.path.realpath(currentDirectory)
+            if realPath in visited:
+                continue
+            visited.add(realPath)
+
+            files, subdirectories = self.listDirectory(currentDirectory)
+            for name in files:
+                relativePath = relativeDirectory + name
+                if matchPatterns(name, relativePath, includePatterns) \
+                        and not matchPatterns(name, relativePath, excludePatterns):
+                    filepaths.append(os.path.join(currentDirectory, name))
+            if recursive:
+                for name in subdirectories:
+                    relativePath = relativeDirectory + name
+                    if not matchPatterns(name, relativePath, excludePatterns):
+                        directories.append((os.path.join(currentDirectory, name), relativePath + '/'))
+        return sorted(filepaths)
+
+    # Function to forget all the listings
+    def clear(self):
+        with self.lock:
+            self.listings = dict()
@@ -0,0 +1,37 @@
+import os
+import time
+import subprocess
+
+from .Tracing import tracer
+
+
+# Function to run an executable and wait until it is finished
+#    - Can be called from any thread: the process is not attached to the Qt event loop
+#    - If the executable can't be started or returns an error code, an exception is raised
+#      with the output of the executable
+#    - If a job is given (see Jobs.Job), the process is killed when the job is cancelled
+def runProcess(executable, arguments, job=None):
+    print("Calling " + os.path.basename(executable))
+    with tracer.span('runProcess', 'process', executable=os.path.basename(executable)) as span:
+        try:
+            process = subprocess.Popen([executable] + list(arguments),
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise RuntimeError('Unable to start ' + executable + ': ' + str(e))
+        if tracer.enabled:
+            span.set(startupTime=time.time() - span.start)
+        if job is not None:
+            job.addProcess(process)
+        try:
+            output = process.communicate()[0]
+        finally:
+            if job is not None:
+                job.removeProcess(process)
+        span.set(exitCode=process.returncode)
+    if job is not None:
+        job.checkCancelled()
+    if process.returncode != 0:
+        raise RuntimeError(os.path.basename(executable) + ' failed with the exit code '
+                           + str(process.returncode) + ':\n' + output.decode('utf-8', 'replace'))
+    return output
@@ -0,0 +1,103 @@
+import os
+import shutil
+import hashlib
+import threading
+
+
+# Function to encode a text in utf-8 if it isn't already a byte string
+def toBytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+# Function to compute the key of a list of files
+#    - The key is a hash of the sorted paths of the files and of their digest:
+#           - size and modification time of each file
+#           - or, if hashContent is True, content of each file
+#    - parameters is added to the key to separate the results computed with different options
+def digestFiles(filepaths, parameters='', hashContent=False):
+    digest = hashlib.sha1()
+    digest.update(toBytes(str(parameters)))
+    for filepath in sorted(filepaths):
+        digest.update(b'\0' + toBytes(filepath) + b'\0')
+        if hashContent:
+            with open(filepath, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            stat = os.stat(filepath)
+            digest.update(toBytes(str(stat.st_size) + ':' + repr(stat.st_mtime)))
+    return digest.hexdigest()
+
+
+# Persistent cache of files stored in a directory and indexed by a key
+#    - The last time a file has been used is its modification time in the cache,
+#      so the least recently used files are removed when the size of the cache is over its maximum size
+#    - The cache can be shared by several threads
+class FileCache(object):
+    def __init__(self, directory, maximumSize):
+        self.directory = directory
+        self.maximumSize = maximumSize
+        self.lock = threading.Lock()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    # Function to get the path of a file in the cache
+    def filepath(self, key, extension='.vtk'):
+        return os.path.join(self.directory, key + extension)
+
+    # Function to check if a key is in the cache
+    def contains(self, key, extension='.vtk'):
+        return os.path.exists(self.filepath(key, extension))
+
+    # Function to get the file stored for a key
+    #    - Return the path of the file in the cache, or None if the key isn't cached
+    def get(self, key, extension='.vtk'):
+        filepath = self.filepath(key, extension)
+        with self.lock:
+            if not os.path.exists(filepath):
+                return None
+            # Mark the file as the most recently used
+            os.utime(filepath, None)
+        return filepath
+
+    # Function to store a copy of a file for a key
+    #    - Return the path of the file in the cache
+    def put(self, key, sourceFilepath):
+        extension = os.path.splitext(sourceFilepath)[1]
+        filepath = self.filepath(key, extension)
+        temporaryFilepath = filepath + '.' + str(threading.current_thread().ident) + '.part'
+        shutil.copyfile(sourceFilepath, temporaryFilepath)
+        with self.lock:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            os.rename(temporaryFilepath, filepath)
+            self.evict(filepath)
+        return filepath
+
+    # Function to remove the least recently used files until the size of the cache is under its maximum size
+    #    - keep: path of a file which is never removed (file just stored, whose time may be the one of older files)
+    def evict(self, keep=None):
+        entries = list()
+        size = 0
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.part'):
+                continue
+            filepath = os.path.join(self.directory, filename)
+            stat = os.stat(filepath)
+            if filepath != keep:
+                entries.append((stat.st_mtime, stat.st_size, filepath))
+            size = size + stat.st_size
+        entries.sort()
+        for mtime, fileSize, filepath in entries:
+            if size <= self.maximumSize:
+                break
+            os.remove(filepath)
+            size = size - fileSize
+
+    # Function to remove all the files of the cache
+    def clear(self):
+        with self.lock:
+            for filename in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, filename))
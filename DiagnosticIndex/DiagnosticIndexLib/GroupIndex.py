@@ -0,0 +1,136 @@
+from collections import OrderedDict
+import os
+
+
+# Index of the vtk files of a population sorted by group
+#    - It can be used as the dictionary {group: list of vtk files} used everywhere in the module
+#      (keys, values, items, get, [], in, len): the lists returned are copies
+#    - Each vtk file is in one group: the group of a file, the files of a group and a file from its filename
+#      are found without looking at the other files, and a file is moved from a group to another in constant time
+#    - The files are compared by their exact path: P1.vtk and P11.vtk are two different files
+class GroupMembership(object):
+    def __init__(self, dictVTKFiles=None):
+        self.filesOfGroup = OrderedDict()
+        self.groupOfFile = dict()
+        self.filesOfBasename = dict()
+        if dictVTKFiles is not None:
+            for key in sorted(dictVTKFiles.keys()):
+                self.addGroup(key)
+                for vtkFile in dictVTKFiles[key]:
+                    self.addFile(vtkFile, key)
+
+    # Function to add a group without any file
+    def addGroup(self, group):
+        if group not in self.filesOfGroup:
+            self.filesOfGroup[group] = OrderedDict()
+
+    # Function to remove a group and all its files
+    def removeGroup(self, group):
+        for vtkFile in list(self.filesOfGroup.get(group, dict()).keys()):
+            self.removeFile(vtkFile)
+        self.filesOfGroup.pop(group, None)
+
+    # Function to add a vtk file in a group
+    #    - If the file is already in another group, it is moved
+    def addFile(self, vtkFile, group):
+        if vtkFile in self.groupOfFile:
+            self.moveFile(vtkFile, group)
+            return
+        self.addGroup(group)
+        self.filesOfGroup[group][vtkFile] = None
+        self.groupOfFile[vtkFile] = group
+        self.filesOfBasename.setdefault(os.path.basename(vtkFile), OrderedDict())[vtkFile] = None
+
+    # Function to remove a vtk file
+    #    - Return the group which contained the file, None if the file wasn't found
+    def removeFile(self, vtkFile):
+        group = self.groupOfFile.pop(vtkFile, None)
+        if group is None:
+            return None
+        del self.filesOfGroup[group][vtkFile]
+        basename = os.path.basename(vtkFile)
+        del self.filesOfBasename[basename][vtkFile]
+        if len(self.filesOfBasename[basename]) == 0:
+            del self.filesOfBasename[basename]
+        return group
+
+    # Function to move a vtk file in another group
+    #    - Return the previous group of the file
+    def moveFile(self, vtkFile, group):
+        oldGroup = self.groupOfFile[vtkFile]
+        if oldGroup != group:
+            del self.filesOfGroup[oldGroup][vtkFile]
+            self.addGroup(group)
+            self.filesOfGroup[group][vtkFile] = None
+            self.groupOfFile[vtkFile] = group
+        return oldGroup
+
+    # Function to recover the group of a vtk file
+    def groupOf(self, vtkFile, default=None):
+        return self.groupOfFile.get(vtkFile, default)
+
+    def containsFile(self, vtkFile):
+        return vtkFile in self.groupOfFile
+
+    # Function to find a vtk file from its filename (basename of the path)
+    #    - Return the path of the first file added with this filename, None if there is no such file
+    #    - The filenames have to be unique to find the right file (see duplicateFilenames)
+    def findFile(self, filename):
+        paths = self.filesOfBasename.get(filename, None)
+        if not paths:
+            return None
+        return next(iter(paths))
+
+    # Function to find the filenames used by several vtk files (files with the same name in different directories)
+    #    - The module identifies the vtk files by their filename: the outputs of the groups are named after it
+    #      and the file of a patient is found in the groups from it, these files can't be told apart
+    #    - Return the dictionary {filename: list of the paths} of these filenames
+    def duplicateFilenames(self):
+        return dict((filename, list(paths.keys())) for filename, paths in self.filesOfBasename.items()
+                    if len(paths) > 1)
+
+    # Function to recover the vtk files of a group, in the order in which they were added
+    def files(self, group):
+        return list(self.filesOfGroup[group].keys())
+
+    def numberOfFiles(self, group=None):
+        if group is None:
+            return len(self.groupOfFile)
+        return len(self.filesOfGroup.get(group, dict()))
+
+    # Function to recover a copy of the index as a dictionary {group: list of vtk files}
+    def toDict(self):
+        return dict((key, self.files(key)) for key in self.filesOfGroup)
+
+    # Mapping {group: list of vtk files}
+    def __getitem__(self, group):
+        return self.files(group)
+
+    def __setitem__(self, group, vtkFiles):
+        self.removeGroup(group)
+        self.addGroup(group)
+        for vtkFile in vtkFiles:
+            self.addFile(vtkFile, group)
+
+    def __contains__(self, group):
+        return group in self.filesOfGroup
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.filesOfGroup)
+
+    def get(self, group, default=None):
+        if group in self.filesOfGroup:
+            return self.files(group)
+        return default
+
+    def keys(self):
+        return sorted(self.filesOfGroup.keys())
+
+    def values(self):
+        return [self.files(key) for key in self.keys()]
+
+    def items(self):
+        return [(key, self.files(key)) for key in self.keys()]
@@ -0,0 +1,99 @@
+import numpy
+
+from .MeshIO import readPolyData, getPointsArray, createPolyDataFromPoints
+from .MeshLoader import MeshLoader
+from .Tracing import traced
+
+
+# Function to load the points of all the meshes of a group in one array of shape (N, numPts, 3)
+#    - All the meshes must be in correspondence (same number of points)
+#    - If a mesh loader is given, the files are read concurrently by the loader
+#    - dtype: type of the array, float32 halves the memory needed for large groups
+#    - If a job is given (see Jobs.Job), the loading stops after the current mesh when the job is cancelled
+#    - Return the array and the first mesh, used as reference for the topology
+def loadGroupPoints(vtkFiles, loader=None, dtype=numpy.float64, job=None):
+    if loader is None:
+        loader = MeshLoader(1)
+    reference = None
+    points = None
+    for index, (vtkFile, polyData, error) in enumerate(loader.iterPolyData(vtkFiles)):
+        if job is not None:
+            job.checkCancelled()
+        if error is not None:
+            raise IOError(error)
+        array = getPointsArray(polyData)
+        if points is None:
+            reference = polyData
+            points = numpy.empty((len(vtkFiles),) + array.shape, dtype=dtype)
+        elif array.shape != points.shape[1:]:
+            raise ValueError('The mesh ' + vtkFile + ' has ' + str(array.shape[0]) + ' points instead of '
+                             + str(points.shape[1]) + ': the meshes of a group must be in correspondence')
+        points[index] = array
+    return points, reference
+
+
+# Function to compute the mean of a group of meshes in correspondence
+#    - The mean is the average of the point arrays, computed in a single vectorized pass
+#    - The mean mesh has the topology of the first mesh of the group and no point array,
+#      like the mean.vtk written by statismo
+#    - If a packed store containing all the meshes is given, the points are read from it
+#    - Else the files are read by the mesh loader given, the reading stops if the job given is cancelled
+@traced('lib', meshesArgument=0)
+def computeGroupMean(vtkFiles, store=None, loader=None, job=None):
+    if len(vtkFiles) == 0:
+        raise ValueError('Cannot compute the mean of an empty group')
+    if store is not None and store.contains(vtkFiles):
+        mean = store.shapesPoints(vtkFiles).mean(axis=0, dtype=numpy.float64)
+        return store.polyData(mean.astype(numpy.float32))
+    points, reference = loadGroupPoints(vtkFiles, loader, job=job)
+    mean = points.mean(axis=0)
+    pointsType = getPointsArray(reference).dtype
+    return createPolyDataFromPoints(reference, mean.astype(pointsType))
+
+
+# Function to remove one mesh from the mean of a group
+#    - meanFile is the arithmetic mean of the numberOfShapes meshes of the group, vtkFile is one of these meshes
+#    - The mean of the numberOfShapes - 1 other meshes is (N * mean - x) / (N - 1),
+#      so only the mean and the removed mesh are read
+#    - The result is exact up to the precision of the mean: the points of meanFile are usually saved in float32,
+#      meanPoints can give the mean in double precision (for example the mean of a shape model)
+#    - If a packed store containing the removed mesh is given, its points are read from it
+@traced('lib')
+def downdateGroupMean(meanFile, numberOfShapes, vtkFile, store=None, meanPoints=None):
+    if numberOfShapes < 2:
+        raise ValueError('Cannot remove a mesh from a group of ' + str(numberOfShapes) + ' mesh')
+    meanPolyData = readPolyData(meanFile)
+    mean = getPointsArray(meanPolyData)
+    meanType = mean.dtype
+    if meanPoints is not None:
+        mean = numpy.asarray(meanPoints, dtype=numpy.float64)
+    if store is not None and store.contains([vtkFile]):
+        points = store.shapePoints(vtkFile)
+    else:
+        points = getPointsArray(readPolyData(vtkFile))
+    if points.shape != mean.shape:
+        raise ValueError('The mesh ' + vtkFile + ' has ' + str(points.shape[0]) + ' points instead of '
+                         + str(mean.shape[0]) + ': the meshes of a group must be in correspondence')
+    downdatedMean = (numberOfShapes * mean.astype(numpy.float64) - points) / (numberOfShapes - 1)
+    return createPolyDataFromPoints(meanPolyData, downdatedMean.astype(meanType))
+
+
+# Function to compute the variance of each point of a group of meshes in correspondence
+#    - The variance of a point is the mean of the squared distances between this point and
+#      the mean of the group, divided by 3 to get the variance of one coordinate
+#    - Return an array of shape (numPts,)
+@traced('lib', meshesArgument=0)
+def computeGroupVariance(vtkFiles, store=None, loader=None):
+    if store is not None and store.contains(vtkFiles):
+        points = numpy.asarray(store.shapesPoints(vtkFiles), dtype=numpy.float64)
+    else:
+        points = loadGroupPoints(vtkFiles, loader)[0]
+    return computePointsVariance(points)
+
+
+# Function to compute the variance of each point of a group from the array of its points (N, numPts, 3)
+def computePointsVariance(points):
+    if len(points) < 2:
+        return numpy.zeros(points.shape[1])
+    deviations = points - points.mean(axis=0)
+    return (deviations ** 2).sum(axis=(0, 2)) / (3 * (len(points) - 1))
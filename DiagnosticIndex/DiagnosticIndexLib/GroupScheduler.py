@@ -0,0 +1,53 @@
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+
+# Function to run a function on each group of a dictionary concurrently
+#    - function is called as function(key, value) for each group
+#    - At most numberOfWorkers groups are run at the same time
+#    - A group which fails doesn't stop the other groups: its error is kept
+#    - If a job is given (see Jobs.Job), its progress is updated after each group
+#      and the groups not yet started when it is cancelled fail
+#    - Return two dictionaries sorted by group:
+#           - the results of the groups successfully computed
+#           - the error messages of the groups which failed
+def runGroups(dictGroups, function, numberOfWorkers=1, job=None):
+    keys = sorted(dictGroups.keys())
+    finishedGroups = [0]
+    lock = threading.Lock()
+
+    def runGroup(key):
+        try:
+            if job is not None:
+                job.checkCancelled()
+            return key, True, function(key, dictGroups[key])
+        except Exception:
+            return key, False, traceback.format_exc()
+        finally:
+            if job is not None:
+                with lock:
+                    finishedGroups[0] += 1
+                    job.setProgress(float(finishedGroups[0]) / len(keys),
+                                    str(finishedGroups[0]) + '/' + str(len(keys)) + ' groups')
+
+    if numberOfWorkers > 1 and len(keys) > 1:
+        pool = ThreadPool(min(numberOfWorkers, len(keys)))
+        try:
+            outputs = pool.map(runGroup, keys)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        outputs = [runGroup(key) for key in keys]
+
+    # Merge of the outputs in the order of the groups
+    results = OrderedDict()
+    errors = OrderedDict()
+    for key, success, output in outputs:
+        if success:
+            results[key] = output
+        else:
+            errors[key] = output
+    return results, errors
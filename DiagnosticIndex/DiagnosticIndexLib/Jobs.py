@@ -0,0 +1,207 @@
+import time
+import threading
+import traceback
+from multiprocessing.pool import ThreadPool
+
+# States of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+# Exception raised in a job which has been cancelled
+class JobCancelledError(Exception):
+    pass
+
+
+# Work run in the background by a JobManager
+#    - The function of the job is called as function(job) in a thread of the manager:
+#      it must not use the interface, and it can report its progress and check if it has been cancelled
+#    - state: QUEUED, RUNNING, then DONE (result), FAILED (error, traceback) or CANCELLED
+#    - The cancellation is cooperative: a thread can't be interrupted, so a cancelled job stops only when its function
+#      calls checkCancelled(). The long steps of the module check it between the meshes read and the groups computed
+#      (see GroupPipeline), a computation in numpy (fit of a shape model) runs to its end
+#    - The external processes registered by the job are killed when the job is cancelled (see ExternalProcess)
+class Job(object):
+    def __init__(self, identifier, name, function, callback=None, timeout=None):
+        self.identifier = identifier
+        self.name = name
+        self.function = function
+        self.callback = callback
+        self.timeout = timeout
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.submitTime = time.time()
+        self.startTime = None
+        self.finishTime = None
+        self.timedOut = False
+        self.notified = False
+        self.cancelEvent = threading.Event()
+        self.cancelReason = None
+        self.processes = list()
+        self.lock = threading.Lock()
+
+    # Function to ask the job to stop
+    #    - A queued job won't run, a running job stops at its next check and its processes are killed
+    def cancel(self, reason='Cancelled by the user'):
+        with self.lock:
+            if self.isFinished() or self.cancelEvent.is_set():
+                return
+            self.cancelReason = reason
+            self.cancelEvent.set()
+            processes = list(self.processes)
+        for process in processes:
+            killProcess(process)
+
+    def isCancelled(self):
+        return self.cancelEvent.is_set()
+
+    # Function to stop the function of the job if it has been cancelled
+    def checkCancelled(self):
+        if self.cancelEvent.is_set():
+            raise JobCancelledError(self.cancelReason)
+
+    def isFinished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    # Function to report the progress of the job, between 0 and 1
+    def setProgress(self, progress, message=None):
+        self.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    # Functions to register the external processes run by the job, killed if the job is cancelled
+    def addProcess(self, process):
+        with self.lock:
+            self.processes.append(process)
+            cancelled = self.cancelEvent.is_set()
+        if cancelled:
+            killProcess(process)
+
+    def removeProcess(self, process):
+        with self.lock:
+            if process in self.processes:
+                self.processes.remove(process)
+
+    # Function to get the time since the job started, 0 if it is queued
+    def elapsedTime(self):
+        if self.startTime is None:
+            return 0.0
+        if self.finishTime is None:
+            return time.time() - self.startTime
+        return self.finishTime - self.startTime
+
+
+# Function to kill a process which may already be finished
+def killProcess(process):
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+# Manager running jobs in a pool of threads
+#    - submit() returns immediately: the jobs wait in a queue until a thread is free
+#    - poll() must be called regularly by the thread of the application (for example by a QTimer):
+#      it cancels the jobs which exceeded their timeout and calls the callbacks of the finished jobs,
+#      so that the callbacks can use the interface
+class JobManager(object):
+    def __init__(self, numberOfWorkers=1):
+        self.numberOfWorkers = numberOfWorkers
+        self.pool = None
+        self.jobs = list()
+        self.nextIdentifier = 1
+        self.lock = threading.Lock()
+
+    # Function to get the pool of threads, created the first time it is needed
+    def getPool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPool(self.numberOfWorkers)
+        return self.pool
+
+    # Function to add a job in the queue
+    #    - function(job) is run in a thread, callback(job) is called by poll() when the job is finished
+    #    - timeout: maximum duration of the job once started, in seconds (None: no limit)
+    def submit(self, name, function, callback=None, timeout=None):
+        with self.lock:
+            job = Job(self.nextIdentifier, name, function, callback, timeout)
+            self.nextIdentifier = self.nextIdentifier + 1
+            self.jobs.append(job)
+        self.getPool().apply_async(self.run, (job,))
+        return job
+
+    # Function to run a job in a thread of the pool
+    def run(self, job):
+        if job.isCancelled():
+            job.state = CANCELLED
+            job.error = job.cancelReason
+            job.finishTime = time.time()
+            return
+        job.startTime = time.time()
+        job.state = RUNNING
+        try:
+            job.result = job.function(job)
+            job.setProgress(1.0)
+            job.finishTime = time.time()
+            job.state = DONE
+        except Exception as e:
+            job.traceback = traceback.format_exc()
+            job.finishTime = time.time()
+            if job.isCancelled() and not job.timedOut:
+                job.error = job.cancelReason
+                job.state = CANCELLED
+            elif job.timedOut:
+                job.error = job.cancelReason
+                job.state = FAILED
+            else:
+                job.error = str(e)
+                job.state = FAILED
+
+    # Function to follow the jobs, called by the thread of the application
+    #    - Return the list of the jobs finished since the last call, after calling their callback
+    def poll(self):
+        now = time.time()
+        with self.lock:
+            jobs = list(self.jobs)
+        finishedJobs = list()
+        for job in jobs:
+            if job.state == RUNNING and job.timeout is not None and now - job.startTime > job.timeout:
+                job.timedOut = True
+                job.cancel('Timeout: the job "' + job.name + '" took more than ' + str(job.timeout) + ' s')
+            if job.isFinished() and not job.notified:
+                job.notified = True
+                finishedJobs.append(job)
+        with self.lock:
+            self.jobs = [job for job in self.jobs if not job.notified]
+        for job in finishedJobs:
+            if job.callback:
+                job.callback(job)
+        return finishedJobs
+
+    # Function to get the jobs queued, running or finished but not yet polled
+    def activeJobs(self):
+        with self.lock:
+            return list(self.jobs)
+
+    def cancelAll(self, reason='Cancelled by the user'):
+        for job in self.activeJobs():
+            job.cancel(reason)
+
+    # Function to stop the manager
+    #    - All the jobs are cancelled, then the threads are joined: close() returns once the running jobs
+    #      reached their next check of the cancellation
+    def close(self):
+        self.cancelAll()
+        with self.lock:
+            pool = self.pool
+            self.pool = None
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,168 @@
+import os
+import vtk
+from vtk.util import numpy_support
+
+from .Tracing import tracer
+
+# Formats available to save a mesh:
+#    - 'ascii': legacy VTK file in text
+#    - 'binary': legacy VTK file in binary
+#    - 'xml': XML VTK file (.vtp) with raw appended data
+#    - 'xml-zlib': XML VTK file (.vtp) with appended data compressed with zlib
+MESH_FORMATS = ['ascii', 'binary', 'xml', 'xml-zlib']
+
+
+# Function to get the extension of the files saved with a format
+def meshExtension(meshFormat):
+    if meshFormat in ['xml', 'xml-zlib']:
+        return '.vtp'
+    return '.vtk'
+
+
+# Function to check if a format is a legacy VTK format, the only ones read by statismo
+def isLegacyMeshFormat(meshFormat):
+    return meshExtension(meshFormat) == '.vtk'
+
+
+# Function to check if a file is a XML VTK file
+#    - The format is found from the content of the file, not from its extension
+#    - If the content of the file has already been read, it can be given instead of reading the file again
+def isXMLFile(filepath, content=None):
+    if content is None:
+        file = open(filepath, 'rb')
+        content = file.read(64)
+        file.close()
+    return content[:64].lstrip().startswith(b'<')
+
+
+# Function to read a VTK file, legacy (ascii or binary) or XML
+#    - If the content of the file has already been read, it is parsed from memory
+def readPolyData(filepath, content=None):
+    with tracer.span('readPolyData', 'io', path=filepath) as span:
+        if isXMLFile(filepath, content):
+            reader = vtk.vtkXMLPolyDataReader()
+            if content is None:
+                reader.SetFileName(filepath)
+            else:
+                reader.ReadFromInputStringOn()
+                reader.SetInputString(content)
+        else:
+            reader = vtk.vtkDataSetReader()
+            if content is None:
+                reader.SetFileName(filepath)
+            else:
+                reader.ReadFromInputStringOn()
+                reader.SetBinaryInputString(content, len(content))
+            reader.ReadAllVectorsOn()
+            reader.ReadAllScalarsOn()
+        reader.Update()
+        polyData = reader.GetOutput()
+        if polyData is None or polyData.GetPoints() is None:
+            raise IOError('Unable to read the mesh ' + filepath)
+        if tracer.enabled:
+            if content is None:
+                span.set(bytesRead=os.path.getsize(filepath))
+            else:
+                span.set(bytesRead=len(content))
+            span.set(meshes=1, vertices=polyData.GetNumberOfPoints())
+        return polyData
+
+
+# Function to save a polydata in one of the formats of MESH_FORMATS
+def writePolyData(polyData, filepath, meshFormat='binary'):
+    if meshFormat not in MESH_FORMATS:
+        raise ValueError('Unknown mesh format ' + str(meshFormat) + ', available formats: ' + ', '.join(MESH_FORMATS))
+    if isLegacyMeshFormat(meshFormat):
+        writer = vtk.vtkPolyDataWriter()
+        if meshFormat == 'binary':
+            writer.SetFileTypeToBinary()
+        else:
+            writer.SetFileTypeToASCII()
+    else:
+        writer = vtk.vtkXMLPolyDataWriter()
+        writer.SetDataModeToAppended()
+        writer.EncodeAppendedDataOff()
+        if meshFormat == 'xml-zlib':
+            writer.SetCompressorTypeToZLib()
+        else:
+            writer.SetCompressorTypeToNone()
+    with tracer.span('writePolyData', 'io', path=filepath) as span:
+        writer.SetFileName(filepath)
+        if vtk.VTK_MAJOR_VERSION <= 5:
+            writer.SetInput(polyData)
+        else:
+            writer.SetInputData(polyData)
+        if not writer.Write():
+            raise IOError('Unable to write the mesh ' + filepath)
+        if tracer.enabled:
+            span.set(bytesWritten=os.path.getsize(filepath), meshes=1, vertices=polyData.GetNumberOfPoints())
+
+
+# Function to get the points of a polydata as a numpy array of shape (numPts, 3)
+#    - The array shares the memory of the vtkPoints: it must not outlive the polydata
+def getPointsArray(polyData):
+    return numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+
+
+# Function to create a polydata with the topology of a reference mesh and the points given
+#    - The cells of the reference are shared (shallow copy), the point arrays are not kept
+def createPolyDataFromPoints(reference, points):
+    polyData = vtk.vtkPolyData()
+    polyData.ShallowCopy(reference)
+    polyData.GetPointData().Initialize()
+    vtkPoints = vtk.vtkPoints()
+    vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=1))
+    polyData.SetPoints(vtkPoints)
+    return polyData
+
+
+# Function to get a copy of a polydata without any point array
+#    - Shallow copy: the points and the cells are shared with the input polydata
+def removePointArrays(polyData):
+    polyDataCopy = vtk.vtkPolyData()
+    polyDataCopy.ShallowCopy(polyData)
+    polyDataCopy.GetPointData().Initialize()
+    return polyDataCopy
+
+
+# Function to get a copy of a polydata with a point array having the same value for all the points
+#    - Shallow copy: the points, the cells and the other arrays are shared with the input polydata
+#    - The array is filled in one pass, without iterating over the points in Python
+def addConstantPointArray(polyData, arrayName, value):
+    polyDataCopy = vtk.vtkPolyData()
+    polyDataCopy.ShallowCopy(polyData)
+    pointData = polyDataCopy.GetPointData()
+    if pointData.HasArray(arrayName):
+        pointData.RemoveArray(arrayName)
+    arrayToAdd = vtk.vtkDoubleArray()
+    arrayToAdd.SetName(arrayName)
+    arrayToAdd.SetNumberOfComponents(1)
+    arrayToAdd.SetNumberOfTuples(polyDataCopy.GetNumberOfPoints())
+    arrayToAdd.FillComponent(0, value)
+    pointData.AddArray(arrayToAdd)
+    return polyDataCopy
+
+
+# Function to get a simplified copy of a polydata with about numberOfTriangles triangles
+#    - The polygons are triangulated, then decimated by quadric error (vtkQuadricDecimation)
+#    - The point arrays are not kept
+#    - If the polydata has no more triangles than asked, it is returned without point array
+def decimatePolyData(polyData, numberOfTriangles):
+    triangleFilter = vtk.vtkTriangleFilter()
+    triangleFilter.SetInputData(removePointArrays(polyData))
+    triangleFilter.PassVertsOff()
+    triangleFilter.PassLinesOff()
+    triangleFilter.Update()
+    triangles = triangleFilter.GetOutput()
+    if triangles.GetNumberOfPolys() <= numberOfTriangles:
+        return removePointArrays(polyData)
+
+    with tracer.span('decimatePolyData', 'lib', vertices=polyData.GetNumberOfPoints(), triangles=numberOfTriangles):
+        decimation = vtk.vtkQuadricDecimation()
+        decimation.SetInputData(triangles)
+        decimation.SetTargetReduction(1.0 - float(numberOfTriangles) / triangles.GetNumberOfPolys())
+        decimation.Update()
+        decimatedPolyData = vtk.vtkPolyData()
+        decimatedPolyData.ShallowCopy(decimation.GetOutput())
+        decimatedPolyData.GetPointData().Initialize()
+    return decimatedPolyData
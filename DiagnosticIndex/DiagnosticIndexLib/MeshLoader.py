@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import numpy
+
+from .MeshIO import readPolyData, getPointsArray
+from .Tracing import tracer
+
+
+# Function to read and parse one vtk file
+#    - The file is read in Python before being parsed by VTK: the thread doesn't hold the
+#      Python interpreter while it waits for the disk, so the reads of several threads overlap
+def loadMeshFile(filepath):
+    with tracer.span('loadMeshFile', 'io', path=filepath):
+        file = open(filepath, 'rb')
+        content = file.read()
+        file.close()
+        return readPolyData(filepath, content)
+
+
+# Loader of vtk files shared by all the functions reading a list of meshes
+#    - The files are read by a bounded pool of numberOfWorkers threads
+#    - At most readAhead files are read in advance of the file currently used
+#    - The order of the files is preserved and the error of each file is reported without stopping the others
+#    - The loader can be used by several threads at the same time
+class MeshLoader(object):
+    def __init__(self, numberOfWorkers=8, readAhead=16):
+        self.numberOfWorkers = numberOfWorkers
+        self.readAhead = readAhead
+        self.pool = None
+        self.lock = threading.Lock()
+
+    # Function to get the pool of threads, created the first time it is needed
+    def getPool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPool(self.numberOfWorkers)
+        return self.pool
+
+    # Function to iterate over the meshes of a list of vtk files, in the order of the list
+    #    - Yield for each file: (filepath, polyData, None) or (filepath, None, error message)
+    def iterPolyData(self, filepaths):
+        filepaths = list(filepaths)
+        if self.numberOfWorkers <= 1 or len(filepaths) <= 1:
+            for filepath in filepaths:
+                try:
+                    yield filepath, loadMeshFile(filepath), None
+                except Exception as e:
+                    yield filepath, None, str(e)
+            return
+
+        pool = self.getPool()
+        pending = list()
+        nextIndex = 0
+        for index in range(len(filepaths)):
+            # Read ahead of the current file
+            while nextIndex < len(filepaths) and nextIndex < index + self.readAhead:
+                pending.append(pool.apply_async(loadMeshFile, (filepaths[nextIndex],)))
+                nextIndex = nextIndex + 1
+            result = pending.pop(0)
+            try:
+                yield filepaths[index], result.get(), None
+            except Exception as e:
+                yield filepaths[index], None, str(e)
+
+    # Function to load the meshes of a list of vtk files
+    #    - Return the list of the polydata (None for a file which couldn't be read)
+    #      and a dictionary with the error message of each file which couldn't be read
+    def loadPolyData(self, filepaths):
+        polyDataList = list()
+        errors = OrderedDict()
+        for filepath, polyData, error in self.iterPolyData(filepaths):
+            polyDataList.append(polyData)
+            if error is not None:
+                errors[filepath] = error
+        return polyDataList, errors
+
+    # Function to load the points of a list of vtk files
+    #    - Return the list of the arrays of shape (numPts, 3) (None for a file which couldn't be read)
+    #      and a dictionary with the error message of each file which couldn't be read
+    def loadPoints(self, filepaths):
+        pointsList = list()
+        errors = OrderedDict()
+        for filepath, polyData, error in self.iterPolyData(filepaths):
+            if error is None:
+                pointsList.append(numpy.array(getPointsArray(polyData)))
+            else:
+                pointsList.append(None)
+                errors[filepath] = error
+        return pointsList, errors
+
+    # Function to stop the threads of the loader
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
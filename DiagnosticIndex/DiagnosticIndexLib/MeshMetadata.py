@@ -0,0 +1,387 @@
+import os
+import json
+import hashlib
+import threading
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import numpy
+import vtk
+from vtk.util import numpy_support
+
+from .MeshIO import isXMLFile, readPolyData
+from .Tracing import traced
+
+# Metadata of a vtk file
+#    - path, mtime and size of the file, format: 'binary' (legacy VTK files in binary, scanned), 'legacy'
+#      (legacy VTK files in ascii or with unknown sections, read completely) or 'xml'
+#    - numberOfPoints, numberOfCells: vertices, lines, polygons and triangle strips
+#    - pointArrays, cellArrays: names of the arrays of the points and of the cells
+#    - topology: hash of the cells in the legacy VTK layout (npts, id0, id1, ...), equal for two meshes
+#      in correspondence whatever the format of their files
+MeshMetadata = namedtuple('MeshMetadata', ['path', 'mtime', 'size', 'format', 'numberOfPoints', 'numberOfCells',
+                                           'pointArrays', 'cellArrays', 'topology'])
+
+# Sections of the cells of a legacy VTK file, in the order of vtkPolyData
+CELL_SECTIONS = ['VERTICES', 'LINES', 'POLYGONS', 'TRIANGLE_STRIPS']
+
+# Size in bytes of the values of the types of the legacy VTK files in binary
+TYPE_SIZES = {'bit': 0, 'char': 1, 'signed_char': 1, 'unsigned_char': 1, 'short': 2, 'unsigned_short': 2,
+              'int': 4, 'unsigned_int': 4, 'long': 8, 'unsigned_long': 8, 'vtktypeint64': 8, 'vtktypeuint64': 8,
+              'vtkIdType': 4, 'float': 4, 'double': 8}
+
+# Types of the ids of the cells in the legacy VTK files in binary (big endian)
+ID_TYPES = {'int': '>i4', 'unsigned_int': '>u4', 'vtkIdType': '>i4', 'long': '>i8', 'unsigned_long': '>u8',
+            'vtktypeint64': '>i8', 'vtktypeuint64': '>u8'}
+
+
+# Error raised when the header of a vtk file can't be scanned
+class MeshHeaderError(Exception):
+    pass
+
+
+# Reader of the sections of a legacy VTK file in binary, without parsing the points and the arrays
+#    - The values of a section are skipped with a seek
+#    - Only the ids of the cells are read, to compute the fingerprint of the topology
+class LegacySectionReader(object):
+    def __init__(self, file):
+        self.file = file
+
+    # Function to read the next line which isn't empty, split in words
+    #    - Return an empty list at the end of the file
+    def readWords(self):
+        while True:
+            line = self.file.readline()
+            if not line:
+                return []
+            words = line.decode('latin-1').split()
+            if len(words) > 0:
+                return words
+
+    # Function to read the next line which isn't empty if it starts with keyword, else to stay at the same position
+    def readOptionalLine(self, keyword):
+        position = self.file.tell()
+        words = self.readWords()
+        if len(words) > 0 and words[0].upper() == keyword:
+            return words
+        self.file.seek(position)
+        return None
+
+    # Function to skip count values of a type
+    def skipValues(self, count, dataType):
+        if count == 0:
+            return
+        if dataType not in TYPE_SIZES:
+            raise MeshHeaderError('Unknown type ' + dataType)
+        if dataType == 'bit':
+            self.file.seek((count + 7) // 8, os.SEEK_CUR)
+        else:
+            self.file.seek(count * TYPE_SIZES[dataType], os.SEEK_CUR)
+
+    # Function to read count ids of cells
+    def readIds(self, count, dataType):
+        if count == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        if dataType not in ID_TYPES:
+            raise MeshHeaderError('Unknown type of ids ' + dataType)
+        dtype = numpy.dtype(ID_TYPES[dataType])
+        content = self.file.read(count * dtype.itemsize)
+        if len(content) != count * dtype.itemsize:
+            raise MeshHeaderError('Unexpected end of the file')
+        return numpy.frombuffer(content, dtype=dtype).astype(numpy.int64)
+
+    # Function to read a section of cells, after its line "KEYWORD size1 size2"
+    #    - Legacy files before version 5: size1 cells, size2 ids in the layout (npts, id0, id1, ...)
+    #    - Version 5: size1 offsets, then size2 ids of connectivity
+    #    - Return the number of cells and the cells in the legacy layout
+    def readCells(self, size1, size2):
+        words = self.readOptionalLine('OFFSETS')
+        if words is None:
+            return size1, self.readIds(size2, 'int')
+        offsets = self.readIds(size1, words[1])
+        words = self.readOptionalLine('CONNECTIVITY')
+        if words is None:
+            raise MeshHeaderError('Missing CONNECTIVITY after OFFSETS')
+        connectivity = self.readIds(size2, words[1])
+        numberOfCells = max(size1 - 1, 0)
+        if numberOfCells == 0:
+            return 0, connectivity
+        counts = numpy.diff(offsets)
+        cells = numpy.empty(len(connectivity) + numberOfCells, dtype=numpy.int64)
+        countPositions = offsets[:-1] + numpy.arange(numberOfCells)
+        isCount = numpy.zeros(len(cells), dtype=bool)
+        isCount[countPositions] = True
+        cells[countPositions] = counts
+        cells[~isCount] = connectivity
+        return numberOfCells, cells
+
+
+# Function to scan a legacy VTK file of polydata in binary
+#    - The points and the arrays are skipped, only the lines of the sections and the ids of the cells are read
+#    - The files in ascii aren't scanned (MeshHeaderError): all their values would have to be parsed in Python
+#      to find the sections, VTK reads them faster
+#    - Return the metadata of the file (MeshMetadata)
+def scanLegacyFile(filepath):
+    file = open(filepath, 'rb')
+    try:
+        if not file.readline().startswith(b'# vtk DataFile'):
+            raise MeshHeaderError('Not a VTK file')
+        file.readline()
+        fileType = file.readline().strip().upper()
+        if fileType != b'BINARY':
+            raise MeshHeaderError('Not a binary file')
+        reader = LegacySectionReader(file)
+        words = reader.readWords()
+        if len(words) < 2 or words[0].upper() != 'DATASET' or words[1].upper() != 'POLYDATA':
+            raise MeshHeaderError('The file does not contain a polydata')
+
+        numberOfPoints = 0
+        numberOfCells = 0
+        pointArrays = list()
+        cellArrays = list()
+        arrays = None
+        attributeSize = 0
+        digest = hashlib.sha1()
+        while True:
+            words = reader.readWords()
+            if len(words) == 0:
+                break
+            keyword = words[0].upper()
+            if keyword == 'POINTS':
+                numberOfPoints = int(words[1])
+                reader.skipValues(3 * numberOfPoints, words[2])
+            elif keyword in CELL_SECTIONS:
+                sectionCells, cells = reader.readCells(int(words[1]), int(words[2]))
+                numberOfCells += sectionCells
+                if sectionCells > 0:
+                    digest.update(words[0].encode('utf-8'))
+                    digest.update(cells.astype('<i8').tobytes())
+            elif keyword in ('POINT_DATA', 'CELL_DATA'):
+                attributeSize = int(words[1])
+                arrays = pointArrays if keyword == 'POINT_DATA' else cellArrays
+            elif keyword == 'FIELD':
+                for index in range(int(words[2])):
+                    arrayWords = reader.readWords()
+                    if len(arrayWords) == 0:
+                        raise MeshHeaderError('Unexpected end of the file')
+                    if arrayWords[0] == 'NULL_ARRAY':
+                        continue
+                    if arrays is not None:
+                        arrays.append(arrayWords[0])
+                    reader.skipValues(int(arrayWords[1]) * int(arrayWords[2]), arrayWords[3])
+                    if reader.readOptionalLine('METADATA') is not None:
+                        skipMetadata(reader)
+            elif keyword == 'METADATA':
+                skipMetadata(reader)
+            elif keyword == 'LOOKUP_TABLE':
+                reader.skipValues(4 * int(words[2]), 'unsigned_char')
+            elif arrays is None:
+                raise MeshHeaderError('Unexpected section ' + words[0])
+            else:
+                arrays.append(words[1])
+                if keyword == 'SCALARS':
+                    numberOfComponents = int(words[3]) if len(words) > 3 else 1
+                    reader.readOptionalLine('LOOKUP_TABLE')
+                    reader.skipValues(numberOfComponents * attributeSize, words[2])
+                elif keyword == 'COLOR_SCALARS':
+                    reader.skipValues(int(words[2]) * attributeSize, 'unsigned_char')
+                elif keyword in ('VECTORS', 'NORMALS'):
+                    reader.skipValues(3 * attributeSize, words[2])
+                elif keyword in ('TENSORS', 'TENSORS6'):
+                    reader.skipValues((9 if keyword == 'TENSORS' else 6) * attributeSize, words[2])
+                elif keyword == 'TEXTURE_COORDINATES':
+                    reader.skipValues(int(words[2]) * attributeSize, words[3])
+                elif keyword in ('GLOBAL_IDS', 'PEDIGREE_IDS'):
+                    reader.skipValues(attributeSize, words[2])
+                else:
+                    raise MeshHeaderError('Unknown section ' + words[0])
+    except (ValueError, IndexError) as e:
+        raise MeshHeaderError('Wrong header: ' + str(e))
+    finally:
+        file.close()
+
+    stat = os.stat(filepath)
+    return MeshMetadata(filepath, stat.st_mtime, stat.st_size, 'binary', numberOfPoints, numberOfCells,
+                        tuple(pointArrays), tuple(cellArrays), digest.hexdigest())
+
+
+# Function to skip the information of an array (lines until an empty line), after its line "METADATA"
+def skipMetadata(reader):
+    while True:
+        line = reader.file.readline()
+        if not line or not line.strip():
+            return
+
+
+# Function to get a cell array of a polydata in the legacy VTK layout (npts, id0, id1, ...)
+def getLegacyCells(cells):
+    legacyArray = vtk.vtkIdTypeArray()
+    if hasattr(cells, 'ExportLegacyFormat'):
+        cells.ExportLegacyFormat(legacyArray)
+    else:
+        legacyArray.DeepCopy(cells.GetData())
+    return numpy_support.vtk_to_numpy(legacyArray).astype(numpy.int64)
+
+
+# Function to compute the metadata of a polydata read from a file
+#    - The topology is hashed like in scanLegacyFile, so that the meshes of all the formats can be compared
+def polyDataMetadata(filepath, polyData, meshFormat):
+    digest = hashlib.sha1()
+    numberOfCells = 0
+    for keyword, cells in zip(CELL_SECTIONS, [polyData.GetVerts(), polyData.GetLines(),
+                                              polyData.GetPolys(), polyData.GetStrips()]):
+        if cells.GetNumberOfCells() > 0:
+            numberOfCells += cells.GetNumberOfCells()
+            digest.update(keyword.encode('utf-8'))
+            digest.update(getLegacyCells(cells).astype('<i8').tobytes())
+    pointData = polyData.GetPointData()
+    cellData = polyData.GetCellData()
+    stat = os.stat(filepath)
+    return MeshMetadata(filepath, stat.st_mtime, stat.st_size, meshFormat, polyData.GetNumberOfPoints(), numberOfCells,
+                        tuple(pointData.GetArrayName(index) for index in range(pointData.GetNumberOfArrays())),
+                        tuple(cellData.GetArrayName(index) for index in range(cellData.GetNumberOfArrays())),
+                        digest.hexdigest())
+
+
+# Function to get the metadata of a vtk file
+#    - The legacy VTK files in binary are scanned without reading their points and their arrays
+#      (see scanLegacyFile)
+#    - The XML VTK files, and the legacy files in ascii or whose sections are unknown, are read completely
+def scanMeshFile(filepath):
+    if isXMLFile(filepath):
+        return polyDataMetadata(filepath, readPolyData(filepath), 'xml')
+    try:
+        return scanLegacyFile(filepath)
+    except MeshHeaderError:
+        polyData = readPolyData(filepath)
+        return polyDataMetadata(filepath, polyData, 'legacy')
+
+
+# Function to check that the vtk files of a group are in correspondence: same number of points and same topology
+#    - The reference is the number of points and the topology shared by most of the files of the group,
+#      the one of the first file in case of equality
+#    - Return the list of the errors, one per file which differs from the reference
+def checkCorrespondence(metadataList):
+    counts = dict()
+    for metadata in metadataList:
+        reference = (metadata.numberOfPoints, metadata.topology)
+        counts[reference] = counts.get(reference, 0) + 1
+    if len(counts) < 2:
+        return []
+    reference = None
+    for metadata in metadataList:
+        candidate = (metadata.numberOfPoints, metadata.topology)
+        if reference is None or counts[candidate] > counts[reference]:
+            reference = candidate
+    numberOfPoints, topology = reference
+
+    errors = list()
+    for metadata in metadataList:
+        if metadata.numberOfPoints != numberOfPoints:
+            errors.append(metadata.path + ': ' + str(metadata.numberOfPoints) + ' points instead of '
+                          + str(numberOfPoints) + ' for the other meshes of the group')
+        elif metadata.topology != topology:
+            errors.append(metadata.path + ': the cells are different from the other meshes of the group')
+    return errors
+
+
+# Index of the metadata of the vtk files
+#    - The metadata of a file is scanned again only if its modification time or its size changed
+#    - If a filepath is given, the index is kept from a session to another in this JSON file (see save)
+#    - The index can be shared by several threads
+class MeshMetadataIndex(object):
+    def __init__(self, filepath=None, numberOfWorkers=8):
+        self.filepath = filepath
+        self.numberOfWorkers = numberOfWorkers
+        self.entries = dict()
+        self.modified = False
+        self.lock = threading.Lock()
+        if filepath is not None and os.path.exists(filepath):
+            self.load()
+
+    # Function to load the index saved in its JSON file, which is ignored if it can't be read
+    def load(self):
+        try:
+            file = open(self.filepath, 'r')
+            try:
+                entries = json.load(file)
+            finally:
+                file.close()
+            entries = dict((path, MeshMetadata(*fields)) for path, fields in entries.items())
+        except (IOError, ValueError, TypeError):
+            return
+        with self.lock:
+            for path, metadata in entries.items():
+                metadata = metadata._replace(pointArrays=tuple(metadata.pointArrays),
+                                             cellArrays=tuple(metadata.cellArrays))
+                self.entries[path] = metadata
+
+    # Function to save the index in its JSON file if it changed
+    def save(self):
+        if self.filepath is None:
+            return
+        with self.lock:
+            if not self.modified:
+                return
+            entries = dict((path, list(metadata)) for path, metadata in self.entries.items())
+            self.modified = False
+        temporaryFilepath = self.filepath + '.' + str(threading.current_thread().ident) + '.part'
+        file = open(temporaryFilepath, 'w')
+        json.dump(entries, file)
+        file.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+        os.rename(temporaryFilepath, self.filepath)
+
+    # Function to get the metadata of a vtk file, scanned if it isn't in the index or if it changed
+    def get(self, filepath):
+        stat = os.stat(filepath)
+        with self.lock:
+            metadata = self.entries.get(filepath, None)
+        if metadata is not None and metadata.mtime == stat.st_mtime and metadata.size == stat.st_size:
+            return metadata
+        metadata = scanMeshFile(filepath)
+        with self.lock:
+            self.entries[filepath] = metadata
+            self.modified = True
+        return metadata
+
+    # Function to get the metadata of several vtk files, scanned concurrently
+    #    - Return the dictionary {filepath: metadata} and the dictionary {filepath: error} of the files
+    #      which couldn't be scanned
+    def getFiles(self, filepaths):
+        def scan(filepath):
+            try:
+                return filepath, self.get(filepath), None
+            except Exception as e:
+                return filepath, None, str(e) or e.__class__.__name__
+
+        pool = ThreadPool(min(self.numberOfWorkers, max(len(filepaths), 1)))
+        try:
+            scans = pool.map(scan, filepaths)
+        finally:
+            pool.close()
+        metadata = dict((filepath, result) for filepath, result, error in scans if error is None)
+        errors = dict((filepath, error) for filepath, result, error in scans if error is not None)
+        return metadata, errors
+
+    # Function to check that the vtk files of each group are in correspondence, before computing the means
+    #    - dictVTKFiles contains the vtk files sorted by group
+    #    - Return the dictionary {group: list of errors} of the groups which can't be computed
+    @traced('lib')
+    def checkGroups(self, dictVTKFiles):
+        metadata, scanErrors = self.getFiles([vtkFile for value in dictVTKFiles.values() for vtkFile in value])
+        errors = dict()
+        for key, value in dictVTKFiles.items():
+            groupErrors = [vtkFile + ': ' + scanErrors[vtkFile] for vtkFile in value if vtkFile in scanErrors]
+            groupErrors.extend(checkCorrespondence([metadata[vtkFile] for vtkFile in value if vtkFile in metadata]))
+            if len(groupErrors) > 0:
+                errors[key] = groupErrors
+        self.save()
+        return errors
+
+    # Function to forget the metadata of all the files
+    def clear(self):
+        with self.lock:
+            self.entries = dict()
+            self.modified = True
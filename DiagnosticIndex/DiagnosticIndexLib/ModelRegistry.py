@@ -0,0 +1,221 @@
+import io
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+import numpy
+
+from .FileCache import digestFiles
+
+# Version of the tables of the registry, saved in the database (PRAGMA user_version)
+REGISTRY_SCHEMA_VERSION = 1
+
+REGISTRY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    created REAL NOT NULL,
+    healthyGroup INTEGER,
+    parameters TEXT NOT NULL,
+    UNIQUE (name, version));
+CREATE TABLE IF NOT EXISTS groups (
+    model INTEGER NOT NULL REFERENCES models (id) ON DELETE CASCADE,
+    groupId INTEGER NOT NULL,
+    meanPath TEXT NOT NULL,
+    meanDigest TEXT NOT NULL,
+    modelPath TEXT,
+    members TEXT NOT NULL,
+    PRIMARY KEY (model, groupId));
+CREATE TABLE IF NOT EXISTS derived (
+    model INTEGER NOT NULL REFERENCES models (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (model, key));
+'''
+
+# Version of a model of the registry, without its groups
+ModelVersion = namedtuple('ModelVersion', ['name', 'version', 'created', 'healthyGroup', 'numberOfGroups'])
+
+# Classification Group of a model of the registry
+#    - meanDigest: hash of the content of the mean when the model was registered
+#    - modelPath: shape model of the group (see ShapeModel), None if the group has none
+#    - members: vtk files from which the mean was computed
+RegisteredGroup = namedtuple('RegisteredGroup', ['group', 'meanPath', 'meanDigest', 'modelPath', 'members'])
+
+# Model of the registry: Classification Groups and the parameters used to compute them
+#    - groups: dictionary {group: RegisteredGroup}
+RegisteredModel = namedtuple('RegisteredModel', ['name', 'version', 'created', 'healthyGroup', 'parameters', 'groups'])
+
+
+# Function to convert an array to the bytes saved in the database
+def arrayToBytes(array):
+    buffer = io.BytesIO()
+    numpy.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+# Function to convert the bytes saved in the database to an array
+def bytesToArray(value):
+    return numpy.load(io.BytesIO(bytes(value)), allow_pickle=False)
+
+
+# Function to get the name of a model displayed to the user
+#    - The models exported by the module are named after the absolute path of their export directory,
+#      so that two exports in directories of the same name are different models: only the name of the directory
+#      is displayed
+def modelDisplayName(name):
+    if os.path.isabs(name):
+        return os.path.basename(os.path.normpath(name)) or name
+    return name
+
+
+# Registry of the Classification Groups exported, kept in a SQLite database
+#    - Each export of a name adds a new version: the versions of a name are never replaced
+#    - A model is found by an indexed query on its name and its version, whatever the number of models registered
+#    - Derived data (for example the array of the means of the groups) can be saved with a model, with the digest
+#      of the files it was computed from, so that it is only used while these files don't change
+#    - The registry can be shared by several threads
+class ModelRegistry(object):
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filepath, check_same_thread=False)
+        self.connection.text_factory = str
+        with self.lock:
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if version > REGISTRY_SCHEMA_VERSION:
+                raise IOError(filepath + ' was created by a newer version of the module')
+            self.connection.executescript(REGISTRY_SCHEMA)
+            self.connection.execute('PRAGMA user_version = ' + str(REGISTRY_SCHEMA_VERSION))
+            self.connection.commit()
+
+    # Function to get the identifier of a version of a model, the last version if version is None
+    #    - Return None if the model isn't registered
+    def modelIdentifier(self, name, version=None):
+        if version is None:
+            row = self.connection.execute('SELECT id FROM models WHERE name = ? ORDER BY version DESC LIMIT 1',
+                                          (name,)).fetchone()
+        else:
+            row = self.connection.execute('SELECT id FROM models WHERE name = ? AND version = ?',
+                                          (name, version)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    # Function to register a new version of a model
+    #    - groups: dictionary {group: {'meanPath': path, 'modelPath': path or None, 'members': list of vtk files}}
+    #    - parameters: dictionary of the parameters used to compute the groups, saved in JSON
+    #    - The content of the means is hashed, to check later that they didn't change (see verify)
+    #    - Return the version of the model
+    def register(self, name, groups, healthyGroup=None, parameters=None):
+        rows = list()
+        for key in sorted(groups.keys()):
+            group = groups[key]
+            rows.append((int(key), group['meanPath'], digestFiles([group['meanPath']], hashContent=True),
+                         group.get('modelPath', None), json.dumps(list(group.get('members', [])))))
+        with self.lock:
+            with self.connection:
+                row = self.connection.execute('SELECT MAX(version) FROM models WHERE name = ?', (name,)).fetchone()
+                version = (row[0] or 0) + 1
+                cursor = self.connection.execute(
+                    'INSERT INTO models (name, version, created, healthyGroup, parameters) VALUES (?, ?, ?, ?, ?)',
+                    (name, version, time.time(), healthyGroup, json.dumps(parameters or {}, sort_keys=True)))
+                identifier = cursor.lastrowid
+                self.connection.executemany(
+                    'INSERT INTO groups (model, groupId, meanPath, meanDigest, modelPath, members) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', [(identifier,) + row for row in rows])
+        return version
+
+    # Function to list the names of the models registered
+    def names(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT name FROM models ORDER BY name')]
+
+    # Function to list the versions of the models registered, of one name if name isn't None
+    #    - Return a list of ModelVersion sorted by name and version
+    def listModels(self, name=None):
+        query = ('SELECT name, version, created, healthyGroup, '
+                 '(SELECT COUNT(*) FROM groups WHERE groups.model = models.id) FROM models')
+        with self.lock:
+            if name is None:
+                rows = self.connection.execute(query + ' ORDER BY name, version').fetchall()
+            else:
+                rows = self.connection.execute(query + ' WHERE name = ? ORDER BY version', (name,)).fetchall()
+        return [ModelVersion(*row) for row in rows]
+
+    # Function to get a version of a model, the last one if version is None
+    #    - Return a RegisteredModel, or None if the model isn't registered
+    def get(self, name, version=None):
+        with self.lock:
+            identifier = self.modelIdentifier(name, version)
+            if identifier is None:
+                return None
+            row = self.connection.execute(
+                'SELECT name, version, created, healthyGroup, parameters FROM models WHERE id = ?',
+                (identifier,)).fetchone()
+            groupRows = self.connection.execute(
+                'SELECT groupId, meanPath, meanDigest, modelPath, members FROM groups WHERE model = ?',
+                (identifier,)).fetchall()
+        groups = dict()
+        for groupId, meanPath, meanDigest, modelPath, members in groupRows:
+            groups[groupId] = RegisteredGroup(groupId, meanPath, meanDigest, modelPath, json.loads(members))
+        return RegisteredModel(row[0], row[1], row[2], row[3], json.loads(row[4]), groups)
+
+    # Function to change the healthy group of a version of a model
+    def setHealthyGroup(self, name, version, healthyGroup):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('UPDATE models SET healthyGroup = ? WHERE name = ? AND version = ?',
+                                        (healthyGroup, name, version))
+
+    # Function to save an array derived from a version of a model
+    #    - digest: digest of the files the array was computed from (see FileCache.digestFiles)
+    def setDerived(self, name, version, key, digest, array):
+        value = sqlite3.Binary(arrayToBytes(array))
+        with self.lock:
+            identifier = self.modelIdentifier(name, version)
+            if identifier is None:
+                raise KeyError('The model ' + str(name) + ' version ' + str(version) + ' is not registered')
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO derived (model, key, digest, value) VALUES (?, ?, ?, ?)',
+                                        (identifier, key, digest, value))
+
+    # Function to get an array derived from a version of a model
+    #    - Return None if there is no array for this key, or if it was computed from files with another digest
+    def getDerived(self, name, version, key, digest):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT derived.digest, derived.value FROM derived JOIN models ON derived.model = models.id '
+                'WHERE models.name = ? AND models.version = ? AND derived.key = ?', (name, version, key)).fetchone()
+        if row is None or row[0] != digest:
+            return None
+        return bytesToArray(row[1])
+
+    # Function to check that the means of a version of a model didn't change since it was registered
+    #    - Return the list of the errors, empty if the model can be used
+    def verify(self, model):
+        errors = list()
+        for key in sorted(model.groups.keys()):
+            group = model.groups[key]
+            try:
+                if digestFiles([group.meanPath], hashContent=True) != group.meanDigest:
+                    errors.append('Group ' + str(key) + ': ' + group.meanPath + ' changed since the model was registered')
+            except (IOError, OSError):
+                errors.append('Group ' + str(key) + ': ' + group.meanPath + ' does not exist anymore')
+        return errors
+
+    # Function to remove a version of a model from the registry, with its groups and its derived data
+    def remove(self, name, version):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM models WHERE name = ? AND version = ?', (name, version))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
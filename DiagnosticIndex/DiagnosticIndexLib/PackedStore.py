@@ -0,0 +1,178 @@
+import os
+import json
+import struct
+import numpy
+import vtk
+from vtk.util import numpy_support
+
+from .MeshIO import readPolyData, getPointsArray
+from .FileCache import digestFiles
+
+# Layout of a packed store file:
+#    - magic string (8 bytes) and length of the header (uint64)
+#    - header in JSON: number of shapes and points, offsets of the blocks, index of the files
+#    - points block: float32 array of shape (numberOfShapes, numberOfPoints, 3)
+#    - connectivity block: int64 array of the polygons shared by all the shapes (legacy VTK cell array layout)
+PACKED_STORE_MAGIC = b'DIPACK01'
+PACKED_STORE_ALIGNMENT = 64
+
+
+# Function to get the polygons of a polydata as an array in the legacy VTK layout (npts, id0, id1, ...)
+def getPolysArray(polyData):
+    polys = polyData.GetPolys()
+    legacyArray = vtk.vtkIdTypeArray()
+    if hasattr(polys, 'ExportLegacyFormat'):
+        polys.ExportLegacyFormat(legacyArray)
+    else:
+        legacyArray.DeepCopy(polys.GetData())
+    return numpy_support.vtk_to_numpy(legacyArray).astype(numpy.int64)
+
+
+# Function to pack a population of meshes in correspondence in one file
+#    - dictVTKFiles contains the vtk files sorted by group
+#    - The shapes of a group are stored in consecutive rows, the groups are sorted
+#    - The points of the meshes are written one mesh at a time: the whole population is never in memory
+def createPackedStore(filepath, dictVTKFiles):
+    files = list()
+    for key in sorted(dictVTKFiles.keys()):
+        for vtkFile in dictVTKFiles[key]:
+            files.append({'path': vtkFile, 'group': key, 'row': len(files)})
+    if len(files) == 0:
+        raise ValueError('Cannot create a packed store without any mesh')
+
+    # Topology of the population, given by the first mesh
+    reference = readPolyData(files[0]['path'])
+    if reference.GetNumberOfStrips() > 0 or reference.GetNumberOfLines() > 0:
+        raise ValueError('Only meshes made of polygons can be packed: ' + files[0]['path'])
+    polys = getPolysArray(reference)
+    numberOfPoints = reference.GetNumberOfPoints()
+
+    # Header with the offsets of the blocks
+    header = {'numberOfShapes': len(files),
+              'numberOfPoints': numberOfPoints,
+              'numberOfPolys': reference.GetNumberOfPolys(),
+              'polysSize': len(polys),
+              'digest': digestFiles([entry['path'] for entry in files]),
+              'files': files}
+    headerSize = len(json.dumps(header)) + 256
+    pointsOffset = alignOffset(16 + headerSize)
+    polysOffset = alignOffset(pointsOffset + len(files) * numberOfPoints * 3 * 4)
+    header['pointsOffset'] = pointsOffset
+    header['polysOffset'] = polysOffset
+    headerBytes = json.dumps(header).encode('utf-8')
+
+    file = open(filepath, 'wb')
+    file.write(PACKED_STORE_MAGIC)
+    file.write(struct.pack('<Q', len(headerBytes)))
+    file.write(headerBytes)
+    file.truncate(polysOffset)
+    file.seek(polysOffset)
+    file.write(polys.astype('<i8').tobytes())
+    file.close()
+
+    # Points of each mesh, which must have the points and the polygons of the first mesh
+    #    The file is removed if a mesh isn't in correspondence, so that it is never opened as up to date
+    points = numpy.memmap(filepath, dtype='<f4', mode='r+', offset=pointsOffset,
+                          shape=(len(files), numberOfPoints, 3))
+    try:
+        for entry in files:
+            if entry['row'] == 0:
+                polyData = reference
+            else:
+                polyData = readPolyData(entry['path'])
+                checkTopology(polyData, numberOfPoints, polys, entry['path'])
+            points[entry['row']] = getPointsArray(polyData)
+        points.flush()
+    except Exception:
+        del points
+        os.remove(filepath)
+        raise
+    del points
+    return PackedStore(filepath)
+
+
+# Function to check that a mesh has the number of points and the polygons of the population
+def checkTopology(polyData, numberOfPoints, polys, filepath):
+    if polyData.GetNumberOfPoints() != numberOfPoints:
+        raise ValueError('The mesh ' + filepath + ' has ' + str(polyData.GetNumberOfPoints()) + ' points instead of '
+                         + str(numberOfPoints) + ': the meshes must be in correspondence')
+    if polyData.GetNumberOfStrips() > 0 or polyData.GetNumberOfLines() > 0 \
+            or not numpy.array_equal(getPolysArray(polyData), polys):
+        raise ValueError('The mesh ' + filepath + ' has other polygons than the first mesh'
+                         + ': the meshes must be in correspondence')
+
+
+# Function to round an offset up to the alignment of the blocks
+def alignOffset(offset):
+    return (offset + PACKED_STORE_ALIGNMENT - 1) // PACKED_STORE_ALIGNMENT * PACKED_STORE_ALIGNMENT
+
+
+# Population of meshes packed in one file, opened by memory mapping
+#    - points: array of shape (numberOfShapes, numberOfPoints, 3) read from the file on demand
+#    - The rows of the meshes are found by their path
+class PackedStore(object):
+    def __init__(self, filepath):
+        self.filepath = filepath
+        file = open(filepath, 'rb')
+        magic = file.read(8)
+        if magic != PACKED_STORE_MAGIC:
+            file.close()
+            raise IOError(filepath + ' is not a packed store')
+        headerSize = struct.unpack('<Q', file.read(8))[0]
+        self.header = json.loads(file.read(headerSize).decode('utf-8'))
+        file.close()
+
+        self.numberOfShapes = self.header['numberOfShapes']
+        self.numberOfPoints = self.header['numberOfPoints']
+        self.points = numpy.memmap(filepath, dtype='<f4', mode='r', offset=self.header['pointsOffset'],
+                                   shape=(self.numberOfShapes, self.numberOfPoints, 3))
+        self.polys = numpy.memmap(filepath, dtype='<i8', mode='r', offset=self.header['polysOffset'],
+                                  shape=(self.header['polysSize'],))
+        self.rows = dict()
+        self.groups = dict()
+        for entry in self.header['files']:
+            self.rows[entry['path']] = entry['row']
+            self.groups.setdefault(entry['group'], list()).append(entry['path'])
+        self.cellArray = None
+
+    # Function to check if the store is up to date with a population of meshes sorted by group
+    def isUpToDate(self, dictVTKFiles):
+        filepaths = list()
+        for value in dictVTKFiles.values():
+            filepaths.extend(value)
+        if sorted(filepaths) != sorted(self.rows.keys()):
+            return False
+        return digestFiles(filepaths) == self.header['digest']
+
+    # Function to check if all the vtk files given are in the store
+    def contains(self, vtkFiles):
+        for vtkFile in vtkFiles:
+            if vtkFile not in self.rows:
+                return False
+        return True
+
+    # Function to get the points of some meshes as an array of shape (N, numberOfPoints, 3)
+    #    - If the meshes are in consecutive rows, the array is a view of the file: nothing is copied
+    def shapesPoints(self, vtkFiles):
+        rows = [self.rows[vtkFile] for vtkFile in vtkFiles]
+        if rows == list(range(rows[0], rows[0] + len(rows))):
+            return self.points[rows[0]:rows[0] + len(rows)]
+        return self.points[rows]
+
+    # Function to get the points of one mesh as an array of shape (numberOfPoints, 3)
+    def shapePoints(self, vtkFile):
+        return self.points[self.rows[vtkFile]]
+
+    # Function to create a polydata with the topology of the population and the points given
+    #    - The polygons are shared by all the polydata created
+    def polyData(self, points):
+        if self.cellArray is None:
+            self.cellArray = vtk.vtkCellArray()
+            self.cellArray.SetCells(self.header['numberOfPolys'],
+                                    numpy_support.numpy_to_vtkIdTypeArray(numpy.array(self.polys, dtype=numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]), deep=1))
+        polyData = vtk.vtkPolyData()
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_support.numpy_to_vtk(numpy.ascontiguousarray(points), deep=1))
+        polyData.SetPoints(vtkPoints)
+        polyData.SetPolys(self.cellArray)
+        return polyData
@@ -0,0 +1,504 @@
+import os
+import csv
+import shutil
+import traceback
+
+import numpy
+
+from .MeshIO import meshExtension, isLegacyMeshFormat, readPolyData, writePolyData
+from .MeshIO import getPointsArray, createPolyDataFromPoints, removePointArrays
+from .GroupMean import loadGroupPoints, computeGroupMean, downdateGroupMean, computeGroupVariance, computePointsVariance
+from .GroupScheduler import runGroups
+from .ExternalProcess import runProcess
+from .FileCache import digestFiles
+from .Classification import classifyShapes
+from .Jobs import JobCancelledError
+from .ShapeModel import SHAPE_MODEL_EXTENSION, fitShapeModel, loadShapeModel
+from .Procrustes import alignToReference, generalizedProcrustes
+from .Tracing import traced
+
+
+# Function to get the shape model saved next to a mean, None if there is none
+def shapeModelOfMean(meanPath):
+    modelPath = os.path.splitext(meanPath)[0] + SHAPE_MODEL_EXTENSION
+    if os.path.exists(modelPath):
+        return modelPath
+    return None
+
+
+# Function to get the files of the Classification Groups
+#    - dictGroups: dictionary {group: [mean vtk file]}
+#    - Return the sorted list of the groups, the mean vtk file and the shape model of each group
+#      (None if the group has no model), and the digest of all these files
+def classificationFiles(dictGroups):
+    groups = sorted(dictGroups.keys())
+    meanFiles = [dictGroups[key][0] for key in groups]
+    modelFiles = [shapeModelOfMean(meanFile) for meanFile in meanFiles]
+    digest = digestFiles(meanFiles + [modelFile for modelFile in modelFiles if modelFile], groups)
+    return groups, meanFiles, modelFiles, digest
+
+
+# Function to load the shape models of the Classification Groups (see classificationFiles)
+#    - Return the list of the models in the order of the groups, None if a group has no model
+def loadClassificationModels(modelFiles):
+    if not all(modelFiles):
+        return None
+    return [loadShapeModel(modelFile) for modelFile in modelFiles]
+
+
+# Function to create a CSV file containing vtk files sorted by group (columns: VTK Files, Group)
+def writeGroupsCSVFile(filePath, dictGroups):
+    file = open(filePath, 'w')
+    cw = csv.writer(file, delimiter=',')
+    cw.writerow(['VTK Files', 'Group'])
+    for key, value in dictGroups.items():
+        for VTKPath in value:
+            cw.writerow([VTKPath, str(key)])
+    file.close()
+
+
+# Pipeline computing the means of the Classification Groups and classifying the patients, without any Qt widget
+#    - Shared by the logic of the module and the batch mode (see Batch.py): both compute the same means
+#      with the same parameters, caches and backends
+#    - The parameters are the ones of DiagnosticIndexLogic: meshFormat, meanBackend ('inprocess', 'statismo' or
+#      'shapemodel'), procrustesAlignment, procrustesScaling, procrustesTolerance, shapeModelVarianceFraction,
+#      shapeModelMaximumModes and the executables of statismo
+#    - loader: MeshLoader reading the vtk files, numberOfWorkers: number of groups computed at the same time
+#    - workspace: Workspace where the files given to statismo are written, needed by the statismo backend only
+#    - meanCache: optional FileCache of the means already computed
+#    - store: optional PackedStore of the meshes of the population
+#    - The groups can be computed by several threads at the same time
+class GroupPipeline(object):
+    def __init__(self, loader, numberOfWorkers=1, meshFormat='binary', meanBackend='inprocess',
+                 procrustesAlignment=False, procrustesScaling=False, procrustesTolerance=1e-6,
+                 shapeModelVarianceFraction=0.98, shapeModelMaximumModes=None,
+                 statismoBuildShapeModel=None, vtkBasicSamplingExample=None,
+                 workspace=None, meanCache=None, store=None):
+        self.loader = loader
+        self.numberOfWorkers = numberOfWorkers
+        self.meshFormat = meshFormat
+        self.meanBackend = meanBackend
+        self.procrustesAlignment = procrustesAlignment
+        self.procrustesScaling = procrustesScaling
+        self.procrustesTolerance = procrustesTolerance
+        self.shapeModelVarianceFraction = shapeModelVarianceFraction
+        self.shapeModelMaximumModes = shapeModelMaximumModes
+        self.statismoBuildShapeModel = statismoBuildShapeModel
+        self.vtkBasicSamplingExample = vtkBasicSamplingExample
+        self.workspace = workspace
+        self.meanCache = meanCache
+        self.store = store
+
+    # Function to get the parameters used to compute the means, saved with the models registered
+    def parameters(self):
+        return {'meanBackend': self.meanBackend,
+                'meshFormat': self.meshFormat,
+                'procrustesAlignment': self.procrustesAlignment,
+                'procrustesScaling': self.procrustesScaling,
+                'shapeModelVarianceFraction': self.shapeModelVarianceFraction,
+                'shapeModelMaximumModes': self.shapeModelMaximumModes}
+
+    # Function to save a VTK file to the filepath given
+    #    - If no format is given, the format of the pipeline is used (meshFormat)
+    def saveVTKFile(self, polydata, filepath, meshFormat=None):
+        if meshFormat is None:
+            meshFormat = self.meshFormat
+        writePolyData(polydata, filepath, meshFormat)
+
+    # Function to change the extension of a filename to the one of the format of the pipeline
+    def meshFilename(self, filename):
+        return os.path.splitext(filename)[0] + meshExtension(self.meshFormat)
+
+    # Function to get the path of the mean of a group in a directory
+    def meanPath(self, key, directory):
+        return directory + '/' + self.meshFilename('meanGroup' + str(key))
+
+    # Function to get the path of the shape model of a group in a directory, next to its mean
+    def modelPath(self, key, directory):
+        return directory + '/meanGroup' + str(key) + SHAPE_MODEL_EXTENSION
+
+    # Function to compute the key of the mean of a group in the cache
+    #    - The means of the aligned meshes have other keys than the means of the meshes given
+    #    - With the shapemodel backend, the key depends on the number of modes kept by the shape model
+    def meanCacheKey(self, value):
+        parameters = self.meanBackend
+        if self.meanBackend == 'shapemodel':
+            parameters = parameters + ':' + repr(self.shapeModelVarianceFraction) + ':' + str(self.shapeModelMaximumModes)
+        if self.procrustesAlignment:
+            parameters = parameters + ':procrustes:' + str(self.procrustesScaling) + ':' + repr(self.procrustesTolerance)
+        return digestFiles(value, parameters)
+
+    # Function to compute the mean of all the groups of a dictionary
+    #    - The groups are computed concurrently by numberOfWorkers threads
+    #    - The means are saved in the directory given, created by the caller
+    #    - Return two dictionaries sorted by group:
+    #           - the key of the mean in the cache of the groups successfully computed
+    #           - the error messages of the groups which failed
+    #    - If a job is given (see Jobs.Job), its progress is updated after each group
+    #      and the computation stops if it is cancelled
+    @traced('lib')
+    def computeGroups(self, dictVTKFiles, directory, job=None):
+        results, errors = runGroups(dictVTKFiles,
+                                    lambda key, value: self.computeGroup(key, value, directory, job),
+                                    self.numberOfWorkers, job)
+        if job is not None:
+            job.checkCancelled()
+        return results, errors
+
+    # Function to compute the groups of a dictionary with the group key without the vtk file given
+    #    - The other groups don't change: they are computed as usual, their mean is usually found in the cache
+    #    - The mean of the group key is computed from the mean of the whole group,
+    #      only the removed vtk file is read (see computeLeaveOneOutGroup)
+    #    - Return the same dictionaries as computeGroups
+    @traced('lib', groupArgument=2)
+    def computeLeaveOneOutGroups(self, dictVTKFiles, key, vtkFile, directory, job=None):
+        otherGroups = dict()
+        for group, value in dictVTKFiles.items():
+            if not group == key:
+                otherGroups[group] = value
+        results, errors = self.computeGroups(otherGroups, directory, job)
+
+        try:
+            results[key] = self.computeLeaveOneOutGroup(key, dictVTKFiles[key], vtkFile, directory, job)
+        except JobCancelledError:
+            raise
+        except Exception:
+            errors[key] = traceback.format_exc()
+        return results, errors
+
+    # Function to compute the mean of one group, saved in the directory given as meanGroupKey.vtk
+    #    - This function is called in a thread
+    #    - If the mean of the group is in the cache, it is copied instead of being computed
+    #    - With the statismo backend, in a directory of the workspace for the group:
+    #           - Remove all the arrays of all the vtk files
+    #           - Compute the mean of the group thanks to Statismo
+    #    - With the shapemodel backend, the shape model of the group is saved too as meanGroupKey.npz
+    #    - Return the key of the mean of the group in the cache
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def computeGroup(self, key, value, directory, job=None):
+        cacheKey = self.meanCacheKey(value)
+        cachedMeanPath = None
+        cachedModelPath = None
+        if self.meanCache is not None:
+            cachedMeanPath = self.meanCache.get(cacheKey, self.meshFilename(''))
+            if self.meanBackend == 'shapemodel':
+                cachedModelPath = self.meanCache.get(cacheKey, SHAPE_MODEL_EXTENSION)
+        if cachedMeanPath and (cachedModelPath or not self.meanBackend == 'shapemodel'):
+            print("--- Mean of the group " + str(key) + " found in the cache ---")
+            shutil.copyfile(cachedMeanPath, self.meanPath(key, directory))
+            if cachedModelPath:
+                shutil.copyfile(cachedModelPath, self.modelPath(key, directory))
+        elif self.meanBackend == 'shapemodel':
+            # Fit the shape model of the group directly from the point arrays of the vtk files
+            self.computeShapeModel(key, value, directory, job)
+        elif self.meanBackend == 'statismo':
+            # The files given to statismo are written in a directory of the group, removed at the end,
+            # or kept for inspection if statismo failed
+            with self.workspace.temporaryDirectory('group' + str(key), keepOnError=True) as groupDirectory:
+                # Delete all the arrays in vtk file
+                self.deleteArrays(key, value, groupDirectory, directory, job)
+
+                if len(value) > 1:
+                    # Create the datalist for Statismo
+                    datalist = self.creationTXTFile(key, value, groupDirectory)
+
+                    # Compute the mean of the group thanks to Statismo
+                    self.computeMean(key, datalist, groupDirectory, directory, job)
+        else:
+            # Compute the mean of the group directly from the point arrays of the vtk files
+            self.computeMeanInProcess(key, value, directory, job)
+        return cacheKey
+
+    # Function to compute the mean of a group without one of its vtk files, saved as meanGroupKey.vtk
+    #    - value is the list of the vtk files of the group without vtkFile
+    #    - The mean of the whole group is found in the cache, or computed and added to the cache,
+    #      then the mean without vtkFile is (N * mean - x) / (N - 1), computed from the mean in double precision
+    #      of the shape model of the group if there is one
+    #    - If the meshes are aligned, the alignment depends on all the meshes of the group,
+    #      and the mean of statismo isn't the arithmetic mean of the meshes:
+    #      the group without vtkFile is computed again, as it is without a cache
+    #    - The shape model of the whole group doesn't describe the group without vtkFile: no model is saved
+    #    - Return the key of the mean of the group without vtkFile in the cache
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def computeLeaveOneOutGroup(self, key, value, vtkFile, directory, job=None):
+        print("--- Compute the mean of the group " + str(key) + " without " + os.path.basename(vtkFile) + " ---")
+        if len(value) == 0:
+            raise ValueError('The group ' + str(key) + ' is empty without ' + vtkFile)
+        if self.procrustesAlignment or self.meanBackend == 'statismo' or self.meanCache is None:
+            return self.computeGroup(key, value, directory, job)
+
+        # Mean of the whole group, found in the cache or computed then cached
+        #    A mean just computed is downdated from its working directory: adding the shape model to the cache
+        #    may evict the mean
+        wholeGroup = value + [vtkFile]
+        wholeGroupCacheKey = self.meanCacheKey(wholeGroup)
+        wholeGroupMeanPath = self.meanCache.get(wholeGroupCacheKey, self.meshFilename(''))
+        if wholeGroupMeanPath:
+            wholeGroupModelPath = self.meanCache.get(wholeGroupCacheKey, SHAPE_MODEL_EXTENSION)
+            self.downdateGroup(key, wholeGroup, vtkFile, wholeGroupMeanPath, wholeGroupModelPath, directory)
+        else:
+            with self.workspace.temporaryDirectory('group' + str(key)) as wholeGroupDirectory:
+                self.computeGroup(key, wholeGroup, wholeGroupDirectory, job)
+                self.cacheGroup(key, wholeGroupDirectory, wholeGroupCacheKey)
+                wholeGroupModelPath = self.modelPath(key, wholeGroupDirectory)
+                if not os.path.exists(wholeGroupModelPath):
+                    wholeGroupModelPath = None
+                self.downdateGroup(key, wholeGroup, vtkFile, self.meanPath(key, wholeGroupDirectory),
+                                   wholeGroupModelPath, directory)
+        return self.meanCacheKey(value)
+
+    # Function to remove a vtk file from the mean of its whole group and to save the result in the directory given
+    #    - The mean of the shape model of the group (double precision) is used if there is one
+    def downdateGroup(self, key, wholeGroup, vtkFile, wholeGroupMeanPath, wholeGroupModelPath, directory):
+        meanPoints = None
+        if wholeGroupModelPath:
+            meanPoints = loadShapeModel(wholeGroupModelPath).mean
+        meanPolyData = downdateGroupMean(wholeGroupMeanPath, len(wholeGroup), vtkFile, self.store, meanPoints)
+        self.saveVTKFile(meanPolyData, self.meanPath(key, directory))
+
+    # Function to add the mean of a group computed in the directory given to the cache
+    #    - The shape model of the group is added too, if there is one
+    #    - Nothing is done if there is no cache, or if the mean is already cached
+    def cacheGroup(self, key, directory, cacheKey):
+        if self.meanCache is None or not cacheKey:
+            return
+        meanPath = self.meanPath(key, directory)
+        if not self.meanCache.contains(cacheKey, self.meshFilename('')) and os.path.exists(meanPath):
+            self.meanCache.put(cacheKey, meanPath)
+        modelPath = self.modelPath(key, directory)
+        if not self.meanCache.contains(cacheKey, SHAPE_MODEL_EXTENSION) and os.path.exists(modelPath):
+            self.meanCache.put(cacheKey, modelPath)
+
+    # Function to load the points of all the meshes of a group in one array of shape (N, numPts, 3)
+    #    - If the meshes are in the packed store, their points are read from it
+    #    - If procrustesAlignment is True, the meshes are aligned (see Procrustes.generalizedProcrustes)
+    #    - If a job is given, the reading stops when the job is cancelled
+    #    - Return the array and a function creating a polydata with the topology of the group from points
+    def loadGroupPoints(self, key, value, dtype=numpy.float64, job=None):
+        if self.store is not None and self.store.contains(value):
+            points = self.store.shapesPoints(value)
+            createPolyData = lambda points: self.store.polyData(points.astype(numpy.float32))
+        else:
+            points, reference = loadGroupPoints(value, self.loader, dtype, job)
+            pointsType = getPointsArray(reference).dtype
+            createPolyData = lambda points: createPolyDataFromPoints(reference, points.astype(pointsType))
+        if self.procrustesAlignment:
+            alignment = generalizedProcrustes(points, self.procrustesScaling, self.procrustesTolerance)
+            print("    Group " + str(key) + " aligned in " + str(alignment['iterations']) + " iterations")
+            points = alignment['points']
+        if job is not None:
+            job.checkCancelled()
+        return points, createPolyData
+
+    # Function to compute the mean between all the mesh-files contained in one group
+    #    - The points of all the meshes are loaded in one array and averaged in a single pass
+    #    - If the meshes are in the packed store, their points are read from it
+    #    - If procrustesAlignment is True, the mean of the aligned meshes is computed
+    #    - The mean is saved in the directory given as meanGroupKey.vtk
+    #    - If a job is given, the computation stops when the job is cancelled
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def computeMeanInProcess(self, key, value, directory, job=None):
+        print("--- Compute the mean of the group " + str(key) + " ---")
+        if self.procrustesAlignment:
+            points, createPolyData = self.loadGroupPoints(key, value, job=job)
+            meanPolyData = createPolyData(points.mean(axis=0))
+        else:
+            meanPolyData = computeGroupMean(value, self.store, self.loader, job)
+        self.saveVTKFile(meanPolyData, self.meanPath(key, directory))
+
+    # Function to fit the shape model of one group (see ShapeModel.fitShapeModel)
+    #    - The points of the meshes are read in single precision, from the packed store if they are in it,
+    #      and aligned if procrustesAlignment is True (see loadGroupPoints)
+    #    - The mean is saved as meanGroupKey.vtk and the model as meanGroupKey.npz in the directory given
+    #    - If a job is given, the computation stops when the job is cancelled, before and after the fit
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def computeShapeModel(self, key, value, directory, job=None):
+        print("--- Compute the shape model of the group " + str(key) + " ---")
+        points, createPolyData = self.loadGroupPoints(key, value, numpy.float32, job)
+        model = fitShapeModel(points, self.shapeModelVarianceFraction, self.shapeModelMaximumModes)
+        if job is not None:
+            job.checkCancelled()
+        meanPolyData = createPolyData(model.mean)
+        print("    " + str(model.numberOfModes) + " modes kept")
+        self.saveVTKFile(meanPolyData, self.meanPath(key, directory))
+        model.save(self.modelPath(key, directory))
+
+    # Function to copy and delete all the arrays of all the meshes contained in a list
+    #    - The copies are saved in the directory of the group given
+    #    - If there is just one file in the list, it is saved as the mean of the group in outputDirectory
+    #    - If a job is given, the copy stops when the job is cancelled
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def deleteArrays(self, key, value, groupDirectory, outputDirectory, job=None):
+        # Read the VTK Files concurrently
+        for vtkFile, polyData, error in self.loader.iterPolyData(value):
+            if job is not None:
+                job.checkCancelled()
+            if error is not None:
+                raise IOError(error)
+
+            # Shallow copy of the polydata without any array
+            polyDataCopy = removePointArrays(polyData)
+
+            # Creation of the path of the vtk file without arrays to save it in the directory of the group
+            #    If there is just one file in the list, it is renamed meanGroupKey.vtk in the output directory
+            #    Else the file will be read by statismo: it is saved in a legacy format
+            if len(value) > 1:
+                filepath = groupDirectory + '/' + os.path.basename(vtkFile)
+                if isLegacyMeshFormat(self.meshFormat):
+                    self.saveVTKFile(polyDataCopy, filepath)
+                else:
+                    self.saveVTKFile(polyDataCopy, filepath, 'binary')
+            else:
+                self.saveVTKFile(polyDataCopy, self.meanPath(key, outputDirectory))
+
+    # Creation of a txt file that will be used to create the shape model thanks to the CLI statismo-build-shape-model
+    #    To be conformed, the txt file will have one path of a mesh-file per line
+    #    The meshes are the copies without arrays saved in the directory of the group by deleteArrays
+    @traced('lib', groupArgument=1, meshesArgument=2)
+    def creationTXTFile(self, key, value, groupDirectory):
+        # Filepath of the txt file
+        filename = "group" + str(key)
+        dataListPath = groupDirectory + '/' + filename + '.txt'
+
+        # Write one path of a mesh-file per line
+        file = open(dataListPath, "w")
+        for vtkFile in value:
+            pathfile = groupDirectory + '/' + os.path.basename(vtkFile)
+            file.write(pathfile + "\n")
+        file.close()
+        return dataListPath
+
+    # Function to compute the mean between all the mesh-files contained in one group thanks to Statismo
+    #    - The files of statismo are written in the directory of the group,
+    #      the mean is saved in the output directory as meanGroupKey.vtk
+    @traced('lib', groupArgument=1)
+    def computeMean(self, key, datalist, groupDirectory, outputDirectory, job=None):
+        print("--- Compute the mean of the group " + str(key) + " ---")
+
+        # Call of statismo-build-shape-model used to build a shape model from a given list of meshes
+        # Arguments:
+        #  --data-list is the path to a file containing a list of mesh-files that will be used to create the shape model
+        #  --output-file is the path where the newly build model should be saved (creation of hdf5 file)
+        #  --procrustes GPA aligns all the meshes on the mean of the group, if procrustesAlignment is True
+
+        #     Creation of the command line
+        arguments = list()
+        arguments.append("--data-list")
+        arguments.append(datalist)
+        arguments.append("--output-file")
+        filename = "group" + str(key)
+        outputFile = groupDirectory + '/' + filename + '.h5'
+        arguments.append(outputFile)
+        if self.procrustesAlignment:
+            arguments.append("--procrustes")
+            arguments.append("GPA")
+
+        #     Call the CLI
+        runProcess(self.statismoBuildShapeModel, arguments, job)
+
+        # Call of vtkBasicSamplingExample which will save the mean of the group contained in the hdf5 file
+        # Arguments:
+        #  First argument:   path of the hdf5 file created previously
+        #  Second argument:  path of the directory of the group where the 3 following vtk files will be save:
+        #                       - mean.vtk
+        #                       - samplePC1.vtk
+        #                       - randomsample.vtk
+
+        #     Creation of the command line
+        arguments = list()
+        arguments.append(outputFile)
+        arguments.append(groupDirectory)
+
+        #     Call the executable
+        runProcess(self.vtkBasicSamplingExample, arguments, job)
+
+        # Save of the mean of the group in the format of the pipeline
+        meanPolyData = readPolyData(groupDirectory + '/mean.vtk')
+        self.saveVTKFile(meanPolyData, self.meanPath(key, outputDirectory))
+
+    # Function to save the Classification Groups in the directory given
+    #       - The mean vtk file of each group, in the format of the pipeline, with its shape model if it has one
+    #       - The CSV file containing the path of each mean group with the group associated
+    #    - dictGroups: dictionary {group: [mean vtk file]}, the means are read concurrently
+    #    - Return the dictionary {group: [mean vtk file saved]}, the points of the mean of each group
+    #      and the list of the means which couldn't be read
+    @traced('lib')
+    def saveClassificationGroups(self, CSVfilePath, directory, dictGroups):
+        # Mean vtk file of each group
+        groupOfFile = dict()
+        vtkFiles = list()
+        for key, value in dictGroups.items():
+            if os.path.exists(value[0]):
+                groupOfFile[value[0]] = key
+                vtkFiles.append(value[0])
+
+        # Save the mean vtk files of each groups
+        dictForCSV = dict()
+        meanOfGroup = dict()
+        errors = list()
+        for vtkFile, polyData, error in self.loader.iterPolyData(vtkFiles):
+            if error is not None:
+                errors.append(vtkFile)
+                print(error)
+                continue
+
+            # Save the vtk file, and the shape model of the group next to it
+            #    The shape model of a previous export, which doesn't describe this mean, is removed
+            VTKFilePath = directory + '/' + self.meshFilename(os.path.basename(vtkFile))
+            self.saveVTKFile(polyData, VTKFilePath)
+            modelPath = shapeModelOfMean(vtkFile)
+            savedModelPath = os.path.splitext(VTKFilePath)[0] + SHAPE_MODEL_EXTENSION
+            if modelPath:
+                shutil.copyfile(modelPath, savedModelPath)
+            elif os.path.exists(savedModelPath):
+                os.remove(savedModelPath)
+
+            # Fill a dictionary which will be used to created the CSV file containing the Classification Groups
+            dictForCSV[groupOfFile[vtkFile]] = [VTKFilePath]
+            meanOfGroup[groupOfFile[vtkFile]] = getPointsArray(polyData)
+
+        # Save the CSV file containing the path of each mean group with the group associated
+        writeGroupsCSVFile(CSVfilePath, dictForCSV)
+        return dictForCSV, meanOfGroup, errors
+
+    # Function to register a new version of a model in a registry (see ModelRegistry)
+    #    - dictGroups: mean vtk file of each group, meanOfGroup: points of the mean of each group
+    #    - The parameters of the pipeline and the vtk files of each group are saved with the model,
+    #      and the array of the means, so that the means don't have to be read again to classify the patients
+    #    - Return the version of the model
+    def registerClassificationGroups(self, registry, name, dictGroups, meanOfGroup, dictVTKFiles=None):
+        if dictVTKFiles is None:
+            dictVTKFiles = dict()
+        groups = dict()
+        for key, value in dictGroups.items():
+            groups[key] = {'meanPath': value[0],
+                           'modelPath': shapeModelOfMean(value[0]),
+                           'members': dictVTKFiles.get(key, [])}
+        version = registry.register(name, groups, None, self.parameters())
+
+        # Array of the means, if they are in correspondence
+        keys, meanFiles, modelFiles, digest = classificationFiles(dictGroups)
+        if len(set([meanOfGroup[key].shape for key in keys])) == 1:
+            means = numpy.array([meanOfGroup[key] for key in keys])
+            registry.setDerived(name, version, 'means', digest, means)
+        return version
+
+    # Function to compute the variance of each point of one group (see GroupMean.computeGroupVariance)
+    #    - If procrustesAlignment is True, the variance of the aligned meshes is computed
+    def groupVariance(self, key, value):
+        if self.procrustesAlignment:
+            return computePointsVariance(self.loadGroupPoints(key, value)[0])
+        return computeGroupVariance(value, self.store, self.loader)
+
+    # Function to compute the variances of the groups given, array of shape (G, numPts)
+    def groupVariances(self, groups, dictVTKFiles):
+        return numpy.array([self.groupVariance(key, dictVTKFiles[key]) for key in groups])
+
+    # Function to classify shapes against the means of the Classification Groups (see Classification.classifyShapes)
+    #    - shapes: array of shape (B, numPts, 3), means: array of shape (G, numPts, 3) in the order of the groups
+    #    - If procrustesAlignment is True, the shapes are aligned on the average of the means of the groups
+    #    - The Mahalanobis score is given by the shape models of the groups or by the variances, if given
+    def classifyShapes(self, shapes, groups, means, healthyGroup=None, variances=None, models=None):
+        if self.procrustesAlignment:
+            shapes = alignToReference(shapes, means.mean(axis=0), self.procrustesScaling)
+        return classifyShapes(shapes, means, groups, healthyGroup, variances, models)
@@ -0,0 +1,112 @@
+import numpy
+
+from .Tracing import traced
+
+
+# Function to compute the rotations aligning a batch of centered shapes on centered references (Kabsch)
+#    - shapes: array of shape (N, numPts, 3)
+#    - references: array of shape (numPts, 3), shared by all the shapes, or (N, numPts, 3)
+#    - The N covariance matrices 3 x 3 are decomposed by one batched SVD, the reflections are removed
+#    - Return the rotations (N, 3, 3) such that shapes[n].dot(rotations[n]) is the closest to references[n],
+#      and the sum of the singular values of each covariance (N,), used to compute the optimal scales
+def kabschRotations(shapes, references):
+    covariances = numpy.matmul(shapes.transpose(0, 2, 1), references)
+    u, singularValues, vt = numpy.linalg.svd(covariances)
+    signs = numpy.sign(numpy.linalg.det(numpy.matmul(u, vt)))
+    signs[signs == 0] = 1
+    u[:, :, 2] *= signs[:, numpy.newaxis]
+    singularValues[:, 2] *= signs
+    return numpy.matmul(u, vt), singularValues.sum(axis=1)
+
+
+# Function to align shapes on one reference by a rigid transformation (and a scale if scaling is True)
+#    - shapes: array of shape (N, numPts, 3) or (numPts, 3), reference: array of shape (numPts, 3)
+#    - Return the aligned shapes, in the coordinates of the reference
+def alignToReference(shapes, reference, scaling=False):
+    shapes = numpy.asarray(shapes, dtype=numpy.float64)
+    single = shapes.ndim == 2
+    if single:
+        shapes = shapes[numpy.newaxis]
+    reference = numpy.asarray(reference, dtype=numpy.float64)
+    if shapes.shape[1:] != reference.shape:
+        raise ValueError('The shapes have ' + str(shapes.shape[1]) + ' points and the reference '
+                         + str(reference.shape[0]) + ': the meshes must be in correspondence')
+    referenceCentroid = reference.mean(axis=0)
+    centered = shapes - shapes.mean(axis=1)[:, numpy.newaxis]
+    rotations, traces = kabschRotations(centered, reference - referenceCentroid)
+    aligned = numpy.matmul(centered, rotations)
+    if scaling:
+        aligned *= (traces / numpy.maximum((centered ** 2).sum(axis=(1, 2)), 1e-300))[:, numpy.newaxis, numpy.newaxis]
+    aligned += referenceCentroid
+    if single:
+        return aligned[0]
+    return aligned
+
+
+# Function to align a group of shapes in correspondence by generalized Procrustes analysis
+#    - points: array of shape (N, numPts, 3), which can be a memory mapping (see PackedStore)
+#    - All the shapes are centered, then rotated (and scaled if scaling is True) together on the current mean:
+#      one batched SVD per iteration, until the relative change of the mean is under tolerance
+#    - The aligned group is finally placed on the mean of the shapes given, so that the groups stay
+#      in the coordinates of the meshes and can be compared with each other
+#    - Return a dictionary:
+#           - 'points': (N, numPts, 3) aligned shapes
+#           - 'rotations' (N, 3, 3), 'scales' (N,), 'translations' (N, 3) and 'offset' (3,):
+#             aligned[n] = scales[n] * (points[n] + translations[n]).dot(rotations[n]) + offset
+#           - 'iterations': number of iterations, 'converged': True if the tolerance was reached
+@traced('lib', meshesArgument=0)
+def generalizedProcrustes(points, scaling=False, tolerance=1e-6, maximumIterations=100):
+    shapes = numpy.array(points, dtype=numpy.float64)
+    numberOfShapes = len(shapes)
+    if numberOfShapes == 0:
+        raise ValueError('Cannot align an empty group')
+    originalMean = shapes.mean(axis=0)
+
+    # Centering (and normalization of the size)
+    translations = -shapes.mean(axis=1)
+    shapes += translations[:, numpy.newaxis]
+    rotations = numpy.tile(numpy.eye(3), (numberOfShapes, 1, 1))
+    scales = numpy.ones(numberOfShapes)
+    if scaling:
+        sizes = numpy.sqrt((shapes ** 2).sum(axis=(1, 2)))
+        sizes[sizes == 0] = 1
+        shapes /= sizes[:, numpy.newaxis, numpy.newaxis]
+        scales /= sizes
+
+    # Alignment on the mean, starting from the first shape
+    mean = shapes[0].copy()
+    iterations = 0
+    converged = numberOfShapes < 2
+    while not converged and iterations < maximumIterations:
+        iterations += 1
+        iterationRotations, traces = kabschRotations(shapes, mean)
+        shapes = numpy.matmul(shapes, iterationRotations)
+        rotations = numpy.matmul(rotations, iterationRotations)
+        if scaling:
+            factors = traces / numpy.maximum((shapes ** 2).sum(axis=(1, 2)), 1e-300)
+            shapes *= factors[:, numpy.newaxis, numpy.newaxis]
+            scales *= factors
+        newMean = shapes.mean(axis=0)
+        if scaling:
+            newMean /= max(numpy.sqrt((newMean ** 2).sum()), 1e-300)
+        change = numpy.sqrt(((newMean - mean) ** 2).sum() / max((mean ** 2).sum(), 1e-300))
+        mean = newMean
+        converged = change < tolerance
+
+    # Placement of the aligned group on the mean of the shapes given
+    offset = originalMean.mean(axis=0)
+    finalRotation, trace = kabschRotations(mean[numpy.newaxis], originalMean - offset)
+    shapes = numpy.matmul(shapes, finalRotation[0])
+    rotations = numpy.matmul(rotations, finalRotation[0])
+    if scaling:
+        factor = trace[0] / max((mean ** 2).sum(), 1e-300)
+        shapes *= factor
+        scales *= factor
+    shapes += offset
+    return {'points': shapes,
+            'rotations': rotations,
+            'scales': scales,
+            'translations': translations,
+            'offset': offset,
+            'iterations': iterations,
+            'converged': converged}
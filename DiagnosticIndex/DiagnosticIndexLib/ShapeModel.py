@@ -0,0 +1,215 @@
+import numpy
+
+from .Tracing import traced
+
+# Extension of the files of the shape models (numpy archive)
+SHAPE_MODEL_EXTENSION = '.npz'
+SHAPE_MODEL_VERSION = 1
+
+# Number of points of the meshes read at the same time: the centered data is never in memory as a whole
+SHAPE_MODEL_BLOCK_SIZE = 4096
+
+# Number of shapes from which the modes are computed by randomized SVD instead of the Gram matrix
+RANDOMIZED_SVD_MINIMUM_SHAPES = 2000
+
+# Smallest variance kept for a mode or for the residual, to avoid the divisions by zero
+MINIMUM_VARIANCE = 1e-12
+
+# Smallest residual variance, as a fraction of the mean variance of a coordinate
+#    With fewer shapes than coordinates, the shapes have no variance outside of the modes: without this floor,
+#    the distance of a new shape would only depend on its distance to the space of the modes
+NOISE_VARIANCE_REGULARIZATION = 1e-2
+
+
+# Function to iterate over the blocks of points of a population of meshes
+#    - points: array of shape (N, numPts, 3), which can be a memory mapping (see PackedStore)
+#    - Yield the columns of the block in the flattened shapes and the centered block of shape (N, 3 * blockSize)
+#    - Each block is a copy: the points given are never modified, and can be read again by the next pass
+def iterCenteredBlocks(points, mean, blockSize=SHAPE_MODEL_BLOCK_SIZE):
+    numberOfShapes = points.shape[0]
+    for start in range(0, points.shape[1], blockSize):
+        stop = min(start + blockSize, points.shape[1])
+        block = numpy.array(points[:, start:stop], dtype=numpy.float64).reshape(numberOfShapes, -1)
+        block -= mean[start:stop].reshape(-1)
+        yield 3 * start, 3 * stop, block
+
+
+# Function to compute the leading eigenvectors of the Gram matrix X X^T of the centered shapes X (N, 3 * numPts)
+#    - The N x N matrix is accumulated block by block, then diagonalized: O(N^2 numPts) instead of O(N numPts^2)
+#    - Return the eigenvalues in decreasing order, the eigenvectors (N, N) and the trace of X X^T
+def gramEigenvectors(points, mean, blockSize=SHAPE_MODEL_BLOCK_SIZE):
+    numberOfShapes = points.shape[0]
+    gram = numpy.zeros((numberOfShapes, numberOfShapes))
+    for start, stop, block in iterCenteredBlocks(points, mean, blockSize):
+        gram += block.dot(block.T)
+    eigenvalues, eigenvectors = numpy.linalg.eigh(gram)
+    order = numpy.argsort(eigenvalues)[::-1]
+    return numpy.maximum(eigenvalues[order], 0), eigenvectors[:, order], numpy.trace(gram)
+
+
+# Function to approximate the leading eigenvectors of X X^T by randomized SVD (Halko, Martinsson, Tropp)
+#    - The range of X is found from X Omega (N, rank) with a random Omega, refined by power iterations,
+#      then the small matrix Q^T X X^T Q (rank, rank) is diagonalized
+#    - Each pass reads the shapes block by block, like gramEigenvectors
+#    - Return the same values as gramEigenvectors, with rank eigenvalues
+def randomizedEigenvectors(points, mean, rank, numberOfIterations=2, seed=0, blockSize=SHAPE_MODEL_BLOCK_SIZE):
+    numberOfShapes = points.shape[0]
+    random = numpy.random.RandomState(seed)
+    rank = min(rank, numberOfShapes)
+
+    # Range of X
+    subspace = numpy.zeros((numberOfShapes, rank))
+    trace = 0.0
+    for start, stop, block in iterCenteredBlocks(points, mean, blockSize):
+        subspace += block.dot(random.normal(size=(stop - start, rank)))
+        trace += (block ** 2).sum()
+    for iteration in range(numberOfIterations):
+        subspace = numpy.linalg.qr(subspace)[0]
+        projection = numpy.zeros((numberOfShapes, rank))
+        for start, stop, block in iterCenteredBlocks(points, mean, blockSize):
+            projection += block.dot(block.T.dot(subspace))
+        subspace = projection
+    basis = numpy.linalg.qr(subspace)[0]
+
+    # Eigenvectors of X X^T in this range
+    small = numpy.zeros((rank, rank))
+    for start, stop, block in iterCenteredBlocks(points, mean, blockSize):
+        reduced = basis.T.dot(block)
+        small += reduced.dot(reduced.T)
+    eigenvalues, eigenvectors = numpy.linalg.eigh(small)
+    order = numpy.argsort(eigenvalues)[::-1]
+    return numpy.maximum(eigenvalues[order], 0), basis.dot(eigenvectors[:, order]), trace
+
+
+# Function to fit a statistical shape model (PCA) on a population of meshes in correspondence
+#    - points: array of shape (N, numPts, 3), which can be a memory mapping (see PackedStore)
+#    - The modes kept explain varianceFraction of the total variance, at most maximumModes of them
+#    - method: 'gram' (exact, N x N Gram matrix), 'randomized' (randomized SVD of rank maximumModes + 10)
+#      or 'auto' (randomized from RANDOMIZED_SVD_MINIMUM_SHAPES shapes)
+#    - The modes are the right singular vectors of the centered shapes X: v = X^T u / s,
+#      computed block by block from the left singular vectors u
+@traced('lib', meshesArgument=0)
+def fitShapeModel(points, varianceFraction=0.98, maximumModes=None, method='auto', seed=0,
+                  blockSize=SHAPE_MODEL_BLOCK_SIZE):
+    numberOfShapes, numberOfPoints = points.shape[0], points.shape[1]
+    if numberOfShapes == 0:
+        raise ValueError('Cannot fit a shape model on an empty group')
+    mean = points.mean(axis=0, dtype=numpy.float64)
+    if numberOfShapes < 2:
+        return ShapeModel(mean, numpy.zeros((0, 3 * numberOfPoints), dtype=numpy.float32),
+                          numpy.zeros(0), 0.0, numberOfShapes)
+
+    if method == 'auto':
+        method = 'randomized' if numberOfShapes >= RANDOMIZED_SVD_MINIMUM_SHAPES else 'gram'
+    if method == 'gram':
+        eigenvalues, eigenvectors, trace = gramEigenvectors(points, mean, blockSize)
+    elif method == 'randomized':
+        rank = min(maximumModes or 100, numberOfShapes - 1) + 10
+        eigenvalues, eigenvectors, trace = randomizedEigenvectors(points, mean, rank, seed=seed, blockSize=blockSize)
+    else:
+        raise ValueError('Unknown method to fit a shape model: ' + str(method))
+
+    # Number of modes kept
+    variances = eigenvalues / (numberOfShapes - 1)
+    totalVariance = trace / (numberOfShapes - 1)
+    numberOfModes = int(numpy.sum(variances > max(MINIMUM_VARIANCE, variances[0] * 1e-10)))
+    if totalVariance > 0:
+        cumulatedFraction = numpy.cumsum(variances[:numberOfModes]) / totalVariance
+        numberOfModes = min(numberOfModes, int(numpy.searchsorted(cumulatedFraction, varianceFraction - 1e-12)) + 1)
+    if maximumModes is not None:
+        numberOfModes = min(numberOfModes, maximumModes)
+
+    # Residual variance of the other directions (probabilistic PCA)
+    dimension = 3 * numberOfPoints
+    noiseVariance = 0.0
+    if dimension > numberOfModes:
+        noiseVariance = max(totalVariance - variances[:numberOfModes].sum(), 0.0) / (dimension - numberOfModes)
+    noiseVariance = max(noiseVariance, NOISE_VARIANCE_REGULARIZATION * totalVariance / dimension)
+
+    # Modes
+    modes = numpy.empty((numberOfModes, dimension), dtype=numpy.float32)
+    if numberOfModes > 0:
+        leftVectors = eigenvectors[:, :numberOfModes] / numpy.sqrt(eigenvalues[:numberOfModes])
+        for start, stop, block in iterCenteredBlocks(points, mean, blockSize):
+            modes[:, start:stop] = leftVectors.T.dot(block)
+    return ShapeModel(mean, modes, variances[:numberOfModes], noiseVariance, numberOfShapes)
+
+
+# Statistical shape model of a group: mean, principal modes and their variances
+#    - mean: array of shape (numPts, 3)
+#    - modes: orthonormal array of shape (K, 3 * numPts), from the largest variance to the smallest
+#    - variances: array of shape (K,), variance of the shapes along each mode
+#    - noiseVariance: variance of the shapes in each of the other directions
+class ShapeModel(object):
+    def __init__(self, mean, modes, variances, noiseVariance, numberOfShapes):
+        self.mean = numpy.asarray(mean, dtype=numpy.float64)
+        self.modes = modes
+        self.variances = numpy.asarray(variances, dtype=numpy.float64)
+        self.noiseVariance = float(noiseVariance)
+        self.numberOfShapes = int(numberOfShapes)
+        self.numberOfPoints = self.mean.shape[0]
+        self.numberOfModes = len(self.variances)
+
+    # Function to project shapes on the modes
+    #    - shapes: array of shape (B, numPts, 3) or (numPts, 3)
+    #    - Return the coefficients (B, K) and the squared distance of each shape to the space of the modes (B,)
+    def project(self, shapes):
+        shapes = numpy.asarray(shapes, dtype=numpy.float64)
+        if shapes.ndim == 2:
+            shapes = shapes[numpy.newaxis]
+        if shapes.shape[1:] != self.mean.shape:
+            raise ValueError('The shapes have ' + str(shapes.shape[1]) + ' points and the shape model '
+                             + str(self.numberOfPoints) + ': the meshes must be in correspondence')
+        deviations = shapes.reshape(len(shapes), -1) - self.mean.reshape(-1)
+        coefficients = deviations.dot(self.modes.T.astype(numpy.float64))
+        residuals = (deviations ** 2).sum(axis=1) - (coefficients ** 2).sum(axis=1)
+        return coefficients, numpy.maximum(residuals, 0)
+
+    # Function to compute the Mahalanobis distance of shapes to the model
+    #    - The distance is measured along the modes with their variances,
+    #      and in the other directions with the residual variance
+    #    - Return an array of shape (B,)
+    def mahalanobisDistance(self, shapes):
+        coefficients, residuals = self.project(shapes)
+        distances = (coefficients ** 2 / numpy.maximum(self.variances, MINIMUM_VARIANCE)).sum(axis=1)
+        distances += residuals / max(self.noiseVariance, MINIMUM_VARIANCE)
+        return numpy.sqrt(distances)
+
+    # Function to build shapes from coefficients of the modes, array of shape (B, K) or (K,)
+    #    - Return an array of shape (B, numPts, 3)
+    def reconstruct(self, coefficients):
+        coefficients = numpy.atleast_2d(numpy.asarray(coefficients, dtype=numpy.float64))
+        shapes = self.mean.reshape(-1) + coefficients.dot(self.modes.astype(numpy.float64))
+        return shapes.reshape(len(coefficients), self.numberOfPoints, 3)
+
+    # Function to draw random shapes from the model (normal distribution along each mode)
+    #    - Return an array of shape (numberOfSamples, numPts, 3)
+    def sample(self, numberOfSamples=1, seed=None):
+        random = numpy.random.RandomState(seed)
+        coefficients = random.normal(size=(numberOfSamples, self.numberOfModes)) * numpy.sqrt(self.variances)
+        return self.reconstruct(coefficients)
+
+    # Function to build the shape at a number of standard deviations along one mode (samplePC1.vtk of statismo)
+    def modeShape(self, mode, standardDeviations=1.0):
+        coefficients = numpy.zeros(self.numberOfModes)
+        coefficients[mode] = standardDeviations * numpy.sqrt(self.variances[mode])
+        return self.reconstruct(coefficients)[0]
+
+    # Function to save the model in a numpy archive, the modes in single precision
+    def save(self, filepath):
+        file = open(filepath, 'wb')
+        numpy.savez(file, version=SHAPE_MODEL_VERSION, mean=self.mean, modes=self.modes.astype(numpy.float32),
+                    variances=self.variances, noiseVariance=self.noiseVariance, numberOfShapes=self.numberOfShapes)
+        file.close()
+
+
+# Function to load a shape model saved by ShapeModel.save
+def loadShapeModel(filepath):
+    archive = numpy.load(filepath)
+    try:
+        if int(archive['version']) > SHAPE_MODEL_VERSION:
+            raise IOError(filepath + ' was saved by a newer version of the module')
+        return ShapeModel(archive['mean'], archive['modes'], archive['variances'],
+                          float(archive['noiseVariance']), int(archive['numberOfShapes']))
+    finally:
+        archive.close()
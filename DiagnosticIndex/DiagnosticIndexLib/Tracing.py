@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+
+# Span of time recorded by a Tracer: an operation of the logic, the reading of a mesh, an external process...
+#    - attributes: group, path, bytesRead, bytesWritten, meshes, vertices... (JSON values)
+class Span(object):
+    def __init__(self, tracer, name, category, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.threadId = threading.current_thread().ident
+        self.start = 0.0
+        self.duration = 0.0
+
+    # Function to add some attributes to the span
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.duration = time.time() - self.start
+        if type is not None:
+            self.attributes['error'] = type.__name__
+        self.tracer.record(self)
+        return False
+
+
+# Span returned when the tracer is disabled: nothing is measured nor recorded
+class NullSpan(object):
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+# Recorder of the spans of the logic, which can be used from any thread
+#    - When it is disabled, span() returns NULL_SPAN: the cost is one test
+#    - The spans are exported as a Chrome trace (chrome://tracing, https://ui.perfetto.dev)
+#      or summarized by name (count, durations, bytes read and written)
+class Tracer(object):
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.time()
+        self.spans = list()
+        self.lock = threading.Lock()
+
+    # Function to measure an operation: with tracer.span('name', 'category', group=1) as span: ...
+    def span(self, name, category='logic', **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, attributes)
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self.lock:
+            self.spans = list()
+            self.origin = time.time()
+
+    # Function to save the spans in the Chrome trace event format (complete events, in microseconds)
+    def exportChromeTrace(self, filepath):
+        with self.lock:
+            spans = list(self.spans)
+        processId = os.getpid()
+        events = list()
+        for span in spans:
+            events.append({'name': span.name,
+                           'cat': span.category,
+                           'ph': 'X',
+                           'ts': (span.start - self.origin) * 1e6,
+                           'dur': span.duration * 1e6,
+                           'pid': processId,
+                           'tid': span.threadId,
+                           'args': span.attributes})
+        file = open(filepath, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        file.close()
+
+    # Function to summarize the spans by category and name
+    #    - The spans of two functions with the same name in different categories (for example 'batch' and 'lib')
+    #      are summarized separately
+    #    - Return an ordered dictionary {(category, name): {'category', 'name', 'count', 'total', 'mean', 'max',
+    #      'bytesRead', 'bytesWritten', 'meshes', 'vertices'}}, sorted by total duration
+    def summary(self):
+        with self.lock:
+            spans = list(self.spans)
+        rows = dict()
+        for span in spans:
+            key = (span.category, span.name)
+            row = rows.get(key, None)
+            if row is None:
+                row = {'category': span.category, 'name': span.name, 'count': 0, 'total': 0.0, 'max': 0.0,
+                       'bytesRead': 0, 'bytesWritten': 0, 'meshes': 0, 'vertices': 0}
+                rows[key] = row
+            row['count'] += 1
+            row['total'] += span.duration
+            row['max'] = max(row['max'], span.duration)
+            for counter in ['bytesRead', 'bytesWritten', 'meshes', 'vertices']:
+                row[counter] += span.attributes.get(counter, 0)
+        summary = OrderedDict()
+        for key in sorted(rows.keys(), key=lambda key: -rows[key]['total']):
+            rows[key]['mean'] = rows[key]['total'] / rows[key]['count']
+            summary[key] = rows[key]
+        return summary
+
+    # Function to write the summary as a text table
+    def summaryTable(self):
+        lines = ['%-28s %-8s %6s %10s %10s %10s %12s %12s %8s'
+                 % ('Span', 'Category', 'Count', 'Total (s)', 'Mean (s)', 'Max (s)', 'Read (MB)', 'Written (MB)', 'Meshes')]
+        for row in self.summary().values():
+            lines.append('%-28s %-8s %6d %10.3f %10.4f %10.4f %12.2f %12.2f %8d'
+                         % (row['name'], row['category'], row['count'], row['total'], row['mean'], row['max'],
+                            row['bytesRead'] / 1048576.0, row['bytesWritten'] / 1048576.0, row['meshes']))
+        return '\n'.join(lines)
+
+
+# Tracer shared by the module, enabled if the environment variable DIAGNOSTICINDEX_TRACE is set
+#    (path of the Chrome trace saved by DiagnosticIndexLogic.saveTrace)
+tracer = Tracer(bool(os.environ.get('DIAGNOSTICINDEX_TRACE')))
+
+
+# Decorator recording a span for each call of a function in the shared tracer
+#    - The name of the span is the name of the function
+#    - groupArgument: index of the argument saved as the attribute 'group'
+#    - meshesArgument: index of the argument (list of meshes) whose length is saved as the attribute 'meshes'
+def traced(category='logic', groupArgument=None, meshesArgument=None):
+    def decorator(function):
+        name = function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            attributes = dict()
+            if groupArgument is not None and len(args) > groupArgument:
+                attributes['group'] = args[groupArgument]
+            if meshesArgument is not None and len(args) > meshesArgument:
+                attributes['meshes'] = len(args[meshesArgument])
+            with Span(tracer, name, category, attributes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import errno
+import shutil
+import tempfile
+import threading
+
+# Directory of the file systems kept in memory (tmpfs), used when the workspace is in memory
+MEMORY_DIRECTORY = '/dev/shm'
+
+# Prefix of the directories of the workspaces, followed by the id of the process which created them
+WORKSPACE_PREFIX = 'DiagnosticIndexWorkspace-'
+
+
+# Function to compute the size of all the files of a directory
+def directorySize(directory):
+    size = 0
+    for root, directories, files in os.walk(directory):
+        for filename in files:
+            try:
+                size += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return size
+
+
+# Function to check if a process is still running
+#    - On Windows, os.kill terminates the process whatever the signal: the process is opened with the Windows API
+#      and its exit code is checked instead
+def isProcessRunning(processId):
+    if sys.platform == 'win32':
+        return isWindowsProcessRunning(processId)
+    try:
+        os.kill(processId, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+# Function to check if a process is still running on Windows
+#    - A process which can't be opened because of the access rights is running
+def isWindowsProcessRunning(processId):
+    import ctypes
+    from ctypes import wintypes
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    ERROR_ACCESS_DENIED = 5
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, processId)
+    if not handle:
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        exitCode = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exitCode)):
+            return True
+        return exitCode.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+# Workspace where the intermediate files are written
+#    - Each computation works in its own directory (createDirectory): several computations, or several groups
+#      computed at the same time, never write the same files
+#    - useMemory: the workspace is created in MEMORY_DIRECTORY (RAM) when it exists, else in rootDirectory
+#    - A directory is removed when it is released, or kept if asked (for example the files of a computation
+#      which failed): the directories kept are removed from the oldest one when the workspace exceeds maximumSize
+#    - The workspace is removed by cleanup(), and the workspaces left by the processes which aren't running
+#      anymore are removed when a new workspace is created
+#    - The workspace can be shared by several threads
+class Workspace(object):
+    def __init__(self, rootDirectory, maximumSize=None, useMemory=False):
+        self.maximumSize = maximumSize
+        self.useMemory = useMemory and os.path.isdir(MEMORY_DIRECTORY) and os.access(MEMORY_DIRECTORY, os.W_OK)
+        if self.useMemory:
+            rootDirectory = MEMORY_DIRECTORY
+        self.rootDirectory = rootDirectory
+        self.directory = os.path.join(rootDirectory, WORKSPACE_PREFIX + str(os.getpid()))
+        self.activeDirectories = set()
+        self.keptDirectories = list()
+        self.lock = threading.Lock()
+        self.removeStaleWorkspaces()
+
+    # Function to remove the workspaces of the processes which aren't running anymore
+    def removeStaleWorkspaces(self):
+        if not os.path.isdir(self.rootDirectory):
+            return
+        for filename in os.listdir(self.rootDirectory):
+            if not filename.startswith(WORKSPACE_PREFIX):
+                continue
+            try:
+                processId = int(filename[len(WORKSPACE_PREFIX):])
+            except ValueError:
+                continue
+            if processId != os.getpid() and not isProcessRunning(processId):
+                shutil.rmtree(os.path.join(self.rootDirectory, filename), ignore_errors=True)
+
+    # Function to create a new directory in the workspace
+    #    - name: prefix of the directory, followed by a unique suffix
+    #    - Return the path of the directory, which must be released by release()
+    def createDirectory(self, name='run'):
+        with self.lock:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            directory = tempfile.mkdtemp(prefix=name + '-', dir=self.directory)
+            self.activeDirectories.add(directory)
+        return directory
+
+    # Function to release a directory created by createDirectory
+    #    - If keep is True, the directory is kept until the workspace exceeds its maximum size
+    def release(self, directory, keep=False):
+        with self.lock:
+            self.activeDirectories.discard(directory)
+            if keep and os.path.exists(directory):
+                self.keptDirectories.append((time.time(), directory))
+            else:
+                shutil.rmtree(directory, ignore_errors=True)
+        if keep:
+            self.evict()
+
+    # Context manager creating a directory released at the end of the block
+    #    with workspace.temporaryDirectory('group1') as directory: ...
+    #    - keepOnError: the directory is kept if the block raised an exception
+    def temporaryDirectory(self, name='run', keepOnError=False):
+        return WorkspaceDirectory(self, name, keepOnError)
+
+    # Function to compute the size of all the files of the workspace
+    def size(self):
+        return directorySize(self.directory)
+
+    # Function to remove the directories kept, from the oldest one, until the workspace is under its maximum size
+    #    - The directories in use are never removed
+    def evict(self):
+        if self.maximumSize is None:
+            return
+        with self.lock:
+            size = self.size()
+            while size > self.maximumSize and len(self.keptDirectories) > 0:
+                releaseTime, directory = self.keptDirectories.pop(0)
+                size -= directorySize(directory)
+                shutil.rmtree(directory, ignore_errors=True)
+
+    # Function to remove the whole workspace, called when the application is closed
+    def cleanup(self):
+        with self.lock:
+            self.activeDirectories = set()
+            self.keptDirectories = list()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Directory of a workspace released at the end of a with block (see Workspace.temporaryDirectory)
+class WorkspaceDirectory(object):
+    def __init__(self, workspace, name, keepOnError):
+        self.workspace = workspace
+        self.name = name
+        self.keepOnError = keepOnError
+        self.directory = None
+
+    def __enter__(self):
+        self.directory = self.workspace.createDirectory(self.name)
+        return self.directory
+
+    def __exit__(self, type, value, traceback):
+        self.workspace.release(self.directory, self.keepOnError and type is not None)
+        return False
@@ -0,0 +1,20 @@
+from .MeshIO import MESH_FORMATS, meshExtension, isLegacyMeshFormat, isXMLFile, readPolyData, writePolyData
+from .MeshIO import getPointsArray, createPolyDataFromPoints, removePointArrays, addConstantPointArray, decimatePolyData
+from .MeshLoader import loadMeshFile, MeshLoader
+from .GroupMean import loadGroupPoints, computeGroupMean, downdateGroupMean, computeGroupVariance, computePointsVariance
+from .GroupScheduler import runGroups
+from .ExternalProcess import runProcess
+from .FileCache import digestFiles, FileCache
+from .PackedStore import createPackedStore, PackedStore
+from .Classification import scoreShapes, classifyShapes
+from .CSVManifest import ManifestRow, iterManifestRows, readManifest
+from .DirectoryScanner import DirectoryScanner
+from .GroupIndex import GroupMembership
+from .Tracing import Tracer, tracer, traced
+from .Jobs import QUEUED, RUNNING, DONE, FAILED, CANCELLED, JobCancelledError, Job, JobManager
+from .ShapeModel import SHAPE_MODEL_EXTENSION, fitShapeModel, ShapeModel, loadShapeModel
+from .Procrustes import kabschRotations, alignToReference, generalizedProcrustes
+from .Workspace import Workspace, WorkspaceDirectory
+from .MeshMetadata import MeshMetadata, MeshHeaderError, scanMeshFile, checkCorrespondence, MeshMetadataIndex
+from .ModelRegistry import ModelVersion, RegisteredGroup, RegisteredModel, ModelRegistry, modelDisplayName
+from .Pipeline import shapeModelOfMean, classificationFiles, loadClassificationModels, writeGroupsCSVFile, GroupPipeline
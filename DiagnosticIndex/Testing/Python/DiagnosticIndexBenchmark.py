@@ -0,0 +1,289 @@
+# Benchmark of the logic of DiagnosticIndex on synthetic populations of meshes
+#
+#    Slicer --no-main-window --python-script DiagnosticIndexBenchmark.py [options]
+#
+# Options (the lists give the configurations benchmarked, every combination is run):
+#    --vertices 1000 10000         number of vertices of each mesh
+#    --shapes 10 50                number of meshes in each group
+#    --groups 3                    number of groups
+#    --backends inprocess statismo shapemodel
+#                                  backends used to compute the means (see DiagnosticIndexLogic.meanBackend)
+#    --output results.json         JSON file where the results are saved
+#    --directory path              directory where the populations are generated (temporary directory by default)
+#    --keep                        keep the populations and the files written by the logic
+#    --procrustes                  align the meshes of each group before computing the means
+#                                  (see DiagnosticIndexLogic.procrustesAlignment)
+#    --preview-triangles 1000      number of triangles of the decimated meshes of the preview
+#                                  (see DiagnosticIndexLogic.previewTriangles)
+#    --trace trace.json            save a Chrome trace of all the stages (see DiagnosticIndexLib.Tracer)
+#    --statismo-build-shape-model path, --vtk-basic-sampling-example path
+#                                  executables of statismo, StatismoStub.py by default
+#
+# For each configuration, a population of meshes in correspondence is generated (a sphere deformed differently
+# in each group) and each stage of the logic is timed:
+#    readCSVFile, creationDictVTKFiles, checkGroups, checkGroupsCached (the metadata is found in the index),
+#    deleteArrays, addColorMap, addColorMapDecimated, addColorMapDecimatedCached (the decimated meshes are found
+#    in the cache), computeGroups,
+#    computeGroupsCached (the means are found in the cache), export, loadRegisteredModel (the Classification Groups
+#    exported are found in the registry), classifyPatients
+#
+# The results are saved as JSON:
+#    {"environment": {...}, "runs": [{"vertices": 1002, "shapes": 10, "groups": 3, "meanBackend": "inprocess",
+#                                     "stages": {"readCSVFile": 0.01, ...}, "total": 1.2}, ...]}
+import os
+import sys
+import csv
+import json
+import math
+import multiprocessing
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import traceback
+from collections import OrderedDict
+
+import numpy
+import vtk
+
+import slicer
+from DiagnosticIndex import DiagnosticIndexLogic
+import DiagnosticIndexLib
+
+
+# Function to generate a population of meshes in correspondence
+#    - Every mesh is a sphere with about numberOfVertices vertices, stretched differently in each group,
+#      with some noise and a point array "Thickness" (removed by deleteArrays)
+#    - Return the dictionary {group: list of vtk files} and the exact number of vertices of the meshes
+def createPopulation(directory, numberOfVertices, numberOfShapes, numberOfGroups, seed=0):
+    # A sphere of resolution r has r * (r - 2) + 2 vertices
+    resolution = max(3, int(round(1 + math.sqrt(max(numberOfVertices - 1, 1)))))
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(resolution)
+    sphere.SetPhiResolution(resolution)
+    sphere.Update()
+    reference = sphere.GetOutput()
+    referencePoints = numpy.array(DiagnosticIndexLib.getPointsArray(reference), dtype=numpy.float64)
+
+    random = numpy.random.RandomState(seed)
+    dictVTKFiles = OrderedDict()
+    for group in range(1, numberOfGroups + 1):
+        groupDirectory = os.path.join(directory, 'group' + str(group))
+        if not os.path.exists(groupDirectory):
+            os.makedirs(groupDirectory)
+        axes = 1.0 + 0.1 * group * numpy.array([1.0, 0.5, 0.25])
+        value = list()
+        for shape in range(numberOfShapes):
+            points = referencePoints * axes + random.normal(scale=0.01, size=referencePoints.shape)
+            polyData = DiagnosticIndexLib.createPolyDataFromPoints(reference, points)
+            polyData = DiagnosticIndexLib.addConstantPointArray(polyData, 'Thickness', random.uniform())
+            filepath = os.path.join(groupDirectory, 'G%d_S%04d.vtk' % (group, shape))
+            DiagnosticIndexLib.writePolyData(polyData, filepath, 'binary')
+            value.append(filepath)
+        dictVTKFiles[group] = value
+    return dictVTKFiles, reference.GetNumberOfPoints()
+
+
+# Function to write the CSV file of a population, as created by the first tab of the module
+def writeCSVFile(filepath, dictVTKFiles):
+    file = open(filepath, 'w')
+    cw = csv.writer(file, delimiter=',')
+    cw.writerow(['VTK Files', 'Group'])
+    for key, value in dictVTKFiles.items():
+        for vtkFile in value:
+            cw.writerow([vtkFile, str(key)])
+    file.close()
+
+
+# Function to run a stage of the logic and save its duration
+def timeStage(timings, name, function, *arguments):
+    start = time.time()
+    result = function(*arguments)
+    timings[name] = time.time() - start
+    print("    %-22s %10.3f s" % (name, timings[name]))
+    return result
+
+
+# Function to run all the stages of the logic on one population
+#    - The logic works in its own temporary directory (workspace, registry, empty caches of the means,
+#      of the preview and of the metadata), closed at the end of the run
+def benchmarkPopulation(options, directory, CSVfilePath, backend):
+    temporaryPath = os.path.join(directory, 'temporary')
+    os.makedirs(temporaryPath)
+    logic = DiagnosticIndexLogic(temporaryPath=temporaryPath)
+    logic.procrustesAlignment = options.procrustes
+    logic.statismoBuildShapeModel = options.statismoBuildShapeModel
+    logic.vtkBasicSamplingExample = options.vtkBasicSamplingExample
+    logic.meanBackend = backend
+    try:
+        return benchmarkStages(logic, directory, CSVfilePath, options.previewTriangles)
+    finally:
+        logic.close()
+
+
+# Function to time each stage of the logic on one population
+def benchmarkStages(logic, directory, CSVfilePath, previewTriangles):
+    timings = OrderedDict()
+
+    # Reading of the CSV file
+    timeStage(timings, 'readCSVFile', logic.readCSVFile, CSVfilePath)
+    if len(logic.CSVErrors) > 0:
+        raise RuntimeError('\n'.join(logic.CSVErrors))
+    dictVTKFiles = DiagnosticIndexLib.GroupMembership()
+    timeStage(timings, 'creationDictVTKFiles', logic.creationDictVTKFiles, dictVTKFiles)
+
+    # Correspondence of the meshes of each group, scanned then found in the index
+    for stage in ['checkGroups', 'checkGroupsCached']:
+        errors = timeStage(timings, stage, logic.meshMetadataIndex.checkGroups, dictVTKFiles.toDict())
+        if len(errors) > 0:
+            raise RuntimeError('\n'.join(error for value in errors.values() for error in value))
+
+    # Copies of the vtk files written in the workspace
+    def deleteArrays():
+        pipeline = logic.groupPipeline()
+        for key, value in dictVTKFiles.items():
+            with logic.workspace.temporaryDirectory('group' + str(key)) as groupDirectory:
+                pipeline.deleteArrays(key, value, groupDirectory, groupDirectory)
+    timeStage(timings, 'deleteArrays', deleteArrays)
+    with logic.workspace.temporaryDirectory('preview') as previewDirectory:
+        timeStage(timings, 'addColorMap', logic.addColorMap, dictVTKFiles, previewDirectory)
+
+    # Decimated meshes of the preview, then the same meshes found in the cache
+    logic.previewTriangles = previewTriangles
+    for stage in ['addColorMapDecimated', 'addColorMapDecimatedCached']:
+        with logic.workspace.temporaryDirectory('preview') as previewDirectory:
+            timeStage(timings, stage, logic.addColorMap, dictVTKFiles, previewDirectory)
+    logic.previewTriangles = 0
+
+    # Means of the groups
+    groupsDirectory = logic.workspace.createDirectory('groups')
+    results, errors = timeStage(timings, 'computeGroups', logic.computeGroups, dictVTKFiles, groupsDirectory)
+    if len(errors) > 0:
+        raise RuntimeError('\n'.join(errors.values()))
+    with logic.workspace.temporaryDirectory('groups') as cachedGroupsDirectory:
+        timeStage(timings, 'computeGroupsCached', logic.computeGroups, dictVTKFiles, cachedGroupsDirectory)
+
+    # Export of the Classification Groups
+    exportDirectory = os.path.join(directory, 'export')
+    os.makedirs(exportDirectory)
+    dictGroups = DiagnosticIndexLib.GroupMembership()
+
+    def export():
+        for key, cacheKey in results.items():
+            logic.storageMean(dictGroups, key, groupsDirectory, cacheKey)
+        return logic.saveNewClassificationGroups(exportDirectory + '/NewClassificationGroups.csv', exportDirectory,
+                                                dictGroups, dictVTKFiles.toDict())
+    registered = timeStage(timings, 'export', export)
+    if registered is None:
+        raise RuntimeError('The Classification Groups could not be registered')
+
+    # Classification Groups found in the registry, with the array of the means
+    logic.classificationMeans = None
+    model, dictGroups, errors = timeStage(timings, 'loadRegisteredModel', logic.loadRegisteredModel, *registered)
+    if len(errors) > 0:
+        raise RuntimeError('\n'.join(errors))
+
+    # Classification of all the meshes of the population against the groups
+    polyDataList, errors = logic.meshLoader.loadPolyData(
+        [vtkFile for value in dictVTKFiles.values() for vtkFile in value])
+    timeStage(timings, 'classifyPatients', logic.classifyPatients, polyDataList, dictGroups, 1, dictVTKFiles)
+    return timings
+
+
+# Function to save the spans recorded during the whole benchmark, if a trace was asked
+def saveTrace(filepath):
+    tracer = DiagnosticIndexLib.tracer
+    if not tracer.enabled:
+        return
+    tracer.exportChromeTrace(filepath)
+    print("Trace saved in " + filepath)
+    print(tracer.summaryTable())
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description='Benchmark of the logic of DiagnosticIndex')
+    parser.add_argument('--vertices', type=int, nargs='+', default=[1000])
+    parser.add_argument('--shapes', type=int, nargs='+', default=[10])
+    parser.add_argument('--groups', type=int, nargs='+', default=[3])
+    parser.add_argument('--backends', nargs='+', default=['inprocess', 'statismo', 'shapemodel'],
+                        choices=['inprocess', 'statismo', 'shapemodel'])
+    parser.add_argument('--output', default='DiagnosticIndexBenchmark.json')
+    parser.add_argument('--directory', default=None)
+    parser.add_argument('--keep', action='store_true')
+    parser.add_argument('--procrustes', action='store_true')
+    parser.add_argument('--trace', default=None)
+    parser.add_argument('--preview-triangles', dest='previewTriangles', type=int, default=1000)
+    stub = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'StatismoStub.py')
+    parser.add_argument('--statismo-build-shape-model', dest='statismoBuildShapeModel', default=stub)
+    parser.add_argument('--vtk-basic-sampling-example', dest='vtkBasicSamplingExample', default=stub)
+    options = parser.parse_args(arguments)
+
+    for executable in [options.statismoBuildShapeModel, options.vtkBasicSamplingExample]:
+        if executable == stub and not os.access(stub, os.X_OK):
+            os.chmod(stub, 0o755)
+
+    directory = options.directory
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='DiagnosticIndexBenchmark')
+    if options.trace:
+        DiagnosticIndexLib.tracer.enabled = True
+
+    runs = list()
+    exitCode = 0
+    try:
+        for numberOfVertices in options.vertices:
+            for numberOfShapes in options.shapes:
+                for numberOfGroups in options.groups:
+                    name = 'v%d_s%d_g%d' % (numberOfVertices, numberOfShapes, numberOfGroups)
+                    populationDirectory = os.path.join(directory, name, 'population')
+                    dictVTKFiles, vertices = createPopulation(populationDirectory, numberOfVertices,
+                                                              numberOfShapes, numberOfGroups)
+                    CSVfilePath = os.path.join(directory, name, 'population.csv')
+                    writeCSVFile(CSVfilePath, dictVTKFiles)
+
+                    for backend in options.backends:
+                        print("------ %d vertices, %d shapes per group, %d groups, backend %s ------"
+                              % (vertices, numberOfShapes, numberOfGroups, backend))
+                        run = OrderedDict([('vertices', vertices), ('shapes', numberOfShapes),
+                                           ('groups', numberOfGroups), ('meanBackend', backend)])
+                        try:
+                            run['stages'] = benchmarkPopulation(options, os.path.join(directory, name, backend),
+                                                                CSVfilePath, backend)
+                            run['total'] = sum(run['stages'].values())
+                        except Exception:
+                            run['error'] = traceback.format_exc()
+                            print(run['error'])
+                            exitCode = 1
+                        runs.append(run)
+    finally:
+        saveTrace(options.trace)
+        if not options.keep and options.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    environment = OrderedDict([('python', sys.version.split()[0]),
+                               ('platform', platform.platform()),
+                               ('vtk', vtk.vtkVersion.GetVTKVersion()),
+                               ('numpy', numpy.__version__),
+                               ('numberOfWorkers', multiprocessing.cpu_count()),
+                               ('procrustesAlignment', options.procrustes),
+                               ('statismoBuildShapeModel', options.statismoBuildShapeModel),
+                               ('vtkBasicSamplingExample', options.vtkBasicSamplingExample)])
+    file = open(options.output, 'w')
+    json.dump(OrderedDict([('environment', environment), ('runs', runs)]), file, indent=2)
+    file.close()
+    print("Results saved in " + options.output)
+    return exitCode
+
+
+if __name__ == '__main__':
+    # Slicer keeps running after the script: it has to be exited whatever happens, or a headless run hangs
+    try:
+        exitCode = main(sys.argv[1:])
+    except SystemExit as e:
+        # --help or wrong options given to argparse
+        exitCode = e.code if isinstance(e.code, int) else 1
+    except Exception:
+        print(traceback.format_exc())
+        exitCode = 1
+    slicer.app.exit(exitCode)
@@ -0,0 +1,471 @@
+# Tests of DiagnosticIndexLib, which need only VTK and numpy
+#
+#    Slicer --no-main-window --python-script DiagnosticIndexLibTest.py
+#    python DiagnosticIndexLibTest.py
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy
+import vtk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import DiagnosticIndexLib
+
+
+# Function to generate shapes in correspondence: a random mean deformed along a few random directions
+def createShapes(numberOfShapes, numberOfPoints, numberOfDirections=3, seed=0):
+    random = numpy.random.RandomState(seed)
+    mean = random.normal(size=(numberOfPoints, 3))
+    directions = random.normal(size=(numberOfDirections, numberOfPoints * 3))
+    coefficients = random.normal(size=(numberOfShapes, numberOfDirections)) * [10.0, 3.0, 1.0][:numberOfDirections]
+    shapes = mean.reshape(-1) + coefficients.dot(directions) + random.normal(scale=0.01, size=(numberOfShapes, numberOfPoints * 3))
+    return shapes.reshape(numberOfShapes, numberOfPoints, 3)
+
+
+# Function to generate a random rotation matrix
+def randomRotation(random):
+    q, r = numpy.linalg.qr(random.normal(size=(3, 3)))
+    q = q * numpy.sign(numpy.diag(r))
+    if numpy.linalg.det(q) < 0:
+        q[:, 0] = -q[:, 0]
+    return q
+
+
+# Function to write shapes in correspondence as vtk files, with the topology of a sphere
+#    - Return the list of the vtk files
+def writeShapes(directory, shapes, dtype=numpy.float64):
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(8)
+    sphere.SetPhiResolution(8)
+    sphere.Update()
+    reference = sphere.GetOutput()
+    vtkFiles = list()
+    for index, points in enumerate(shapes):
+        vtkFile = os.path.join(directory, 'shape' + str(index) + '.vtk')
+        polyData = DiagnosticIndexLib.createPolyDataFromPoints(reference, numpy.asarray(points, dtype=dtype))
+        DiagnosticIndexLib.writePolyData(polyData, vtkFile, 'binary')
+        vtkFiles.append(vtkFile)
+    return vtkFiles
+
+
+# Number of points of the sphere used by writeShapes
+NUMBER_OF_SPHERE_POINTS = 8 * 6 + 2
+
+
+class ShapeModelTest(unittest.TestCase):
+    # Variances of the principal modes given by the SVD of the centered shapes
+    def expectedVariances(self, shapes, numberOfModes):
+        centered = shapes.reshape(len(shapes), -1) - shapes.mean(axis=0).reshape(-1)
+        singularValues = numpy.linalg.svd(centered, compute_uv=False)
+        return singularValues[:numberOfModes] ** 2 / (len(shapes) - 1)
+
+    def checkMethod(self, method):
+        shapes = createShapes(30, 500)
+        original = shapes.copy()
+        model = DiagnosticIndexLib.fitShapeModel(shapes, varianceFraction=1.0, maximumModes=5, method=method,
+                                                 blockSize=128)
+        numpy.testing.assert_array_equal(shapes, original)
+        numpy.testing.assert_allclose(model.mean, original.mean(axis=0))
+        # The modes after the third one are noise, only approximated by the randomized SVD
+        numpy.testing.assert_allclose(model.variances[:3], self.expectedVariances(original, 3), rtol=1e-3)
+        numpy.testing.assert_allclose(model.modes.dot(model.modes.T), numpy.eye(5), atol=1e-4)
+
+    def testGram(self):
+        self.checkMethod('gram')
+
+    def testRandomized(self):
+        self.checkMethod('randomized')
+
+    def testReconstruct(self):
+        shapes = createShapes(20, 100)
+        model = DiagnosticIndexLib.fitShapeModel(shapes, varianceFraction=1.0)
+        coefficients, residuals = model.project(shapes)
+        numpy.testing.assert_allclose(model.reconstruct(coefficients), shapes, atol=1e-4)
+
+
+class GroupMeanTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.shapes = createShapes(6, NUMBER_OF_SPHERE_POINTS)
+        self.vtkFiles = writeShapes(self.directory, self.shapes)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testComputeGroupMean(self):
+        mean = DiagnosticIndexLib.computeGroupMean(self.vtkFiles, loader=DiagnosticIndexLib.MeshLoader(2))
+        numpy.testing.assert_allclose(DiagnosticIndexLib.getPointsArray(mean), self.shapes.mean(axis=0), rtol=1e-12)
+
+    def testComputeGroupVariance(self):
+        variance = DiagnosticIndexLib.computeGroupVariance(self.vtkFiles)
+        expected = ((self.shapes - self.shapes.mean(axis=0)) ** 2).sum(axis=(0, 2)) / (3 * (len(self.shapes) - 1))
+        numpy.testing.assert_allclose(variance, expected, rtol=1e-10)
+
+    def testDowndateGroupMean(self):
+        meanFile = os.path.join(self.directory, 'mean.vtk')
+        DiagnosticIndexLib.writePolyData(DiagnosticIndexLib.computeGroupMean(self.vtkFiles), meanFile, 'binary')
+        mean = DiagnosticIndexLib.downdateGroupMean(meanFile, len(self.vtkFiles), self.vtkFiles[2])
+        numpy.testing.assert_allclose(DiagnosticIndexLib.getPointsArray(mean),
+                                      numpy.delete(self.shapes, 2, axis=0).mean(axis=0), rtol=1e-10)
+
+    def testDowndateSinglePrecisionMean(self):
+        # The mean saved in single precision is downdated from the mean in double precision given
+        vtkFiles = writeShapes(self.directory, self.shapes, numpy.float32)
+        points = numpy.array([DiagnosticIndexLib.getPointsArray(DiagnosticIndexLib.readPolyData(vtkFile))
+                              for vtkFile in vtkFiles], dtype=numpy.float64)
+        meanFile = os.path.join(self.directory, 'mean.vtk')
+        DiagnosticIndexLib.writePolyData(DiagnosticIndexLib.computeGroupMean(vtkFiles), meanFile, 'binary')
+        mean = DiagnosticIndexLib.downdateGroupMean(meanFile, len(vtkFiles), vtkFiles[0], meanPoints=points.mean(axis=0))
+        self.assertEqual(DiagnosticIndexLib.getPointsArray(mean).dtype, numpy.float32)
+        numpy.testing.assert_allclose(DiagnosticIndexLib.getPointsArray(mean), points[1:].mean(axis=0), rtol=1e-6)
+
+    def testDowndateGroupOfOneMesh(self):
+        with self.assertRaises(ValueError):
+            DiagnosticIndexLib.downdateGroupMean(self.vtkFiles[0], 1, self.vtkFiles[0])
+
+
+class GroupPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.shapes = createShapes(5, NUMBER_OF_SPHERE_POINTS)
+        self.vtkFiles = writeShapes(self.directory, self.shapes, numpy.float32)
+        self.shapes = numpy.array([DiagnosticIndexLib.getPointsArray(DiagnosticIndexLib.readPolyData(vtkFile))
+                                   for vtkFile in self.vtkFiles], dtype=numpy.float64)
+        self.loader = DiagnosticIndexLib.MeshLoader(2)
+        self.workspace = DiagnosticIndexLib.Workspace(self.directory)
+        self.meanCache = DiagnosticIndexLib.FileCache(os.path.join(self.directory, 'cache'), 1024 * 1024)
+
+    def tearDown(self):
+        self.loader.close()
+        self.workspace.cleanup()
+        shutil.rmtree(self.directory)
+
+    def createPipeline(self, meanBackend):
+        return DiagnosticIndexLib.GroupPipeline(self.loader, meanBackend=meanBackend,
+                                               shapeModelVarianceFraction=1.0,
+                                               workspace=self.workspace, meanCache=self.meanCache)
+
+    def readMean(self, pipeline, directory):
+        return DiagnosticIndexLib.getPointsArray(DiagnosticIndexLib.readPolyData(pipeline.meanPath(1, directory)))
+
+    def checkBackend(self, meanBackend):
+        pipeline = self.createPipeline(meanBackend)
+        with self.workspace.temporaryDirectory() as directory:
+            results, errors = pipeline.computeGroups({1: self.vtkFiles}, directory)
+            self.assertEqual(errors, {})
+            numpy.testing.assert_allclose(self.readMean(pipeline, directory), self.shapes.mean(axis=0), rtol=1e-5)
+            pipeline.cacheGroup(1, directory, results[1])
+        self.assertTrue(self.meanCache.contains(results[1]))
+
+        # Leave-one-out mean, from the mean of the whole group found in the cache
+        with self.workspace.temporaryDirectory() as directory:
+            pipeline.computeLeaveOneOutGroup(1, self.vtkFiles[1:], self.vtkFiles[0], directory)
+            numpy.testing.assert_allclose(self.readMean(pipeline, directory), self.shapes[1:].mean(axis=0), rtol=1e-5)
+            self.assertFalse(os.path.exists(pipeline.modelPath(1, directory)))
+
+        # Leave-one-out mean, from the mean of the whole group computed, in a cache too small to keep it
+        pipeline.meanCache = DiagnosticIndexLib.FileCache(os.path.join(self.directory, 'smallCache'), 1)
+        with self.workspace.temporaryDirectory() as directory:
+            pipeline.computeLeaveOneOutGroup(1, self.vtkFiles[:-1], self.vtkFiles[-1], directory)
+            numpy.testing.assert_allclose(self.readMean(pipeline, directory), self.shapes[:-1].mean(axis=0), rtol=1e-5)
+
+    def testInProcess(self):
+        self.checkBackend('inprocess')
+
+    def testShapeModel(self):
+        self.checkBackend('shapemodel')
+
+    def testSaveClassificationGroups(self):
+        pipeline = self.createPipeline('shapemodel')
+        exportDirectory = os.path.join(self.directory, 'export')
+        os.makedirs(exportDirectory)
+        with self.workspace.temporaryDirectory() as directory:
+            pipeline.computeGroups({1: self.vtkFiles[:3], 2: self.vtkFiles[3:]}, directory)
+            dictGroups = dict((key, [pipeline.meanPath(key, directory)]) for key in [1, 2])
+            dictForCSV, meanOfGroup, errors = pipeline.saveClassificationGroups(
+                os.path.join(exportDirectory, 'NewClassificationGroups.csv'), exportDirectory, dictGroups)
+        self.assertEqual(errors, [])
+        rows, errors = DiagnosticIndexLib.readManifest(os.path.join(exportDirectory, 'NewClassificationGroups.csv'))
+        self.assertEqual(sorted((row.group, row.path) for row in rows),
+                         sorted((key, value[0]) for key, value in dictForCSV.items()))
+        groups, meanFiles, modelFiles, digest = DiagnosticIndexLib.classificationFiles(dictForCSV)
+        self.assertEqual(len(DiagnosticIndexLib.loadClassificationModels(modelFiles)), 2)
+        numpy.testing.assert_allclose(meanOfGroup[2], self.shapes[3:].mean(axis=0), rtol=1e-5)
+
+
+class JobsTest(unittest.TestCase):
+    # A cancelled job stops at its next check, close() waits for it
+    def testCloseCancelsRunningJobs(self):
+        manager = DiagnosticIndexLib.JobManager(1)
+        started = threading.Event()
+
+        def function(job):
+            started.set()
+            while True:
+                job.checkCancelled()
+                time.sleep(0.01)
+        job = manager.submit('loop', function)
+        self.assertTrue(started.wait(5))
+        manager.close()
+        self.assertEqual(job.state, DiagnosticIndexLib.CANCELLED)
+
+    # The meshes of a group aren't read anymore once the job is cancelled
+    def testCancelledLoading(self):
+        directory = tempfile.mkdtemp()
+        try:
+            vtkFiles = writeShapes(directory, createShapes(3, NUMBER_OF_SPHERE_POINTS))
+            job = DiagnosticIndexLib.Job(1, 'mean', None)
+            job.cancel()
+            self.assertRaises(DiagnosticIndexLib.JobCancelledError, DiagnosticIndexLib.computeGroupMean,
+                              vtkFiles, None, None, job)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ClassificationTest(unittest.TestCase):
+    # Means of the groups 1, 2 and 3: one shape translated by 0, 1 and 3 along x
+    def setUp(self):
+        self.base = numpy.random.RandomState(0).normal(size=(50, 3))
+        self.groups = [1, 2, 3]
+        self.means = numpy.array([self.base + [shift, 0, 0] for shift in [0.0, 1.0, 3.0]])
+
+    def testRanking(self):
+        shapes = numpy.array([self.base + [1.1, 0, 0], self.base + [2.5, 0, 0], self.base])
+        scores = DiagnosticIndexLib.classifyShapes(shapes, self.means, self.groups, healthyGroup=1)
+        numpy.testing.assert_array_equal(scores['assignedGroup'], [2, 3, 1])
+        numpy.testing.assert_array_equal(scores['ranking'], [[2, 1, 3], [3, 2, 1], [1, 2, 3]])
+        numpy.testing.assert_allclose(scores['rms'][0], [1.1, 0.1, 1.9], atol=1e-6)
+        # The distances are computed from the squared norms: about 1e-8 instead of 0 for a shape on a mean
+        numpy.testing.assert_allclose(scores['diagnosticIndex'], [1.1 / 1.2, 2.5 / 3.0, 0.0], atol=1e-6)
+        self.assertIsNone(scores['mahalanobis'])
+
+    def testWithoutHealthyGroup(self):
+        scores = DiagnosticIndexLib.classifyShapes(self.base, self.means, self.groups)
+        self.assertIsNone(scores['diagnosticIndex'])
+        numpy.testing.assert_array_equal(scores['assignedGroup'], [1])
+
+    def testMahalanobis(self):
+        # The group 1 varies much more than the others: a shape closer to the group 2 is assigned to the group 1
+        variances = numpy.ones((3, len(self.base)))
+        variances[0] = 100.0
+        scores = DiagnosticIndexLib.classifyShapes(self.base + [0.9, 0, 0], self.means, self.groups, variances=variances)
+        numpy.testing.assert_array_equal(scores['assignedGroup'], [1])
+        numpy.testing.assert_allclose(scores['mahalanobis'][0, 1], numpy.sqrt(len(self.base) * 0.1 ** 2), rtol=1e-9)
+
+    def testNotInCorrespondence(self):
+        with self.assertRaises(ValueError):
+            DiagnosticIndexLib.classifyShapes(self.base[:10], self.means, self.groups)
+
+
+class GroupMembershipTest(unittest.TestCase):
+    def setUp(self):
+        self.membership = DiagnosticIndexLib.GroupMembership({2: ['/a/P11.vtk'], 1: ['/a/P1.vtk', '/b/P2.vtk']})
+
+    def testMapping(self):
+        self.assertEqual(self.membership.keys(), [1, 2])
+        self.assertEqual(self.membership[1], ['/a/P1.vtk', '/b/P2.vtk'])
+        self.assertEqual(self.membership.toDict(), {1: ['/a/P1.vtk', '/b/P2.vtk'], 2: ['/a/P11.vtk']})
+        self.assertEqual(len(self.membership), 2)
+        self.assertEqual(self.membership.numberOfFiles(), 3)
+
+    def testFindFile(self):
+        self.assertEqual(self.membership.findFile('P1.vtk'), '/a/P1.vtk')
+        self.assertEqual(self.membership.findFile('P11.vtk'), '/a/P11.vtk')
+        self.assertIsNone(self.membership.findFile('P3.vtk'))
+
+    def testMoveAndRemove(self):
+        self.membership.addFile('/a/P1.vtk', 2)
+        self.assertEqual(self.membership.groupOf('/a/P1.vtk'), 2)
+        self.assertEqual(self.membership[1], ['/b/P2.vtk'])
+        self.assertEqual(self.membership.removeFile('/a/P1.vtk'), 2)
+        self.assertIsNone(self.membership.removeFile('/a/P1.vtk'))
+        self.assertIsNone(self.membership.findFile('P1.vtk'))
+        self.assertEqual(self.membership[2], ['/a/P11.vtk'])
+
+    def testDuplicateFilenames(self):
+        self.assertEqual(self.membership.duplicateFilenames(), dict())
+        self.membership.addFile('/c/P1.vtk', 2)
+        self.assertEqual(self.membership.duplicateFilenames(), {'P1.vtk': ['/a/P1.vtk', '/c/P1.vtk']})
+        self.membership.removeFile('/a/P1.vtk')
+        self.assertEqual(self.membership.duplicateFilenames(), dict())
+
+
+class CSVManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for subdirectory in ['a', 'b']:
+            os.makedirs(os.path.join(self.directory, subdirectory))
+            for filename in ['P1.vtk', 'P2.vtk']:
+                open(os.path.join(self.directory, subdirectory, filename), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Function to write a CSV file of vtk files from a list of (path, group)
+    def writeCSVFile(self, rows):
+        filepath = os.path.join(self.directory, 'groups.csv')
+        file = open(filepath, 'w')
+        file.write('VTK Files,Group\n')
+        for path, group in rows:
+            file.write(path + ',' + str(group) + '\n')
+        file.close()
+        return filepath
+
+    def testDuplicateFilenames(self):
+        filepath = self.writeCSVFile([(os.path.join(self.directory, 'a', 'P1.vtk'), 1),
+                                      (os.path.join(self.directory, 'a', 'P2.vtk'), 1),
+                                      (os.path.join(self.directory, 'b', 'P1.vtk'), 2)])
+        rows, errors = DiagnosticIndexLib.readManifest(filepath)
+        self.assertEqual([row.line for row in rows], [2, 3])
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('Line 4:'))
+
+    # The relative paths are relative to the directory of the CSV file, not to the current directory
+    def testRelativePaths(self):
+        filepath = self.writeCSVFile([('a/P1.vtk', 1),
+                                      (os.path.join('..', os.path.basename(self.directory), 'b', 'P2.vtk'), 2),
+                                      ('a/P3.vtk', 2)])
+        rows, errors = DiagnosticIndexLib.readManifest(filepath)
+        self.assertEqual([row.path for row in rows], [os.path.join(self.directory, 'a', 'P1.vtk'),
+                                                      os.path.join(self.directory, 'b', 'P2.vtk')])
+        self.assertEqual(errors, ['Line 4: VTK file not found ' + os.path.join(self.directory, 'a', 'P3.vtk')])
+
+
+class MeshMetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # The binary files are scanned, the files in ascii and in XML are read by VTK: the same mesh has the same metadata
+    def testFormats(self):
+        sphere = vtk.vtkSphereSource()
+        sphere.Update()
+        metadataList = list()
+        for meshFormat in ['binary', 'ascii', 'xml']:
+            filepath = os.path.join(self.directory, 'sphere_' + meshFormat + DiagnosticIndexLib.meshExtension(meshFormat))
+            DiagnosticIndexLib.writePolyData(sphere.GetOutput(), filepath, meshFormat)
+            metadataList.append(DiagnosticIndexLib.scanMeshFile(filepath))
+        self.assertEqual([metadata.format for metadata in metadataList], ['binary', 'legacy', 'xml'])
+        for metadata in metadataList:
+            self.assertEqual((metadata.numberOfPoints, metadata.numberOfCells, metadata.topology),
+                             (metadataList[0].numberOfPoints, metadataList[0].numberOfCells, metadataList[0].topology))
+        self.assertEqual(DiagnosticIndexLib.checkCorrespondence(metadataList), [])
+
+
+class ModelRegistryTest(unittest.TestCase):
+    # Two exports in directories with the same name are two models, displayed with the name of the directory
+    def testExportDirectories(self):
+        directory = tempfile.mkdtemp()
+        registry = DiagnosticIndexLib.ModelRegistry(os.path.join(directory, 'registry.sqlite'))
+        try:
+            meanPath = writeShapes(directory, createShapes(1, NUMBER_OF_SPHERE_POINTS))[0]
+            groups = {1: {'meanPath': meanPath, 'members': [meanPath]}}
+            names = [os.path.join(directory, study, 'export') for study in ['study1', 'study2']]
+            self.assertEqual([registry.register(name, groups) for name in names], [1, 1])
+            self.assertEqual(sorted(registry.names()), names)
+            self.assertEqual([DiagnosticIndexLib.modelDisplayName(name) for name in names], ['export', 'export'])
+            self.assertEqual(DiagnosticIndexLib.modelDisplayName('model'), 'model')
+        finally:
+            registry.close()
+            shutil.rmtree(directory)
+
+
+class FileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DiagnosticIndexLib.FileCache(os.path.join(self.directory, 'cache'), 250)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Function to put a file of 100 bytes in the cache, used for the last time at the time given
+    def put(self, key, usedTime=None):
+        filepath = os.path.join(self.directory, key + '.vtk')
+        file = open(filepath, 'wb')
+        file.write(b'x' * 100)
+        file.close()
+        cachedFilepath = self.cache.put(key, filepath)
+        if usedTime is not None:
+            os.utime(cachedFilepath, (usedTime, usedTime))
+        return cachedFilepath
+
+    def testLeastRecentlyUsedEviction(self):
+        now = time.time()
+        self.put('a', now - 20)
+        self.put('b', now - 10)
+        # The file a is used again: the file b becomes the least recently used one
+        self.assertIsNotNone(self.cache.get('a'))
+        self.put('c')
+        self.assertTrue(self.cache.contains('a'))
+        self.assertFalse(self.cache.contains('b'))
+        self.assertTrue(self.cache.contains('c'))
+        self.assertIsNone(self.cache.get('b'))
+
+    # The file just stored is kept, even if it is larger than the cache
+    def testLargeFile(self):
+        self.put('a')
+        filepath = os.path.join(self.directory, 'b.vtk')
+        file = open(filepath, 'wb')
+        file.write(b'x' * 300)
+        file.close()
+        self.cache.put('b', filepath)
+        self.assertFalse(self.cache.contains('a'))
+        self.assertTrue(self.cache.contains('b'))
+
+    def testExtensions(self):
+        self.put('a')
+        self.assertTrue(self.cache.contains('a', '.vtk'))
+        self.assertFalse(self.cache.contains('a', '.npz'))
+
+
+class ProcrustesTest(unittest.TestCase):
+    def setUp(self):
+        self.random = numpy.random.RandomState(1)
+        self.shape = self.random.normal(size=(40, 3))
+        self.rotations = numpy.array([randomRotation(self.random) for index in range(5)])
+        self.translations = self.random.normal(scale=5.0, size=(5, 3))
+
+    def testGeneralizedProcrustes(self):
+        shapes = numpy.matmul(self.shape, self.rotations) + self.translations[:, numpy.newaxis]
+        alignment = DiagnosticIndexLib.generalizedProcrustes(shapes)
+        self.assertTrue(alignment['converged'])
+        # All the copies of the shape are superimposed
+        for points in alignment['points']:
+            numpy.testing.assert_allclose(points, alignment['points'][0], atol=1e-8)
+        # The rotation of each copy is undone: rotations[n].dot(alignment rotation[n]) is the same for all the copies
+        recovered = numpy.matmul(self.rotations, alignment['rotations'])
+        for rotation in recovered:
+            numpy.testing.assert_allclose(rotation, recovered[0], atol=1e-8)
+        # Transformation returned
+        transformed = numpy.matmul(shapes + alignment['translations'][:, numpy.newaxis], alignment['rotations'])
+        transformed = transformed * alignment['scales'][:, numpy.newaxis, numpy.newaxis] + alignment['offset']
+        numpy.testing.assert_allclose(transformed, alignment['points'], atol=1e-8)
+
+    def testScaling(self):
+        scales = numpy.array([1.0, 2.0, 0.5, 3.0, 1.5])
+        shapes = scales[:, numpy.newaxis, numpy.newaxis] * numpy.matmul(self.shape, self.rotations)
+        alignment = DiagnosticIndexLib.generalizedProcrustes(shapes, scaling=True)
+        for points in alignment['points']:
+            numpy.testing.assert_allclose(points, alignment['points'][0], atol=1e-8)
+
+    def testAlignToReference(self):
+        shape = self.shape.dot(self.rotations[0]) + self.translations[0]
+        numpy.testing.assert_allclose(DiagnosticIndexLib.alignToReference(shape, self.shape), self.shape, atol=1e-10)
+        numpy.testing.assert_allclose(DiagnosticIndexLib.alignToReference(2 * shape, self.shape, scaling=True),
+                                      self.shape, atol=1e-10)
+
+
+if __name__ == '__main__':
+    result = unittest.main(argv=[sys.argv[0]], exit=False).result
+    exitCode = 0 if result.wasSuccessful() else 1
+    if 'slicer' in sys.modules:
+        sys.modules['slicer'].app.exit(exitCode)
+    else:
+        sys.exit(exitCode)
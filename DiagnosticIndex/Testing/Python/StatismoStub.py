@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# Stand-in for the two statismo executables called by DiagnosticIndex, used by the benchmark
+# (see DiagnosticIndexBenchmark.py) on the machines where statismo isn't installed
+#
+#    StatismoStub.py --data-list groupN.txt --output-file groupN.h5 [--procrustes GPA]
+#                                                                         (statismo-build-shape-model)
+#        Write the list of the meshes of the group in the "model" file
+#    StatismoStub.py groupN.h5 resultDirectory                           (vtkBasicSamplingExample)
+#        Save the first mesh of the model as mean.vtk in the result directory
+#
+# No shape model is built: the stub only reproduces the files read and written by the module,
+# so that the cost of the pipeline around statismo can be measured.
+import os
+import sys
+import shutil
+
+
+def buildShapeModel(dataList, outputFile):
+    file = open(dataList, 'r')
+    meshes = [line.strip() for line in file if line.strip()]
+    file.close()
+    if len(meshes) == 0:
+        raise RuntimeError('No mesh in the data list ' + dataList)
+    for mesh in meshes:
+        if not os.path.exists(mesh):
+            raise RuntimeError('The mesh ' + mesh + ' does not exist')
+    file = open(outputFile, 'w')
+    file.write('\n'.join(meshes) + '\n')
+    file.close()
+
+
+def saveSamples(modelFile, resultDirectory):
+    file = open(modelFile, 'r')
+    meshes = [line.strip() for line in file if line.strip()]
+    file.close()
+    shutil.copyfile(meshes[0], os.path.join(resultDirectory, 'mean.vtk'))
+
+
+def main(arguments):
+    if len(arguments) in [4, 6] and arguments[0] == '--data-list' and arguments[2] == '--output-file':
+        buildShapeModel(arguments[1], arguments[3])
+    elif len(arguments) == 2:
+        saveSamples(arguments[0], arguments[1])
+    else:
+        print("Usage: StatismoStub.py --data-list list.txt --output-file model.h5")
+        print("       StatismoStub.py model.h5 resultDirectory")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))